@@ -1,5 +1,16 @@
 import math
 import statistics as _stats
+import numpy as np
+
+# A downdate that leaves M2 below this fraction of its old value has
+# cancelled to rounding noise, e.g. removing x from [2, 2, 2, x] can leave
+# ±1e-15 instead of 0. Snapping that to 0 keeps M2 >= 0 (so std never takes
+# the root of a negative) and keeps unanimous ratings at std 0.
+_DOWNDATE_NOISE = 1e-12
+
+
+def _downdated(M2_before: float, M2_after: float) -> float:
+    return M2_after if M2_after > M2_before * _DOWNDATE_NOISE else 0.0
 
 
 class WelfordAccumulator:
@@ -27,6 +38,18 @@ class WelfordAccumulator:
         self.mean = 0.0
         self._M2  = 0.0
 
+    @classmethod
+    def from_moments(cls, n: int, mean: float, M2: float) -> 'WelfordAccumulator':
+        """Rehydrate an accumulator from persisted (n, mean, M2) moments."""
+        acc = cls()
+        acc.n, acc.mean, acc._M2 = n, mean, M2
+        return acc
+
+    @property
+    def M2(self) -> float:
+        """Sum of squared deviations from the mean — the persisted form of variance."""
+        return self._M2
+
     def update(self, x: float):
         self.n   += 1
         delta     = x - self.mean
@@ -47,14 +70,55 @@ class WelfordAccumulator:
             self._M2  = 0.0
             return
         old_mean  = (self.mean * self.n - x) / (self.n - 1)
-        self._M2 -= (x - self.mean) * (x - old_mean)
+        self._M2  = _downdated(self._M2, self._M2 - (x - self.mean) * (x - old_mean))
         self.mean = old_mean
         self.n   -= 1
 
+    def merge(self, other: 'WelfordAccumulator'):
+        """
+        Chan et al. parallel combination — fold another accumulator's
+        moments into this one in O(1):
+
+            n     = n_a + n_b
+            delta = mean_b - mean_a
+            mean  = mean_a + delta · n_b / n
+            M2    = M2_a + M2_b + delta² · n_a · n_b / n
+        """
+        if other.n == 0:
+            return
+        if self.n == 0:
+            self.n, self.mean, self._M2 = other.n, other.mean, other._M2
+            return
+        n         = self.n + other.n
+        delta     = other.mean - self.mean
+        self._M2 += other._M2 + delta * delta * self.n * other.n / n
+        self.mean += delta * other.n / n
+        self.n    = n
+
+    def unmerge(self, other: 'WelfordAccumulator'):
+        """
+        Inverse of merge — remove a sub-population's moments in O(1).
+        Used to drop a whole meal's ratings from a dish rollup.
+        """
+        if other.n == 0:
+            return
+        if other.n >= self.n:
+            self.n    = 0
+            self.mean = 0.0
+            self._M2  = 0.0
+            return
+        n_a       = self.n - other.n
+        mean_a    = (self.mean * self.n - other.mean * other.n) / n_a
+        delta     = other.mean - mean_a
+        self._M2  = _downdated(self._M2, self._M2 - other._M2 - delta * delta * n_a * other.n / self.n)
+        self.mean = mean_a
+        self.n    = n_a
+
     @property
     def variance(self) -> float:
         """Sample variance (Bessel-corrected: divides by n-1)."""
-        return self._M2 / (self.n - 1) if self.n > 1 else 0.0
+        # max(): moments persisted before downdates were clamped may hold M2 < 0.
+        return max(self._M2, 0.0) / (self.n - 1) if self.n > 1 else 0.0
 
     @property
     def std(self) -> float:
@@ -83,6 +147,16 @@ def welford_from_list(ratings: list[float]) -> dict:
     acc = WelfordAccumulator()
     for r in ratings:
         acc.update(r)
+    return welford_summary(acc)
+
+
+def welford_from_moments(n: int, mean: float, M2: float) -> dict:
+    """Same dict as welford_from_list, from materialised (n, mean, M2) moments."""
+    return welford_summary(WelfordAccumulator.from_moments(n, mean, M2))
+
+
+def welford_summary(acc: WelfordAccumulator) -> dict:
+    """Rounded mean/std/variance/n/sharpe_analog dict for an accumulator."""
     if acc.n == 0:
         return {'mean': None, 'std': None, 'variance': None, 'n': 0, 'sharpe_analog': None}
     return {
@@ -153,3 +227,135 @@ def apply_zscores(items: list[dict], key: str = 'avg_rating') -> list[dict]:
         else:
             item['rating_zscore'] = None
     return items
+
+
+# ---------------------------------------------------------------------------
+# Batch (NumPy) versions
+# ---------------------------------------------------------------------------
+#
+# The functions above work on one accumulator or one list at a time. These
+# take whole arrays, so a rebuild or the dashboard snapshot computes every
+# group's statistics in a few vectorised passes instead of a Python loop per
+# rating or per meal. They agree with the scalar versions to floating-point
+# rounding and return unrounded arrays; callers round as the scalar
+# versions do.
+
+def grouped_moments(group_ids, values):
+    """
+    Welford moments (n, mean, M2) of `values` per group id.
+
+    Returns (keys, n, mean, M2) arrays, keys ascending. Two vectorised
+    passes: per-group sums give the means, then squared deviations from
+    each group's own mean are summed, which is as stable as the online
+    update (no sum-of-squares cancellation). Input already sorted by group
+    (e.g. ORDER BY meal_id) is reduced in place with np.add.reduceat;
+    anything else is grouped with np.unique + np.bincount.
+    """
+    group_ids = np.asarray(group_ids)
+    values = np.asarray(values, dtype=float)
+    if group_ids.size == 0:
+        return group_ids, np.zeros(0, dtype=np.int64), np.zeros(0), np.zeros(0)
+
+    if np.all(group_ids[1:] >= group_ids[:-1]):
+        starts = np.concatenate(([0], np.flatnonzero(group_ids[1:] != group_ids[:-1]) + 1))
+        keys = group_ids[starts]
+        n = np.diff(np.append(starts, group_ids.size))
+        mean = np.add.reduceat(values, starts) / n
+        dev = values - np.repeat(mean, n)
+        return keys, n, mean, np.add.reduceat(dev * dev, starts)
+
+    keys, inverse = np.unique(group_ids, return_inverse=True)
+    n = np.bincount(inverse, minlength=keys.size)
+    mean = np.bincount(inverse, weights=values, minlength=keys.size) / n
+    dev = values - mean[inverse]
+    return keys, n, mean, np.bincount(inverse, weights=dev * dev, minlength=keys.size)
+
+
+def merge_moments(keys, n, mean, M2):
+    """
+    Combine partial moments that share a key, e.g. the grouped_moments of
+    several shards concatenated. Chan et al. generalised to k parts:
+
+        N  = Σ n_i
+        μ  = Σ n_i·μ_i / N
+        M2 = Σ M2_i + Σ n_i·(μ_i − μ)²
+
+    Returns (keys, n, mean, M2) with one row per distinct key. Parts with
+    n = 0 contribute nothing; a key with no ratings comes back as (0, 0, 0).
+    """
+    n = np.asarray(n, dtype=float)
+    mean = np.asarray(mean, dtype=float)
+    keys, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    total_n = np.bincount(inverse, weights=n, minlength=keys.size)
+    total = np.bincount(inverse, weights=n * mean, minlength=keys.size)
+    merged_mean = np.divide(total, total_n, out=np.zeros_like(total), where=total_n > 0)
+    delta = mean - merged_mean[inverse]
+    merged_M2 = np.bincount(inverse, weights=np.asarray(M2, dtype=float) + n * delta * delta, minlength=keys.size)
+    return keys, total_n.astype(np.int64), merged_mean, merged_M2
+
+
+def moments_summary(n, mean, M2):
+    """
+    Vectorised WelfordAccumulator properties for arrays of moments: a dict
+    of variance, std and sharpe_analog arrays (unrounded). variance is 0
+    where n < 2, and sharpe_analog is NaN where std is 0 (the scalar
+    version's None).
+    """
+    n = np.asarray(n)
+    M2 = np.maximum(np.asarray(M2, dtype=float), 0.0)
+    variance = np.divide(M2, n - 1, out=np.zeros(M2.shape), where=n > 1)
+    std = np.sqrt(variance)
+    sharpe = np.divide(mean, std, out=np.full(std.shape, np.nan), where=std > 0)
+    return {'variance': variance, 'std': std, 'sharpe_analog': sharpe}
+
+
+def zscores(values):
+    """
+    Vectorised apply_zscores: (x − μ) / σ across the array, with the sample
+    std. NaN inputs are left out of μ and σ and stay NaN; everything is NaN
+    when fewer than two values remain or they are all equal.
+    """
+    x = np.asarray(values, dtype=float)
+    z = np.full(x.shape, np.nan)
+    present = x[~np.isnan(x)]
+    if present.size < 2 or np.ptp(present) == 0:
+        return z
+    np.divide(x - present.mean(), present.std(ddof=1), out=z, where=~np.isnan(x))
+    return z
+
+
+# λ^-k stays below this within one EWMA block: no overflow, and the
+# prefix sums lose at most ~3 digits to the rescaling.
+_EWMA_BLOCK_RANGE = 1e3
+
+
+def ewma(series, decay: float = 0.94):
+    """
+    Vectorised apply_ewma (unrounded). The recurrence is unrolled a block
+    at a time:
+
+        y_j = λ^(j+1)·y_prev + (1−λ)·λ^j·Σ_{k≤j} λ^(−k)·x_k
+
+    with blocks short enough that λ^(−k) stays bounded, carrying y_prev
+    from one block to the next. The first value is its own EWMA, as in the
+    scalar version.
+    """
+    x = np.asarray(series, dtype=float)
+    out = np.empty_like(x)
+    if x.size == 0:
+        return out
+    if not 0 < decay < 1:   # degenerate decay: nothing to vectorise
+        out[0] = x[0]
+        for i in range(1, x.size):
+            out[i] = decay * out[i - 1] + (1 - decay) * x[i]
+        return out
+
+    block = int(min(4096, max(1, math.log(_EWMA_BLOCK_RANGE) / -math.log(decay))))
+    powers = decay ** np.arange(block)
+    prev = x[0]
+    for start in range(0, x.size, block):
+        chunk = x[start:start + block]
+        p = powers[:chunk.size]
+        out[start:start + chunk.size] = p * (decay * prev + (1 - decay) * np.cumsum(chunk / p))
+        prev = out[start + chunk.size - 1]
+    return out
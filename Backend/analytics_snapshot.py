@@ -0,0 +1,333 @@
+"""
+Precomputed admin dashboard analytics.
+
+/api/admin/analytics serves one analytics_snapshots row: the finished
+dashboard payload of the chapter and when it was built. The snapshot is
+assembled from two rollup tables that are kept up to date incrementally:
+
+  analytics_days    one row per chapter and meal date: meal, attendance and
+                    late plate counts, the Welford moments of the day's
+                    ratings and the day's meals with their attendance and
+                    rating moments (for the popular / highest / lowest lists);
+  analytics_weeks   the same totals per Monday-to-Sunday week, merged from
+                    the days (summary totals and the attendance trend).
+
+Dirty tracking. Every write that changes what a day contributes (the
+rollups.py hooks for meals, attendance and ratings, and the late plate
+writers) calls mark_days_dirty / mark_meals_dirty in its own transaction,
+which bumps `marks` on the affected days. refresh_chapter recomputes only
+days with marks > built_marks, records the marks it read as built_marks,
+then re-merges the weeks those days fall in and rebuilds the snapshot. A
+write that commits while a refresh is running leaves marks ahead of
+built_marks, so that day is simply picked up by the next refresh.
+
+refresh_analytics runs every ANALYTICS_REFRESH_INTERVAL seconds on the
+scheduler leader and refreshes chapters that have dirty days, whose chapter
+version (see response_cache.py) has moved since their snapshot (e.g. a new
+member), or whose snapshot predates today (the trend window moves). Once a
+night, and on `flask rebuild-analytics`, every chapter is rebuilt from
+scratch, which also picks up changes nothing marks, such as history the
+retention job purged.
+"""
+import heapq
+import os
+import time
+import numpy as np
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import and_, func, or_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import (Meal, MealAttendance, MealRatingStats, LatePlate, LatePlateHistory, User,
+                    AnalyticsDay, AnalyticsWeek, AnalyticsSnapshot)
+from analytics import WelfordAccumulator, apply_ewma, moments_summary, zscores
+from response_cache import chapter_version
+from queries import dirty_analytics_chapters, marked_analytics_days
+
+ANALYTICS_REFRESH_INTERVAL = int(os.getenv('ANALYTICS_REFRESH_INTERVAL', 60))
+TREND_WEEKS = 8
+POPULAR_MEALS = 10
+RATED_MEALS = 5
+
+# pg advisory lock (with the chapter key) held while a chapter is refreshed,
+# so the job and a ?fresh=1 request don't rebuild the same chapter at once.
+_REFRESH_LOCK = 0x616e6c79   # 'anly'
+
+
+def _chapter_key(chapter_id):
+    # Chapterless meals share one bucket, as in the response cache.
+    return chapter_id or 0
+
+
+def _week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+# ---------------------------------------------------------------------------
+# Dirty marking (write path)
+# ---------------------------------------------------------------------------
+
+def mark_days_dirty(pairs):
+    """
+    Mark the analytics days of (chapter_id, meal_date) pairs dirty in the
+    caller's transaction. Rows are upserted in key order so concurrent
+    writers lock them in the same order.
+    """
+    keys = sorted({(_chapter_key(chapter_id), when.date() if isinstance(when, datetime) else when)
+                   for chapter_id, when in pairs})
+    if keys:
+        stmt = pg_insert(AnalyticsDay).values([{'chapter_id': c, 'day': d, 'marks': 1} for c, d in keys])
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[AnalyticsDay.chapter_id, AnalyticsDay.day],
+            set_={'marks': AnalyticsDay.marks + 1},
+        ))
+
+
+def mark_meals_dirty(meal_ids):
+    """mark_days_dirty for the days of the given meals."""
+    meal_ids = list(meal_ids)
+    if meal_ids:
+        mark_days_dirty(db.session.query(Meal.chapter_id, Meal.meal_date).filter(Meal.id.in_(meal_ids)).all())
+
+
+# ---------------------------------------------------------------------------
+# Recomputing days and weeks
+# ---------------------------------------------------------------------------
+
+def _meal_scope(chapter_id, days):
+    clauses = [Meal.chapter_id.is_(None) if chapter_id is None else Meal.chapter_id == chapter_id]
+    if days is not None:
+        clauses.append(or_(*(and_(Meal.meal_date >= d, Meal.meal_date < d + timedelta(days=1)) for d in days)))
+    return clauses
+
+
+def _compute_days(chapter_id, days=None):
+    """
+    The chapter's day rows recomputed from meals, attendance, rating stats
+    and late plates (live and archived), for `days` or for every day when
+    None. Returns {day: row dict}; days without meals are absent.
+    """
+    scope = _meal_scope(chapter_id, days)
+    meal_ids = db.select(Meal.id).where(*scope)
+
+    def per_meal(column):
+        return dict(db.session.query(column, func.count()).filter(column.in_(meal_ids)).group_by(column).all())
+
+    attendance = per_meal(MealAttendance.meal_id)
+    late_plates = Counter(per_meal(LatePlate.meal_id))
+    late_plates.update(per_meal(LatePlateHistory.meal_id))
+    ratings = {meal_id: (n, mean, m2) for meal_id, n, mean, m2 in db.session.query(
+        MealRatingStats.meal_id, MealRatingStats.n, MealRatingStats.mean, MealRatingStats.m2,
+    ).filter(MealRatingStats.meal_id.in_(meal_ids), MealRatingStats.n > 0)}
+
+    rows = {}
+    for meal in db.session.query(Meal.id, Meal.dish_name, Meal.meal_type, Meal.meal_date).filter(*scope):
+        row = rows.setdefault(meal.meal_date.date(), {
+            'meal_count': 0, 'attendance_total': 0, 'late_plate_count': 0,
+            'ratings': WelfordAccumulator(), 'meals': [],
+        })
+        n, mean, m2 = ratings.get(meal.id, (0, 0.0, 0.0))
+        row['meal_count'] += 1
+        row['attendance_total'] += attendance.get(meal.id, 0)
+        row['late_plate_count'] += late_plates[meal.id]
+        if n:
+            row['ratings'].merge(WelfordAccumulator.from_moments(n, mean, m2))
+        row['meals'].append({
+            'id': meal.id, 'dish_name': meal.dish_name, 'meal_type': meal.meal_type,
+            'meal_date': meal.meal_date.isoformat(), 'attendance': attendance.get(meal.id, 0),
+            'n': n, 'mean': mean, 'm2': m2,
+        })
+    return rows
+
+
+def _upsert(model, keys, rows):
+    # executemany: one compiled statement, batched into multi-row VALUES by the driver layer.
+    stmt = pg_insert(model)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=keys,
+        set_={c: stmt.excluded[c] for c in rows[0] if c not in keys and c != 'marks'},
+    ), rows)
+
+
+def _store_days(key, fresh, seen):
+    """
+    Write the recomputed rows for every day in `seen` (day -> marks read
+    before recomputing) and `fresh`. Days that no longer have meals are
+    zeroed. built_marks is set to the marks that were read, so a day marked
+    again meanwhile stays dirty.
+    """
+    rows = []
+    for day in sorted(seen.keys() | fresh.keys()):
+        row = fresh.get(day)
+        acc = row['ratings'] if row else WelfordAccumulator()
+        rows.append({
+            'chapter_id': key, 'day': day,
+            'meal_count': row['meal_count'] if row else 0,
+            'attendance_total': row['attendance_total'] if row else 0,
+            'late_plate_count': row['late_plate_count'] if row else 0,
+            'n': acc.n, 'mean': acc.mean, 'm2': acc.M2,
+            'meals': row['meals'] if row else [],
+            'marks': seen.get(day, 0), 'built_marks': seen.get(day, 0),
+        })
+    if rows:
+        _upsert(AnalyticsDay, ['chapter_id', 'day'], rows)
+
+
+def _store_weeks(key, days, week_starts, full):
+    """Re-merge the weeks in `week_starts` (every week when `full`) from the chapter's day rows."""
+    weeks = {}
+    for day in days:
+        week = _week_start(day.day)
+        if full or week in week_starts:
+            w = weeks.setdefault(week, {'meal_count': 0, 'attendance_total': 0, 'late_plate_count': 0,
+                                        'ratings': WelfordAccumulator()})
+            w['meal_count'] += day.meal_count
+            w['attendance_total'] += day.attendance_total
+            w['late_plate_count'] += day.late_plate_count
+            w['ratings'].merge(WelfordAccumulator.from_moments(day.n, day.mean, day.m2))
+    for week in week_starts - weeks.keys():
+        weeks[week] = {'meal_count': 0, 'attendance_total': 0, 'late_plate_count': 0, 'ratings': WelfordAccumulator()}
+    if full:
+        AnalyticsWeek.query.filter(AnalyticsWeek.chapter_id == key, AnalyticsWeek.week_start.notin_(list(weeks))
+                                   ).delete(synchronize_session=False)
+    if weeks:
+        _upsert(AnalyticsWeek, ['chapter_id', 'week_start'], [{
+            'chapter_id': key, 'week_start': week,
+            'meal_count': w['meal_count'], 'attendance_total': w['attendance_total'],
+            'late_plate_count': w['late_plate_count'],
+            'n': w['ratings'].n, 'mean': w['ratings'].mean, 'm2': w['ratings'].M2,
+        } for week, w in sorted(weeks.items())])
+
+
+# ---------------------------------------------------------------------------
+# Snapshot
+# ---------------------------------------------------------------------------
+
+def _build_payload(chapter_id, days, weeks):
+    """The /api/admin/analytics body, from the chapter's day and week rows."""
+    total_users = User.query.filter(
+        User.chapter_id.is_(None) if chapter_id is None else User.chapter_id == chapter_id).count()
+
+    ratings = WelfordAccumulator()
+    for w in weeks:
+        ratings.merge(WelfordAccumulator.from_moments(w.n, w.mean, w.m2))
+
+    meals = [m for day in days for m in day.meals]
+    popular = heapq.nlargest(POPULAR_MEALS, (m for m in meals if m['attendance']),
+                             key=lambda m: (m['attendance'], m['meal_date']))
+    popular_meals = [{
+        'id': m['id'], 'dish_name': m['dish_name'], 'meal_type': m['meal_type'],
+        'meal_date': m['meal_date'], 'attendance_count': m['attendance'],
+        'attendance_pct': round(m['attendance'] / total_users * 100, 1) if total_users > 0 else 0,
+    } for m in popular]
+
+    # Every rated meal, z-scored against the chapter baseline before slicing
+    # highest/lowest. The per-meal statistics are computed as arrays; only
+    # the meals that are shown become dicts.
+    rated = sorted((m for m in meals if m['n']), key=lambda m: -m['mean'])
+    n = np.array([m['n'] for m in rated], dtype=np.int64)
+    mean = np.array([m['mean'] for m in rated])
+    stats = moments_summary(n, mean, np.array([m['m2'] for m in rated]))
+    avg_rating = [round(v, 2) for v in mean.tolist()]
+    rating_zscore = zscores(avg_rating)
+
+    def rated_meal(i):
+        m, sharpe, z = rated[i], stats['sharpe_analog'][i], rating_zscore[i]
+        return {
+            'id': m['id'], 'dish_name': m['dish_name'], 'meal_date': m['meal_date'],
+            'avg_rating': avg_rating[i], 'review_count': m['n'], 'rating_std': round(float(stats['std'][i]), 3),
+            'sharpe_analog': None if np.isnan(sharpe) else round(float(sharpe), 3),
+            'rating_zscore': None if np.isnan(z) else round(float(z), 3),
+        }
+
+    # Meals from TREND_WEEKS ago on, by week. The window usually starts mid-
+    # week, so its first week is summed from the days inside it; the rest
+    # are whole weeks. Snapshots are rebuilt daily, which moves the window.
+    since = date.today() - timedelta(weeks=TREND_WEEKS)
+    first_week = _week_start(since)
+    head = [d for d in days if since <= d.day < first_week + timedelta(weeks=1)]
+    trend = [(first_week, sum(d.attendance_total for d in head), sum(d.meal_count for d in head))]
+    trend += [(w.week_start, w.attendance_total, w.meal_count) for w in weeks if w.week_start > first_week]
+    attendance_trend = [{
+        'week_start': week_start.isoformat(),
+        'total_attendance': attendance_total,
+        'meal_count': meal_count,
+        'avg_per_meal': round(attendance_total / meal_count, 1),
+    } for week_start, attendance_total, meal_count in trend if meal_count]
+    # EWMA (λ=0.94) smooths week-over-week noise in the attendance rate.
+    for week_data, ewma_val in zip(attendance_trend, apply_ewma([w['avg_per_meal'] for w in attendance_trend])):
+        week_data['ewma_avg_per_meal'] = ewma_val
+
+    return {
+        'summary': {
+            'total_users': total_users,
+            'total_meals': sum(w.meal_count for w in weeks),
+            'total_reviews': ratings.n,
+            'total_late_plates': sum(w.late_plate_count for w in weeks),
+            'overall_avg_rating': round(ratings.mean, 2) if ratings.n else None,
+        },
+        'popular_meals': popular_meals,
+        'highest_rated': [rated_meal(i) for i in range(min(RATED_MEALS, len(rated)))],
+        'lowest_rated': [rated_meal(i) for i in range(len(rated) - RATED_MEALS, len(rated))] if len(rated) >= RATED_MEALS else [],
+        'attendance_trend': attendance_trend,
+    }
+
+
+def refresh_chapter(chapter_id, full=False):
+    """
+    Recompute the chapter's dirty days (every day when `full`, or when it
+    has no snapshot yet), re-merge the weeks they fall in, rebuild the
+    snapshot and commit. Returns the AnalyticsSnapshot.
+    """
+    t0 = time.perf_counter()
+    key = _chapter_key(chapter_id)
+    db.session.execute(db.select(func.pg_advisory_xact_lock(_REFRESH_LOCK, key)))
+    version = chapter_version(chapter_id)
+    full = full or db.session.get(AnalyticsSnapshot, key) is None
+
+    seen = dict(marked_analytics_days(key, dirty_only=not full).all())
+    fresh = _compute_days(chapter_id, None if full else list(seen)) if full or seen else {}
+    _store_days(key, fresh, seen)
+
+    days = db.session.query(
+        AnalyticsDay.day, AnalyticsDay.meal_count, AnalyticsDay.attendance_total, AnalyticsDay.late_plate_count,
+        AnalyticsDay.n, AnalyticsDay.mean, AnalyticsDay.m2, AnalyticsDay.meals,
+    ).filter(AnalyticsDay.chapter_id == key).all()
+    _store_weeks(key, days, {_week_start(d) for d in seen.keys() | fresh.keys()}, full)
+    weeks = AnalyticsWeek.query.filter_by(chapter_id=key).order_by(AnalyticsWeek.week_start).all()
+
+    values = {
+        'payload': _build_payload(chapter_id, days, weeks), 'source_version': version,
+        'built_at': datetime.now(timezone.utc), 'build_ms': round((time.perf_counter() - t0) * 1000, 1),
+    }
+    db.session.execute(pg_insert(AnalyticsSnapshot).values(chapter_id=key, **values).on_conflict_do_update(
+        index_elements=[AnalyticsSnapshot.chapter_id], set_=values))
+    db.session.commit()
+    return db.session.get(AnalyticsSnapshot, key, populate_existing=True)
+
+
+def refresh_analytics(full=False):
+    """
+    Refresh every chapter whose snapshot is out of date: it has dirty days,
+    its chapter version moved or it was built before today. With `full`,
+    rebuild every chapter that has a snapshot from scratch. Each chapter
+    commits on its own. Returns the number of chapters refreshed.
+    """
+    due = {key for (key,) in dirty_analytics_chapters()}
+    for snapshot in db.session.query(
+            AnalyticsSnapshot.chapter_id, AnalyticsSnapshot.source_version, AnalyticsSnapshot.built_at):
+        if (full or snapshot.source_version != chapter_version(snapshot.chapter_id or None)
+                or snapshot.built_at.astimezone().date() < date.today()):
+            due.add(snapshot.chapter_id)
+    db.session.commit()   # don't hold the snapshot read open across the rebuilds
+
+    refreshed = 0
+    for key in sorted(due):
+        try:
+            refresh_chapter(key or None, full=full)
+            refreshed += 1
+        except Exception as e:
+            db.session.rollback()
+            print(f"[Analytics] Refreshing chapter {key} failed: {e}")
+    return refreshed
@@ -1,18 +1,18 @@
 import os
 import secrets
 import string
-from datetime import datetime
+import time
 from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_migrate import Migrate
 from flask_marshmallow import Marshmallow
 from dotenv import load_dotenv
+from sqlalchemy import text
 import click
 
 load_dotenv()
 
 from database import db
-from extensions import bcrypt
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
@@ -40,11 +40,21 @@ CORS(
 )
 
 db.init_app(app)
-bcrypt.init_app(app)
 Migrate(app, db)
 Marshmallow(app)
 
-from models import User, Meal, LatePlate, Chapter, HouseSettings
+from models import (User, Meal, Dish, Chapter, HouseSettings, JobRun, EmailOutbox, AnalyticsDay, AnalyticsWeek,
+                    AnalyticsSnapshot)
+from rollups import rebuild_rollups
+from images import process_image_jobs, queue_variant_backfill
+from email_utils import dispatch_emails, requeue_dead_emails, prune_email_outbox
+from presets import apply_presets_to_upcoming_meals
+from retention import archive_late_plates
+from analytics_snapshot import refresh_analytics, refresh_chapter, ANALYTICS_REFRESH_INTERVAL
+from response_cache import invalidate_chapter_on_write, bump_all_chapter_versions, bump_chapter_version
+from query_plans import check_hot_query_plans
+from passwords import hash_password
+from scheduler import scheduled_job, run_job, start_scheduler, registered_jobs
 
 # ---------------------------------------------------------------------------
 # Register blueprints
@@ -56,6 +66,12 @@ from routes.attendance import attendance_bp
 from routes.late_plates import late_plates_bp
 from routes.weekly_presets import weekly_presets_bp
 from routes.admin import admin_bp
+from routes.export import export_bp
+
+# Writes through these bump the chapter version that keys the cached menu
+# payloads and the ETags of conditional GETs.
+for bp in (auth_bp, meals_bp, reviews_bp, attendance_bp, late_plates_bp, weekly_presets_bp, admin_bp):
+    invalidate_chapter_on_write(bp)
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(meals_bp)
@@ -64,6 +80,7 @@ app.register_blueprint(attendance_bp)
 app.register_blueprint(late_plates_bp)
 app.register_blueprint(weekly_presets_bp)
 app.register_blueprint(admin_bp)
+app.register_blueprint(export_bp)
 
 
 # ---------------------------------------------------------------------------
@@ -80,19 +97,72 @@ def serve_upload(filename):
 # Background scheduler
 # ---------------------------------------------------------------------------
 
+# Jobs run on whichever process holds the scheduler's leader lock, inside an
+# app context; each returns the number of rows it touched for job_runs.
+
+@scheduled_job('cron', hour=0, minute=0)
 def cleanup_old_late_plates():
-    """Delete all late plate requests from before today."""
-    with app.app_context():
-        today = datetime.now().date()
-        deleted = LatePlate.query.filter(LatePlate.request_date < today).delete()
-        db.session.commit()
-        print(f"[Cleanup] Deleted {deleted} late plate request(s) older than today.")
+    """Archive expired late plate requests into late_plate_history and purge old history."""
+    report = archive_late_plates()
+    print(f"[Retention] Archived {report['archived']} late plate(s) before {report['archive_cutoff']}, "
+          f"purged {report['purged']} from history in {report['chunks']} chunk(s) {report['timings_ms']}.")
+    return report['archived'] + report['purged']
+
+
+@scheduled_job('cron', minute=5)
+def apply_weekly_presets_job():
+    """Apply every member's weekly presets to meals coming up in the next few days."""
+    report = apply_presets_to_upcoming_meals()
+    if report is None:
+        print("[Presets] Another instance is applying presets; skipped.")
+        return None
+    if report['meals']:
+        print(f"[Presets] {report['meals']} meal(s): +{report['attendance_added']} / "
+              f"-{report['attendance_removed']} attendance, +{report['late_plates_added']} late plate(s) "
+              f"in {report['timings_ms']['total']} ms {report['timings_ms']}.")
+    return report['attendance_added'] + report['attendance_removed'] + report['late_plates_added']
+
+
+@scheduled_job('interval', record_idle=False, seconds=int(os.getenv('IMAGE_WORKER_INTERVAL', 15)))
+def drain_image_jobs():
+    """Store any meal images that are waiting in the image_jobs queue."""
+    report = process_image_jobs()
+    if report['claimed']:
+        print(f"[Images] {report['stored']} stored, {report['retrying']} retrying, {report['failed']} failed.")
+    return report['claimed']
+
 
+@scheduled_job('interval', record_idle=False, seconds=int(os.getenv('EMAIL_DISPATCH_INTERVAL', 5)))
+def dispatch_email_outbox():
+    """Send queued transactional email (verification, password reset)."""
+    report = dispatch_emails()
+    if report['claimed']:
+        print(f"[Email] {report['sent']} sent, {report['retrying']} retrying, {report['dead']} dead-lettered.")
+    return report['claimed']
 
-from apscheduler.schedulers.background import BackgroundScheduler
-scheduler = BackgroundScheduler()
-scheduler.add_job(cleanup_old_late_plates, 'cron', hour=0, minute=0)
-scheduler.start()
+
+@scheduled_job('cron', hour=0, minute=45)
+def prune_sent_emails():
+    """Delete sent and superseded outbox rows past their retention."""
+    return prune_email_outbox()
+
+
+@scheduled_job('interval', record_idle=False, seconds=ANALYTICS_REFRESH_INTERVAL)
+def refresh_analytics_snapshots():
+    """Bring admin dashboard snapshots with dirty days or a moved chapter version up to date."""
+    return refresh_analytics()
+
+
+@scheduled_job('cron', hour=1, minute=0)
+def rebuild_analytics_snapshots():
+    """Rebuild every admin dashboard snapshot from scratch (after the retention purge)."""
+    return refresh_analytics(full=True)
+
+
+# Under `python app.py` the password hashing pool's fork server imports this
+# module again, as __mp_main__; only the real process schedules jobs.
+if __name__ != '__mp_main__':
+    start_scheduler(app)
 
 
 # ---------------------------------------------------------------------------
@@ -107,15 +177,132 @@ def make_admin(email):
     if user:
         user.is_admin = True
         db.session.commit()
-        print(f"User {email} has been set as an admin.")
+        # Running workers cache principals per process; they see the new
+        # role once their snapshot expires.
+        print(f"User {email} has been set as an admin. Running servers pick this up "
+              "within PRINCIPAL_CACHE_TTL seconds.")
     else:
         print(f"User {email} not found.")
 
 
 @app.cli.command("cleanup-late-plates")
 def cleanup_late_plates_cmd():
-    """Manually delete all late plate requests from before today."""
-    cleanup_old_late_plates()
+    """Manually archive expired late plate requests (see retention.py)."""
+    run_job('cleanup_old_late_plates')
+
+
+@app.cli.command("apply-presets")
+def apply_presets_cmd():
+    """Applies all members' weekly presets to upcoming meals that haven't had them applied."""
+    run_job('apply_weekly_presets_job')
+
+
+@app.cli.command("scheduler")
+def scheduler_cmd():
+    """Runs the job scheduler in the foreground (joins the leader election like a web worker)."""
+    start_scheduler(app, force=True)
+    print(f"Scheduler started with {len(registered_jobs())} job(s); Ctrl-C to stop.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+@app.cli.command("job-runs")
+@click.option("--job", default=None, help="Only show runs of this job")
+@click.option("--limit", default=20, show_default=True)
+def job_runs_cmd(job, limit):
+    """Shows the most recent scheduled job runs."""
+    runs = JobRun.query
+    if job:
+        runs = runs.filter(JobRun.job_name == job)
+    for r in runs.order_by(JobRun.started_at.desc()).limit(limit):
+        print(f"{r.started_at:%Y-%m-%d %H:%M:%S} {r.job_name:<26} {r.status:<5} {r.duration_ms:>9.1f} ms "
+              f"rows={r.rows if r.rows is not None else '-':<6} {r.host or ''}" + (f"  {r.error}" if r.error else ""))
+
+
+@app.cli.command("image-worker")
+@click.option("--once", is_flag=True, default=False, help="Drain the queue once and exit")
+@click.option("--interval", default=2.0, show_default=True, help="Seconds to sleep when the queue is empty")
+def image_worker_cmd(once, interval):
+    """Processes queued meal image uploads until interrupted."""
+    while True:
+        report = process_image_jobs()
+        if report['claimed']:
+            print(f"[Images] {report['stored']} stored, {report['retrying']} retrying, {report['failed']} failed.")
+        elif once:
+            break
+        else:
+            time.sleep(interval)
+
+
+@app.cli.command("email-worker")
+@click.option("--once", is_flag=True, default=False, help="Drain the outbox once and exit")
+@click.option("--interval", default=1.0, show_default=True, help="Seconds to sleep when the outbox is empty")
+def email_worker_cmd(once, interval):
+    """Sends queued transactional email until interrupted."""
+    while True:
+        report = dispatch_emails()
+        if report['claimed']:
+            print(f"[Email] {report['sent']} sent, {report['retrying']} retrying, {report['dead']} dead-lettered.")
+        elif once:
+            break
+        else:
+            time.sleep(interval)
+
+
+@app.cli.command("email-outbox")
+@click.option("--requeue-dead", is_flag=True, default=False, help="Retry every dead-lettered message")
+def email_outbox_cmd(requeue_dead):
+    """Shows the outbox backlog and dead letters."""
+    if requeue_dead:
+        print(f"Requeued {requeue_dead_emails()} dead-lettered message(s).")
+    counts = db.session.query(EmailOutbox.status, db.func.count()).group_by(EmailOutbox.status).all()
+    print(', '.join(f"{status}: {n}" for status, n in sorted(counts)) or "Outbox is empty.")
+    for m in EmailOutbox.query.filter_by(status='dead').order_by(EmailOutbox.id.desc()).limit(20):
+        print(f"dead #{m.id} {m.kind:<12} {m.to_email:<32} attempts={m.attempts}  {m.last_error}")
+
+
+@app.cli.command("backfill-image-variants")
+def backfill_image_variants_cmd():
+    """Queues meal images stored before variants existed for resizing."""
+    print(f"Queued {queue_variant_backfill()} image(s); run `flask image-worker` to process them.")
+
+
+@app.cli.command("rebuild-rollups")
+@click.option("--verify-only", is_flag=True, default=False, help="Report drift without rewriting the rollups")
+def rebuild_rollups_cmd(verify_only):
+    """Recomputes meal rating and dish rollups from meals, attendance and reviews and reports drift."""
+    report = rebuild_rollups(apply=not verify_only)
+    if report['applied']:
+        bump_all_chapter_versions()
+        run_job('rebuild_analytics_snapshots')
+    print(f"Checked {report['meals_checked']} meal rollup(s): {len(report['meals_drifted'])} drifted"
+          + (f" {report['meals_drifted'][:20]}" if report['meals_drifted'] else "") + ".")
+    print(f"Checked {report['dishes_checked']} dish rollup(s): {len(report['dishes_drifted'])} drifted"
+          + (f" {report['dishes_drifted'][:20]}" if report['dishes_drifted'] else "") + ".")
+    print("Rollups rebuilt." if report['applied'] else "Verify only — nothing written.")
+
+
+@app.cli.command("rebuild-analytics")
+def rebuild_analytics_cmd():
+    """Rebuilds every chapter's admin dashboard rollups and snapshot from scratch."""
+    print(f"Rebuilt {run_job('rebuild_analytics_snapshots') or 0} chapter snapshot(s).")
+
+
+@app.cli.command("explain-hot-queries")
+def explain_hot_queries_cmd():
+    """EXPLAINs the hot read queries; exits non-zero if any has to read a whole table."""
+    results = check_hot_query_plans()
+    for r in results:
+        detail = f"full scan of {', '.join(r['full_scans'])}" if not r['ok'] else ', '.join(r['indexes'])
+        print(f"{'ok  ' if r['ok'] else 'FAIL'} {r['name']}: {detail}")
+    failed = [r['name'] for r in results if not r['ok']]
+    if failed:
+        print(f"{len(failed)} hot quer{'y' if len(failed) == 1 else 'ies'} fell back to a full scan.")
+        raise SystemExit(1)
+    print(f"All {len(results)} hot queries are index-backed.")
 
 
 @app.cli.command("create-user")
@@ -140,7 +327,7 @@ def create_user(email, password, first_name, last_name, access_code, admin, owne
             return
         chapter_id = chapter.id
 
-    hashed = bcrypt.generate_password_hash(password).decode('utf-8')
+    hashed = hash_password(password)
     user = User(
         email=email,
         password_hash=hashed,
@@ -166,7 +353,10 @@ def make_owner(email):
     if user:
         user.is_owner = True
         db.session.commit()
-        print(f"User {email} has been set as an owner.")
+        # Running workers cache principals per process; they see the new
+        # role once their snapshot expires.
+        print(f"User {email} has been set as an owner. Running servers pick this up "
+              "within PRINCIPAL_CACHE_TTL seconds.")
     else:
         print(f"User {email} not found.")
 
@@ -189,7 +379,7 @@ def create_chapter_cmd(name):
 
 @app.cli.command("migrate-to-chapters")
 def migrate_to_chapters():
-    """Seeds a default chapter from HouseSettings and assigns all un-assigned users and meals."""
+    """Seeds a default chapter from HouseSettings and assigns all un-assigned users, meals and dishes."""
     setting = HouseSettings.query.filter_by(key='access_code').first()
     existing_code = setting.value if setting and setting.value else None
     if not existing_code:
@@ -211,7 +401,34 @@ def migrate_to_chapters():
     meals_updated = Meal.query.filter_by(chapter_id=None).update({'chapter_id': default_chapter.id})
     print(f"Assigned {meals_updated} meal(s) to Default chapter")
 
+    # The meals' dishes follow them. A chapterless dish named like one the
+    # chapter already has (or like another chapterless dish) is folded into
+    # it, its meals repointed; rollups are rebuilt below.
+    ranked = """
+        WITH ranked AS (
+            SELECT id, first_value(id) OVER (PARTITION BY name ORDER BY chapter_id IS NULL, id) AS keeper
+            FROM dishes WHERE chapter_id IS NULL OR chapter_id = :chapter_id
+        )
+    """
+    params = {'chapter_id': default_chapter.id}
+    db.session.execute(text(ranked + """
+        UPDATE meals SET dish_id = r.keeper FROM ranked r WHERE meals.dish_id = r.id AND r.id <> r.keeper
+    """), params)
+    dishes_merged = db.session.execute(text(ranked + """
+        DELETE FROM dishes USING ranked r WHERE dishes.id = r.id AND r.id <> r.keeper
+    """), params).rowcount
+    dishes_moved = Dish.query.filter_by(chapter_id=None).update({'chapter_id': default_chapter.id})
+    print(f"Assigned {dishes_moved} dish(es) to Default chapter, merged {dishes_merged} into same-name dishes")
+
+    # Analytics kept chapterless meals under key 0; that data now belongs
+    # to the Default chapter and is recomputed there from scratch.
+    for model in (AnalyticsDay, AnalyticsWeek, AnalyticsSnapshot):
+        model.query.filter_by(chapter_id=0).delete()
     db.session.commit()
+
+    rebuild_rollups(apply=True)
+    refresh_chapter(default_chapter.id, full=True)
+    bump_chapter_version(default_chapter.id)
     print("Migration complete!")
 
 
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the hot paths.
+
+Each script seeds its own synthetic data, so it runs against
+TEST_DATABASE_URL, a database it is free to wipe, and never DATABASE_URL.
+Run them from Backend/ as modules:
+
+    TEST_DATABASE_URL=postgresql:///ordo_bench python -m benchmarks.menu_enrichment
+
+login.py and test_stats.py need no database; test_stats.py is a
+pytest-benchmark suite (`pytest benchmarks`).
+"""
@@ -0,0 +1,100 @@
+"""
+Menu attendance counts vs. platform-wide attendance history.
+
+20 chapters of 50 members, each with 14 meals this week. Past meals, each
+attended by the whole chapter, are added across all chapters until
+meal_attendance holds up to 1M rows. At each size the script times
+GET /api/menu and /api/today-meals for one member, with the chapter's
+version bumped before every request so each one rebuilds the cached
+payload and counts attendance again. The counts are per selected meal,
+so the times should stay flat however large meal_attendance grows.
+
+    TEST_DATABASE_URL=... python -m benchmarks.attendance_counts [--sizes 0,100000,500000,1000000]
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import text
+
+from benchmarks.common import load_app, reset_schema, insert_meals, auth_headers, median_ms
+
+app = load_app()
+
+from database import db
+from helpers import week_range
+from response_cache import bump_chapter_version
+
+CHAPTERS = 20
+MEMBERS = 50
+
+
+def seed():
+    db.session.execute(text("INSERT INTO chapters (id, name) SELECT g, 'Chapter ' || g FROM generate_series(1, :c) g"),
+                       {'c': CHAPTERS})
+    db.session.execute(text("""
+        INSERT INTO users (email, password_hash, name, first_name, last_name, chapter_id, is_admin, is_owner)
+        SELECT 'user' || g || '@bench', 'x', 'User ' || g, 'User', g::text, 1 + (g - 1) / :m, false, false
+        FROM generate_series(1, :c * :m) g
+    """), {'c': CHAPTERS, 'm': MEMBERS})
+    week_start, _ = week_range(datetime.now())
+    insert_meals("""
+        SELECT CAST(:start AS timestamp) + g * interval '11 hours' AS meal_date,
+               CASE WHEN g % 2 = 0 THEN 'Lunch' ELSE 'Dinner' END AS meal_type,
+               'Week dish ' || g AS dish_name, c AS chapter_id
+        FROM generate_series(0, 13) g, generate_series(1, :chapters) c
+    """, start=week_start, chapters=CHAPTERS)
+    db.session.commit()
+
+
+def grow_history(total):
+    """Add past meals, each attended by its whole chapter, until meal_attendance has about `total` rows."""
+    have = db.session.execute(text("SELECT count(*) FROM meals WHERE dish_name LIKE 'Past dish %'")).scalar()
+    want = total // MEMBERS
+    if want <= have:
+        return
+    insert_meals("""
+        SELECT now() - interval '60 days' - g * interval '1 minute' AS meal_date, 'Lunch' AS meal_type,
+               'Past dish ' || (g % 400) AS dish_name, 1 + g % :chapters AS chapter_id
+        FROM generate_series(:first, :last) g
+    """, first=have + 1, last=want, chapters=CHAPTERS)
+    db.session.execute(text("""
+        INSERT INTO meal_attendance (meal_id, user_id)
+        SELECT m.id, u.id FROM meals m JOIN users u ON u.chapter_id = m.chapter_id
+        WHERE m.dish_name LIKE 'Past dish %' AND m.id > (SELECT coalesce(max(meal_id), 0) FROM meal_attendance)
+    """))
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='0,100000,500000,1000000', help='Comma-separated attendance row counts')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    headers = auth_headers(1)
+    with app.app_context():
+        reset_schema()
+        seed()
+
+    def uncached_get(path):
+        def get():
+            with app.app_context():
+                bump_chapter_version(1)
+            response = client.get(path, headers=headers)
+            assert response.status_code == 200, response.data[:200]
+        return get
+
+    print(f"{'attendance rows':>16}  {'/api/menu ms':>12}  {'/api/today-meals ms':>19}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        with app.app_context():
+            grow_history(size)
+            rows = db.session.execute(text('SELECT count(*) FROM meal_attendance')).scalar()
+        menu_ms = median_ms(uncached_get('/api/menu'), args.runs)
+        today_ms = median_ms(uncached_get('/api/today-meals'), args.runs)
+        print(f"{rows:>16,}  {menu_ms:>12.1f}  {today_ms:>19.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Setup shared by the benchmark scripts: importing the app against
+TEST_DATABASE_URL, rebuilding the schema, bulk seeding and timing.
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+
+def load_app():
+    """
+    Import the app against TEST_DATABASE_URL with the scheduler off and
+    passwords hashed inline at a low cost. Returns the Flask app.
+    """
+    url = os.getenv('TEST_DATABASE_URL')
+    if not url:
+        sys.exit('Set TEST_DATABASE_URL to a database the benchmark may wipe.')
+    os.environ['DATABASE_URL'] = url
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.environ.setdefault('JWT_SECRET', 'benchmark')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+    from app import app
+    return app
+
+
+def reset_schema():
+    """Drop every table and recreate the schema from models.py."""
+    from sqlalchemy import text
+    from database import db
+    db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+    db.session.commit()
+    db.drop_all()
+    db.create_all()
+
+
+def insert_meals(source, **params):
+    """
+    Insert the meals produced by `source`, a SELECT of (meal_date,
+    meal_type, dish_name, chapter_id), filing each under its chapter's dish
+    of that name and creating the dishes first. Dish rollups are left at
+    zero; run rollups.rebuild_rollups() when the benchmark reads them.
+    """
+    from sqlalchemy import text
+    from database import db
+    db.session.execute(text(f"""
+        INSERT INTO dishes (chapter_id, name, times_served, served_by_type, attendance_total, n, mean, m2)
+        SELECT chapter_id, dish_name, 0, CAST('{{}}' AS json), 0, 0, 0, 0
+        FROM (SELECT DISTINCT chapter_id, dish_name FROM ({source}) s) d
+        ON CONFLICT ON CONSTRAINT chapter_dish_uc DO NOTHING
+    """), params)
+    db.session.execute(text(f"""
+        INSERT INTO meals (meal_date, meal_type, dish_name, chapter_id, dish_id)
+        SELECT s.meal_date, s.meal_type, s.dish_name, s.chapter_id, d.id
+        FROM ({source}) s JOIN dishes d ON d.chapter_id = s.chapter_id AND d.name = s.dish_name
+    """), params)
+
+
+def auth_headers(user_id):
+    """Bearer header for `user_id`, signed the way /api/login signs it."""
+    import jwt
+    payload = {'user_id': user_id, 'exp': datetime.now() + timedelta(hours=1)}
+    return {'Authorization': 'Bearer ' + jwt.encode(payload, os.getenv('JWT_SECRET'), algorithm='HS256')}
+
+
+def median_ms(fn, runs=20, warmup=1):
+    """Median wall time of `fn()` in milliseconds, after `warmup` untimed calls."""
+    for _ in range(warmup):
+        fn()
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
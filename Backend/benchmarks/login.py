@@ -0,0 +1,54 @@
+"""
+Password-check throughput and latency through the hashing pool.
+
+`--concurrency` threads check a password in a loop for `--seconds`, as
+that many simultaneous logins would, at the configured BCRYPT_LOG_ROUNDS
+and PASSWORD_HASH_WORKERS. A check turned away with PasswordHasherBusy
+(a 429 to the client) backs off briefly, as a client honouring Retry-After
+would. Use it when picking the cost for a host. Needs no database.
+
+    BCRYPT_LOG_ROUNDS=12 python -m benchmarks.login [--concurrency 16] [--seconds 10]
+"""
+import argparse
+import threading
+import time
+
+from passwords import hash_password, check_password, PasswordHasherBusy, BCRYPT_LOG_ROUNDS, PASSWORD_HASH_WORKERS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--concurrency', type=int, default=16, help='Simultaneous logins')
+    parser.add_argument('--seconds', type=float, default=10.0)
+    args = parser.parse_args()
+
+    pw_hash = hash_password('benchmark-password')
+    latencies, busy = [], [0]
+    deadline = time.perf_counter() + args.seconds
+
+    def login_loop():
+        while time.perf_counter() < deadline:
+            t0 = time.perf_counter()
+            try:
+                check_password(pw_hash, 'benchmark-password')
+                latencies.append(time.perf_counter() - t0)
+            except PasswordHasherBusy:
+                busy[0] += 1
+                time.sleep(0.05)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+    pct = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0
+    print(f"cost {BCRYPT_LOG_ROUNDS}, {PASSWORD_HASH_WORKERS} hashing process(es), "
+          f"{args.concurrency} concurrent logins, {args.seconds:.0f} s")
+    print(f"{len(latencies) / args.seconds:.1f} logins/s  p50 {pct(0.5):.0f} ms  p95 {pct(0.95):.0f} ms  "
+          f"max {pct(1):.0f} ms  rejected (429) {busy[0]}")
+
+
+if __name__ == '__main__':
+    main()
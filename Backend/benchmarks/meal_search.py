@@ -0,0 +1,110 @@
+"""
+Meal search autocomplete on a large dish catalog.
+
+One chapter with 100,000 meals over about 3,000 dishes, beside 20 chapters
+of 5,000 meals over 1,500 dishes each. The script times
+GET /api/meals/search for the searched chapter's admin with short
+prefixes, a full name, typos and a miss, then prints the plan of
+queries.dish_search for one of them. The search reads only the
+chapter's dishes and the matching dishes' latest meals, so the times
+follow the chapter's dish count, not its meal count. At this size the
+planner reads the chapter's dishes through chapter_dish_uc and applies
+the trigram match as a filter; the trigram index covers every chapter
+and only wins when the match is far more selective than the chapter.
+
+    TEST_DATABASE_URL=... python -m benchmarks.meal_search [--queries la,chi,lasagne] [--explain lasagne]
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from benchmarks.common import load_app, reset_schema, insert_meals, auth_headers, median_ms
+
+app = load_app()
+
+from database import db
+from rollups import rebuild_rollups
+from queries import dish_search
+
+ADJECTIVES = ['Roast', 'Grilled', 'Spicy', 'Smoked', 'Braised', 'Crispy', 'Honey', 'Garlic', 'Lemon', 'Cajun',
+              'Teriyaki', 'BBQ', 'Herb', 'Pesto', 'Buffalo', 'Sesame', 'Curry', 'Maple', 'Chipotle', 'Greek',
+              'Thai', 'Korean', 'Creamy', 'Baked']
+MAINS = ['Chicken', 'Beef', 'Pork', 'Salmon', 'Shrimp', 'Tofu', 'Turkey', 'Lamb', 'Veggie', 'Mushroom', 'Cod',
+         'Tuna', 'Lentil', 'Chickpea', 'Eggplant', 'Sausage', 'Meatball', 'Steak', 'Halibut', 'Duck']
+KINDS = ['Lasagna', 'Tacos', 'Burrito Bowl', 'Stir Fry', 'Pasta', 'Sandwich', 'Salad', 'Curry', 'Soup', 'Risotto',
+         'Pizza', 'Wrap', 'Casserole', 'Fried Rice', 'Noodles', 'Skewers', 'Burger', 'Quesadilla', 'Pot Pie',
+         'Enchiladas']
+NAMES = [f'{a} {m} {k}' for a in ADJECTIVES for m in MAINS for k in KINDS]   # 9,600
+
+# (chapter id, dishes, meals); chapter 1 is the one searched.
+CHAPTERS = [(1, 3000, 100000)] + [(c, 1500, 5000) for c in range(2, 22)]
+QUERIES = 'la,chi,lasagne,chiken tacos,spicy tofu tacos,qx'
+
+
+def seed():
+    db.session.execute(text("INSERT INTO chapters (id, name) SELECT g, 'Chapter ' || g FROM generate_series(1, 21) g"))
+    db.session.execute(text("""
+        INSERT INTO users (id, email, password_hash, name, first_name, last_name, chapter_id, is_admin, is_owner)
+        VALUES (1, 'admin@bench', 'x', 'Bench Admin', 'Bench', 'Admin', 1, true, false)
+    """))
+    for chapter_id, dishes, meals in CHAPTERS:
+        # Each chapter draws its dishes from its own window of NAMES, three meals a day back from today.
+        insert_meals("""
+            SELECT current_date - g / 3 + interval '18 hours' AS meal_date,
+                   CASE WHEN g % 2 = 0 THEN 'Lunch' ELSE 'Dinner' END AS meal_type,
+                   (CAST(:names AS text[]))[1 + (:chapter * 977 + (hashtext(g::text) & 2147483647) % :dishes)
+                                                % cardinality(CAST(:names AS text[]))] AS dish_name,
+                   :chapter AS chapter_id
+            FROM generate_series(1, :meals) g
+        """, names=NAMES, chapter=chapter_id, dishes=dishes, meals=meals)
+        db.session.commit()
+    rebuild_rollups(apply=True)   # times_served and last_served_at feed the ranking
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def explain(q):
+    stmt = dish_search(1, q, datetime.now()).statement
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={'render_postcompile': True})
+    rows = db.session.connection().exec_driver_sql(f'EXPLAIN (ANALYZE, BUFFERS) {compiled}', compiled.params)
+    return '\n'.join(row[0] for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--queries', default=QUERIES, help='Comma-separated search strings')
+    parser.add_argument('--explain', default='lasagne', help='Search string whose plan is printed')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    headers = auth_headers(1)
+    with app.app_context():
+        reset_schema()
+        seed()
+        meals, dishes = db.session.execute(text(
+            'SELECT (SELECT count(*) FROM meals WHERE chapter_id = 1), (SELECT count(*) FROM dishes WHERE chapter_id = 1)'
+        )).one()
+    print(f"chapter 1: {meals} meals, {dishes} dishes; 20 other chapters")
+
+    print(f"{'q':>18}  {'ms':>7}  {'results':>7}  top")
+    for q in args.queries.split(','):
+        found = []
+
+        def search():
+            response = client.get('/api/meals/search', headers=headers, query_string={'q': q})
+            assert response.status_code == 200, response.data[:200]
+            found[:] = [m['dish_name'] for m in response.json['meals']]
+
+        ms = median_ms(search, args.runs)
+        print(f"{q!r:>18}  {ms:>7.2f}  {len(found):>7}  {', '.join(found[:3])}")
+
+    with app.app_context():
+        print(f"\nplan for {args.explain!r}:")
+        print(explain(args.explain))
+        db.session.rollback()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Attendance seeding for a bulk meal upload.
+
+A 500-member chapter (plus a 50-member one that must not be touched) where
+about 20% of the member x weekday x meal-type slots have a weekly preset:
+half opt out, half of those that attend also ask for a late plate, and a
+fifth are disabled. The admin then POSTs a 7-day x 2-meal bulk upload. The
+script reports the request's wall time, how many SQL statements it issued
+and the attendance and late-plate rows it created. Seeding is set-based,
+so the statement count doesn't grow with the member count.
+
+    TEST_DATABASE_URL=... python -m benchmarks.meal_seeding [--members 500]
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import event, text
+
+from benchmarks.common import load_app, reset_schema, auth_headers
+
+app = load_app()
+
+from database import db
+from models import WeeklyPreset
+
+
+def seed(members):
+    db.session.execute(text("INSERT INTO chapters (id, name) VALUES (1, 'Bench'), (2, 'Other')"))
+    db.session.execute(text("""
+        INSERT INTO users (email, password_hash, name, first_name, last_name, chapter_id, is_admin, is_owner)
+        SELECT 'user' || g || '@bench', 'x', 'User ' || g, 'User', g::text,
+               CASE WHEN g <= :members THEN 1 ELSE 2 END, g = 1, g = 1
+        FROM generate_series(1, :members + 50) g
+    """), {'members': members})
+    rng = random.Random(7)
+    presets = [
+        dict(user_id=user_id, day_of_week=day, meal_type=meal_type, attending=rng.random() < 0.5,
+             late_plate=rng.random() < 0.5, late_plate_notes='Preset note', enabled=rng.random() < 0.8)
+        for user_id in range(1, members + 51)
+        for day in range(7)
+        for meal_type in ('Lunch', 'Dinner')
+        if rng.random() < 0.2
+    ]
+    db.session.execute(WeeklyPreset.__table__.insert(), presets)
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--members', type=int, default=500)
+    args = parser.parse_args()
+
+    with app.app_context():
+        reset_schema()
+        seed(args.members)
+        statements = [0]
+
+        @event.listens_for(db.engine, 'before_cursor_execute')
+        def count(*_):
+            statements[0] += 1
+
+    client = app.test_client()
+    headers = auth_headers(1)
+    client.get('/api/menu', headers=headers)   # warm the principal cache and connection pool
+
+    monday = (datetime.now() + timedelta(days=7 - datetime.now().weekday())).replace(
+        hour=12, minute=0, second=0, microsecond=0)
+    meals = [{
+        'id': i,
+        'meal_date': (monday + timedelta(days=i // 2, hours=6 * (i % 2))).isoformat(),
+        'meal_type': 'Lunch' if i % 2 == 0 else 'Dinner',
+        'dish_name': f'Dish {i}',
+    } for i in range(14)]
+
+    statements[0] = 0
+    start = time.perf_counter()
+    response = client.post('/api/meals/bulk', headers=headers, data={'meals': json.dumps(meals)})
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    assert response.status_code == 201, response.data[:200]
+
+    with app.app_context():
+        attendance, late_plates, other = db.session.execute(text("""
+            SELECT (SELECT count(*) FROM meal_attendance), (SELECT count(*) FROM late_plates),
+                   (SELECT count(*) FROM meal_attendance a JOIN users u ON u.id = a.user_id WHERE u.chapter_id = 2)
+        """)).one()
+    print(f"{args.members} members, 14 meals: {elapsed_ms:.0f} ms, {statements[0]} statements, "
+          f"{attendance} attendance rows, {late_plates} late plates")
+    assert other == 0, 'seeded members of another chapter'
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Per-user menu enrichment vs. the size of the user's history.
+
+One chapter with 14 meals this week. The member's history grows from 0 to
+20,000 past meals, each with an attendance row, a late plate and a review.
+At each size the script times the per-user overlay on its own
+(helpers._overlay_user_state over the week's meals) and GET /api/menu with
+the chapter payload cached, which is what a member's page load costs. Both
+should stay flat: every lookup is bounded by the page's meal ids.
+
+    TEST_DATABASE_URL=... python -m benchmarks.menu_enrichment [--sizes 0,1000,5000,20000]
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import text
+
+from benchmarks.common import load_app, reset_schema, insert_meals, auth_headers, median_ms
+
+app = load_app()
+
+from database import db
+from helpers import week_range, _meal_base, _overlay_user_state
+from queries import meals_between
+
+
+def seed_week():
+    db.session.execute(text("INSERT INTO chapters (id, name) VALUES (1, 'Bench')"))
+    db.session.execute(text("""
+        INSERT INTO users (id, email, password_hash, name, first_name, last_name, chapter_id, is_admin, is_owner)
+        VALUES (1, 'member@bench', 'x', 'Bench Member', 'Bench', 'Member', 1, false, false)
+    """))
+    week_start, _ = week_range(datetime.now())
+    insert_meals("""
+        SELECT CAST(:start AS timestamp) + g * interval '11 hours' AS meal_date,
+               CASE WHEN g % 2 = 0 THEN 'Lunch' ELSE 'Dinner' END AS meal_type,
+               'Week dish ' || g AS dish_name, 1 AS chapter_id
+        FROM generate_series(0, 13) g
+    """, start=week_start)
+    db.session.commit()
+
+
+def grow_history(total):
+    """Give the member `total` past meals, each attended, late-plated and reviewed."""
+    have = db.session.execute(text("SELECT count(*) FROM meal_attendance")).scalar()
+    if total <= have:
+        return
+    insert_meals("""
+        SELECT now() - interval '30 days' - g * interval '6 hours' AS meal_date, 'Lunch' AS meal_type,
+               'Past dish ' || (g % 400) AS dish_name, 1 AS chapter_id
+        FROM generate_series(:first, :last) g
+    """, first=have + 1, last=total)
+    past = "SELECT id FROM meals WHERE dish_name LIKE 'Past dish %' AND id NOT IN (SELECT meal_id FROM {})"
+    db.session.execute(text(f"INSERT INTO late_plates (meal_id, user_id, request_date, status) "
+                            f"SELECT id, 1, current_date, 'approved' FROM ({past.format('late_plates')}) m"))
+    db.session.execute(text(f"INSERT INTO reviews (meal_id, user_id, rating, hidden) "
+                            f"SELECT id, 1, 1 + id % 5, false FROM ({past.format('reviews')}) m"))
+    db.session.execute(text(f"INSERT INTO meal_attendance (meal_id, user_id) "
+                            f"SELECT id, 1 FROM ({past.format('meal_attendance')}) m"))
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', default='0,1000,5000,20000', help='Comma-separated history sizes')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    headers = auth_headers(1)
+    with app.app_context():
+        reset_schema()
+        seed_week()
+
+    print(f"{'history':>8}  {'overlay ms':>10}  {'/api/menu ms':>12}")
+    for size in (int(s) for s in args.sizes.split(',')):
+        with app.app_context():
+            grow_history(size)
+            week_start, week_end = week_range(datetime.now())
+            base = _meal_base(meals_between(1, week_start, week_end).all())
+            assert len(base) == 14, len(base)
+            overlay_ms = median_ms(lambda: _overlay_user_state(base, 1), args.runs)
+
+        def get_menu():
+            response = client.get('/api/menu', headers=headers)
+            assert response.status_code == 200, response.data[:200]
+
+        print(f"{size:>8}  {overlay_ms:>10.2f}  {median_ms(get_menu, args.runs):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
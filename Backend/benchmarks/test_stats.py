@@ -0,0 +1,125 @@
+"""
+The scalar analytics functions against their NumPy batch versions.
+
+Ratings are spread over meals (RATINGS_PER_MEAL each on average) at 10³ to
+10⁷ ratings. Each step is timed scalar and batch in the same benchmark
+group, and each scalar test also checks that the batch version agrees
+with it. Needs no database.
+
+    pytest benchmarks/test_stats.py [-k 'not 1e+07']   # 10⁷ alone takes over a minute
+"""
+import numpy as np
+import pytest
+
+from analytics import WelfordAccumulator, apply_ewma, apply_zscores, grouped_moments, merge_moments, zscores, ewma
+
+SIZES = [10 ** k for k in range(3, 8)]
+RATINGS_PER_MEAL = 20
+SHARDS = 8       # partial accumulators merged in the merge step
+REPEATED = 10 ** 5   # larger sizes are timed once; the scalar side runs for seconds
+ROUNDED = 0.0005 + 1e-9   # apply_* round to 3 places
+
+
+def _timed(benchmark, size, fn, *args):
+    if size > REPEATED:
+        return benchmark.pedantic(fn, args=args, rounds=1, iterations=1)
+    return benchmark(fn, *args)
+
+
+def _accumulate(groups, ratings):
+    accs = {}
+    for group, rating in zip(groups.tolist(), ratings.tolist()):
+        accs.setdefault(group, WelfordAccumulator()).update(rating)
+    return accs
+
+
+def _merge_shards(parts):
+    merged = {}
+    for part in parts:
+        for group, acc in part.items():
+            merged.setdefault(group, WelfordAccumulator()).merge(acc)
+    return merged
+
+
+def _merge_batches(parts):
+    return merge_moments(*map(np.concatenate, zip(*parts)))
+
+
+def _assert_moments(accs, keys, n, mean, M2):
+    assert sorted(accs) == keys.tolist()
+    assert [accs[k].n for k in keys.tolist()] == n.tolist()
+    np.testing.assert_allclose([accs[k].mean for k in keys.tolist()], mean, rtol=0, atol=1e-12)
+    np.testing.assert_allclose([accs[k].M2 for k in keys.tolist()], M2, rtol=1e-9, atol=1e-9)
+
+
+@pytest.fixture(scope='module', params=SIZES, ids=lambda size: f'{size:.0e}')
+def size(request):
+    return request.param
+
+
+@pytest.fixture(scope='module')
+def ratings(size):
+    """(meal ids, ratings) in half stars, unsorted, as read from an unordered query."""
+    rng = np.random.default_rng(size)
+    return rng.integers(0, max(1, size // RATINGS_PER_MEAL), size), rng.integers(2, 11, size) / 2
+
+
+@pytest.fixture(scope='module')
+def shards(ratings):
+    groups, values = ratings
+    return [(groups[i::SHARDS], values[i::SHARDS]) for i in range(SHARDS)]
+
+
+@pytest.fixture(scope='module')
+def meal_means(ratings):
+    return [round(v, 2) for v in grouped_moments(*ratings)[2].tolist()]
+
+
+def test_moments_scalar(benchmark, size, ratings):
+    benchmark.group = f'moments {size:.0e}'
+    accs = _timed(benchmark, size, _accumulate, *ratings)
+    _assert_moments(accs, *grouped_moments(*ratings))
+
+
+def test_moments_batch(benchmark, size, ratings):
+    benchmark.group = f'moments {size:.0e}'
+    n = _timed(benchmark, size, grouped_moments, *ratings)[1]
+    assert n.sum() == size
+
+
+def test_merge_scalar(benchmark, size, shards):
+    benchmark.group = f'merge {size:.0e}'
+    merged = _timed(benchmark, size, _merge_shards, [_accumulate(g, r) for g, r in shards])
+    _assert_moments(merged, *_merge_batches([grouped_moments(g, r) for g, r in shards]))
+
+
+def test_merge_batch(benchmark, size, shards):
+    benchmark.group = f'merge {size:.0e}'
+    n = _timed(benchmark, size, _merge_batches, [grouped_moments(g, r) for g, r in shards])[1]
+    assert n.sum() == size
+
+
+def test_zscores_scalar(benchmark, size, meal_means):
+    benchmark.group = f'zscores {size:.0e}'
+    items = _timed(benchmark, size, apply_zscores, [{'avg_rating': v} for v in meal_means])
+    z = zscores(meal_means)
+    assert [item['rating_zscore'] is None for item in items] == np.isnan(z).tolist()
+    assert max((abs(item['rating_zscore'] - v) for item, v in zip(items, z.tolist())
+                if item['rating_zscore'] is not None), default=0.0) <= ROUNDED
+
+
+def test_zscores_batch(benchmark, size, meal_means):
+    benchmark.group = f'zscores {size:.0e}'
+    assert _timed(benchmark, size, zscores, meal_means).shape == (len(meal_means),)
+
+
+def test_ewma_scalar(benchmark, size, ratings):
+    benchmark.group = f'ewma {size:.0e}'
+    series = ratings[1].tolist()
+    smoothed = _timed(benchmark, size, apply_ewma, series)
+    assert np.max(np.abs(np.array(smoothed) - ewma(ratings[1]))) <= ROUNDED
+
+
+def test_ewma_batch(benchmark, size, ratings):
+    benchmark.group = f'ewma {size:.0e}'
+    assert _timed(benchmark, size, ewma, ratings[1]).shape == (size,)
@@ -0,0 +1,76 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe LRU cache whose entries also expire after `ttl` seconds.
+
+    Each gunicorn worker holds its own instance, so anything cached here is
+    per-process: a write handled by one worker only invalidates that worker's
+    copy, and the TTL bounds how long the others can serve a stale entry.
+
+    Keeps hit/miss counters so callers can report cache effectiveness.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl     = ttl
+        self.hits    = 0
+        self.misses  = 0
+        self._data   = OrderedDict()
+        self._lock   = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, ttl: float | None = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def discard_where(self, predicate):
+        """Drop every entry whose value satisfies `predicate`. Returns the count removed."""
+        with self._lock:
+            stale = [k for k, (v, _) in self._data.items() if predicate(v)]
+            for k in stale:
+                del self._data[k]
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._data)
+        lookups = self.hits + self.misses
+        return {
+            'hits':     self.hits,
+            'misses':   self.misses,
+            'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            'size':     size,
+            'maxsize':  self.maxsize,
+            'ttl':      self.ttl,
+        }
@@ -1,37 +1,227 @@
-import resend
+"""
+Transactional email outbox.
+
+Request handlers never talk to the mail provider. queue_verification_email /
+queue_reset_email add an email_outbox row inside the caller's transaction,
+so a message exists exactly when the PendingRegistration or reset token it
+links to commits. The dispatcher (dispatch_emails, run by the scheduler
+every EMAIL_DISPATCH_INTERVAL seconds or by `flask email-worker`) claims due
+rows with FOR UPDATE SKIP LOCKED, sends them on a small thread pool and
+records the outcome. Failures are retried with exponential backoff; after
+EMAIL_MAX_ATTEMPTS tries, or on an error the provider says won't go away
+(bad address, malformed message), the row is dead-lettered with its last
+error. `flask email-outbox` lists dead letters and can requeue them.
+
+The transport is picked by EMAIL_TRANSPORT: 'resend' (default), 'smtp'
+(SMTP_HOST etc.; e.g. a local MailHog/mailpit) or 'file', which writes each
+message as an .eml under EMAIL_FILE_DIR so the whole flow can run without a
+provider.
+"""
 import os
+import smtplib
+import resend
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from sqlalchemy import and_, or_
+
+from database import db
+from models import EmailOutbox
 
 FROM_EMAIL = 'Ordo <noreply@ordodining.com>'
 
+EMAIL_TRANSPORT = os.getenv('EMAIL_TRANSPORT', 'resend')
+EMAIL_BATCH = int(os.getenv('EMAIL_BATCH', 20))
+EMAIL_SEND_WORKERS = int(os.getenv('EMAIL_SEND_WORKERS', 4))
+EMAIL_MAX_ATTEMPTS = int(os.getenv('EMAIL_MAX_ATTEMPTS', 6))
+EMAIL_BACKOFF_SECONDS = 15
+EMAIL_BACKOFF_CAP_SECONDS = 1800
+EMAIL_LEASE = timedelta(minutes=5)   # a 'sending' row older than this is presumed orphaned
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.getenv('EMAIL_OUTBOX_RETENTION_DAYS', 14))
+
 
-def _init():
-    resend.api_key = os.getenv('RESEND_API_KEY')
+def _frontend_url():
     return os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
 
-def send_verification_email(to_email, token):
-    frontend_url = _init()
-    link = f"{frontend_url}/verify-email?token={token}"
-    resend.Emails.send({
-        'from': FROM_EMAIL,
-        'to': to_email,
-        'subject': 'Verify your Ordo email',
-        'html': (
-            f'<p>Click the link below to verify your email address (expires in 24 hours):</p>'
-            f'<p><a href="{link}">{link}</a></p>'
-        ),
-    })
-
-
-def send_reset_email(to_email, token):
-    frontend_url = _init()
-    link = f"{frontend_url}/reset-password?token={token}"
-    resend.Emails.send({
-        'from': FROM_EMAIL,
-        'to': to_email,
-        'subject': 'Reset your Ordo password',
-        'html': (
-            f'<p>Click the link below to reset your password (expires in 1 hour):</p>'
-            f'<p><a href="{link}">{link}</a></p>'
-        ),
-    })
+# ---------------------------------------------------------------------------
+# Transports
+# ---------------------------------------------------------------------------
+
+class PermanentEmailError(Exception):
+    """The provider rejected the message itself; retrying won't help."""
+
+
+class ResendTransport:
+    def send(self, to_email, subject, html):
+        resend.api_key = os.getenv('RESEND_API_KEY')
+        try:
+            resend.Emails.send({'from': FROM_EMAIL, 'to': to_email, 'subject': subject, 'html': html})
+        except (resend.exceptions.ValidationError, resend.exceptions.MissingRequiredFieldsError) as e:
+            raise PermanentEmailError(str(e))
+
+
+class SmtpTransport:
+    def __init__(self):
+        self.host = os.getenv('SMTP_HOST', 'localhost')
+        self.port = int(os.getenv('SMTP_PORT', 25))
+        self.user = os.getenv('SMTP_USER')
+        self.password = os.getenv('SMTP_PASSWORD')
+        self.starttls = os.getenv('SMTP_STARTTLS', '0') in ('1', 'true', 'yes')
+
+    def send(self, to_email, subject, html):
+        with smtplib.SMTP(self.host, self.port, timeout=10) as smtp:
+            if self.starttls:
+                smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+            try:
+                smtp.send_message(_mime(to_email, subject, html))
+            except smtplib.SMTPRecipientsRefused as e:
+                raise PermanentEmailError(str(e))
+
+
+class FileTransport:
+    """Writes each message to EMAIL_FILE_DIR as <timestamp>-<to>.eml."""
+
+    def __init__(self, root=os.getenv('EMAIL_FILE_DIR', '/tmp/ordo-outbox')):
+        self.root = root
+
+    def send(self, to_email, subject, html):
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%S%f}-{to_email.replace('/', '_')}.eml"
+        with open(os.path.join(self.root, name), 'wb') as f:
+            f.write(bytes(_mime(to_email, subject, html)))
+
+
+def _mime(to_email, subject, html):
+    msg = EmailMessage()
+    msg['From'], msg['To'], msg['Subject'] = FROM_EMAIL, to_email, subject
+    msg.set_content(html, subtype='html')
+    return msg
+
+
+_TRANSPORTS = {'resend': ResendTransport, 'smtp': SmtpTransport, 'file': FileTransport}
+email_transport = _TRANSPORTS[EMAIL_TRANSPORT]()
+
+
+# ---------------------------------------------------------------------------
+# Enqueue (request path)
+# ---------------------------------------------------------------------------
+
+def queue_email(kind, to_email, subject, html):
+    """
+    Add a message to the outbox in the caller's transaction. A newer message
+    of the same kind to the same address supersedes any still-pending one
+    (its token has just been replaced anyway).
+    """
+    EmailOutbox.query.filter(
+        EmailOutbox.to_email == to_email, EmailOutbox.kind == kind, EmailOutbox.status == 'pending',
+    ).update({'status': 'superseded', 'html': None}, synchronize_session=False)
+
+    message = EmailOutbox(kind=kind, to_email=to_email, subject=subject, html=html, status='pending',
+                          attempts=0, next_attempt_at=datetime.now(timezone.utc))
+    db.session.add(message)
+    return message
+
+
+def queue_verification_email(to_email, token):
+    link = f"{_frontend_url()}/verify-email?token={token}"
+    return queue_email('verification', to_email, 'Verify your Ordo email', (
+        f'<p>Click the link below to verify your email address (expires in 24 hours):</p>'
+        f'<p><a href="{link}">{link}</a></p>'
+    ))
+
+
+def queue_reset_email(to_email, token):
+    link = f"{_frontend_url()}/reset-password?token={token}"
+    return queue_email('reset', to_email, 'Reset your Ordo password', (
+        f'<p>Click the link below to reset your password (expires in 1 hour):</p>'
+        f'<p><a href="{link}">{link}</a></p>'
+    ))
+
+
+# ---------------------------------------------------------------------------
+# Dispatcher
+# ---------------------------------------------------------------------------
+
+def _send(message):
+    """Send one claimed message. Returns (error, retryable) — never raises."""
+    message_id, to_email, subject, html = message
+    try:
+        email_transport.send(to_email, subject, html)
+        return None, False
+    except PermanentEmailError as e:
+        print(f"Email {message_id} rejected permanently: {e}")
+        return str(e)[:500], False
+    except Exception as e:
+        print(f"Email {message_id} failed: {e}")
+        return str(e)[:500], True
+
+
+def _claim_messages(limit):
+    now = datetime.now(timezone.utc)
+    due = or_(
+        and_(EmailOutbox.status == 'pending', EmailOutbox.next_attempt_at <= now),
+        and_(EmailOutbox.status == 'sending', EmailOutbox.updated_at < now - EMAIL_LEASE),
+    )
+    rows = EmailOutbox.query.filter(due).order_by(EmailOutbox.id).limit(limit).with_for_update(skip_locked=True).all()
+    claimed = []
+    for row in rows:
+        row.status = 'sending'
+        row.attempts += 1
+        claimed.append((row.id, row.to_email, row.subject, row.html))
+    db.session.commit()
+    return claimed
+
+
+def dispatch_emails(limit=EMAIL_BATCH):
+    """
+    Claim up to `limit` due messages, send them concurrently and record the
+    outcome. Safe to run from any number of processes at once. Returns a
+    dict of counts: claimed, sent, retrying, dead.
+    """
+    claimed = _claim_messages(limit)
+    report = {'claimed': len(claimed), 'sent': 0, 'retrying': 0, 'dead': 0}
+    if not claimed:
+        return report
+
+    with ThreadPoolExecutor(max_workers=min(EMAIL_SEND_WORKERS, len(claimed)),
+                            thread_name_prefix='email-sender') as pool:
+        outcomes = list(zip((m[0] for m in claimed), pool.map(_send, claimed)))
+
+    now = datetime.now(timezone.utc)
+    for message_id, (error, retryable) in outcomes:
+        row = EmailOutbox.query.get(message_id)
+        if error is None:
+            row.status, row.sent_at, row.html, row.last_error = 'sent', now, None, None
+            report['sent'] += 1
+        elif not retryable or row.attempts >= EMAIL_MAX_ATTEMPTS:
+            row.status, row.last_error = 'dead', error
+            report['dead'] += 1
+        else:
+            backoff = min(EMAIL_BACKOFF_SECONDS * 2 ** (row.attempts - 1), EMAIL_BACKOFF_CAP_SECONDS)
+            row.status, row.last_error = 'pending', error
+            row.next_attempt_at = now + timedelta(seconds=backoff)
+            report['retrying'] += 1
+    db.session.commit()
+    return report
+
+
+def requeue_dead_emails():
+    """Give every dead-lettered message a fresh set of attempts. Returns how many were requeued."""
+    requeued = EmailOutbox.query.filter(EmailOutbox.status == 'dead').update({
+        'status': 'pending', 'attempts': 0, 'next_attempt_at': datetime.now(timezone.utc),
+    }, synchronize_session=False)
+    db.session.commit()
+    return requeued
+
+
+def prune_email_outbox():
+    """Delete sent and superseded messages older than EMAIL_OUTBOX_RETENTION_DAYS. Returns the count."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=EMAIL_OUTBOX_RETENTION_DAYS)
+    deleted = EmailOutbox.query.filter(
+        EmailOutbox.status.in_(('sent', 'superseded')), EmailOutbox.created_at < cutoff,
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
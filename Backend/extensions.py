@@ -1,3 +0,0 @@
-from flask_bcrypt import Bcrypt
-
-bcrypt = Bcrypt()
@@ -1,31 +1,27 @@
 import os
-import boto3
+import json
+import time
+import base64
+import hashlib
 import jwt as pyjwt
-from collections import defaultdict
+from collections import namedtuple
+from datetime import datetime, timedelta
 from functools import wraps
-from datetime import datetime, timezone
-from flask import g, request, jsonify
-from sqlalchemy import func
+from flask import g, request, jsonify, make_response
+from sqlalchemy import tuple_
 
 from database import db
-from models import User, Review, MealAttendance, LatePlate, WeeklyPreset
-from analytics import welford_from_list
+from models import User, MealRatingStats
+from analytics import welford_from_moments
+from cache import TTLCache
+from images import image_variant_urls
+from response_cache import chapter_version
+from queries import user_meal_state
 
 # ---------------------------------------------------------------------------
-# S3
+# Uploads (storage lives in images.py)
 # ---------------------------------------------------------------------------
 
-AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
-AWS_REGION = os.getenv('AWS_REGION')
-S3_BASE_URL = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/"
-
-_s3 = boto3.client(
-    's3',
-    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
-    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
-    region_name=AWS_REGION,
-)
-
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 
 
@@ -33,20 +29,66 @@ def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
-def upload_file_to_s3(file, filename):
-    try:
-        _s3.upload_fileobj(file, AWS_BUCKET_NAME, filename,
-                           ExtraArgs={"ContentType": file.content_type})
-    except Exception as e:
-        print("S3 upload error:", e)
-        return None
-    return f"{S3_BASE_URL}{filename}"
-
-
 # ---------------------------------------------------------------------------
 # Auth decorators
 # ---------------------------------------------------------------------------
 
+# Authenticated principals are cached per process so the hot path doesn't pay
+# a users-table round trip on every request. Only the fields the auth
+# decorators and chapter scoping need are kept; routes that need the full row
+# (profile reads/writes) load it explicitly, and must cope with it being gone.
+# invalidate_principal only reaches the calling process: role changes and
+# deletions made by another worker, or by a CLI command, are picked up once
+# the snapshot's TTL lapses.
+Principal = namedtuple('Principal', ['id', 'chapter_id', 'is_admin', 'is_owner'])
+
+_token_cache = TTLCache(
+    maxsize=int(os.getenv('PRINCIPAL_CACHE_SIZE', 2048)),
+    ttl=float(os.getenv('TOKEN_CACHE_TTL', 300)),
+)
+_principal_cache = TTLCache(
+    maxsize=int(os.getenv('PRINCIPAL_CACHE_SIZE', 2048)),
+    ttl=float(os.getenv('PRINCIPAL_CACHE_TTL', 30)),
+)
+
+
+def _decode_token(token):
+    """Return (user_id, exp) for a token, decoding and verifying it only on a cache miss."""
+    cached = _token_cache.get(token)
+    if cached is not None:
+        if cached[1] is not None and cached[1] <= time.time():
+            _token_cache.pop(token)
+            raise pyjwt.ExpiredSignatureError('Signature has expired')
+        return cached
+    payload = pyjwt.decode(token, os.getenv('JWT_SECRET'), algorithms=['HS256'])
+    decoded = (payload['user_id'], payload.get('exp'))
+    _token_cache.set(token, decoded)
+    return decoded
+
+
+def _load_principal(user_id):
+    principal = _principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+    row = db.session.query(
+        User.id, User.chapter_id, User.is_admin, User.is_owner
+    ).filter(User.id == user_id).first()
+    if not row:
+        return None
+    principal = Principal(*row)
+    _principal_cache.set(user_id, principal)
+    return principal
+
+
+def invalidate_principal(user_id):
+    """Drop a user's cached snapshot after their role, chapter or account changes."""
+    _principal_cache.pop(user_id)
+
+
+def principal_cache_stats():
+    return {'tokens': _token_cache.stats(), 'principals': _principal_cache.stats()}
+
+
 def jwt_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -57,10 +99,11 @@ def jwt_required(f):
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
         try:
-            payload = pyjwt.decode(token, os.getenv('JWT_SECRET'), algorithms=['HS256'])
-            current_user = User.query.get(payload['user_id'])
+            user_id, _ = _decode_token(token)
+            current_user = _load_principal(user_id)
             if not current_user:
-                return jsonify({'message': 'User not found!'}), 404
+                # A valid token for a deleted account is no longer a credential.
+                return jsonify({'message': 'User not found!'}), 401
             g.current_user = current_user
         except pyjwt.ExpiredSignatureError:
             return jsonify({'message': 'Token has expired!'}), 401
@@ -93,69 +136,182 @@ def owner_required(f):
     return decorated
 
 
+def conditional_get(key_fn):
+    """
+    Strong ETags for chapter-scoped GET endpoints; goes under jwt_required /
+    admin_required. The tag is derived from the chapter's change version
+    (bumped after every write, see response_cache.py), the user and
+    key_fn(*args, **kwargs) — whatever else the body depends on, such as
+    the date being shown — so it is known before the view runs and a
+    matching If-None-Match gets a 304 without running any of its queries.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            user = g.current_user
+            # Read the version before building the body: a write landing
+            # mid-build then yields a tag older than the body, never newer.
+            raw = repr((request.full_path, user.chapter_id, chapter_version(user.chapter_id),
+                        user.id, key_fn(*args, **kwargs)))
+            etag = hashlib.blake2s(raw.encode(), digest_size=16).hexdigest()
+
+            if request.if_none_match.contains(etag):
+                response = make_response('', 304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag)
+            # Let browsers keep the body but revalidate on every poll.
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.vary.add('Authorization')
+            return response
+        return decorated
+    return decorator
+
+
+# ---------------------------------------------------------------------------
+# Keyset pagination
+# ---------------------------------------------------------------------------
+
+PAGE_SIZE_DEFAULT = int(os.getenv('PAGE_SIZE_DEFAULT', 50))
+PAGE_SIZE_MAX = int(os.getenv('PAGE_SIZE_MAX', 200))
+
+
+class InvalidCursor(ValueError):
+    """The `cursor` query parameter wasn't produced by keyset_page()."""
+
+
+def _encode_cursor(values):
+    raw = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def _decode_cursor(cursor, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        if not isinstance(values, list) or len(values) != len(columns):
+            raise ValueError('wrong key length')
+        return [
+            datetime.fromisoformat(v) if col.type.python_type is datetime else col.type.python_type(v)
+            for col, v in zip(columns, values)
+        ]
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def _page_limit():
+    try:
+        return min(max(int(request.args.get('limit', PAGE_SIZE_DEFAULT)), 1), PAGE_SIZE_MAX)
+    except ValueError:
+        return PAGE_SIZE_DEFAULT
+
+
+def keyset_seek(keyset, after=None):
+    """
+    `keyset.query` (a queries.Keyset) in key order, starting after the key
+    values `after` when given. Seeking with a row comparison on the key
+    instead of OFFSET lets an index on the key columns start reading at the
+    cursor, so every page costs the same as the first.
+    """
+    query, columns, descending = keyset
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.filter(key < tuple_(*after) if descending else key > tuple_(*after))
+    return query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+
+
+def keyset_page(keyset):
+    """
+    One page of a queries.Keyset, whose columns must end in a unique column
+    (usually the id). The page starts after the row encoded in the
+    request's `cursor` arg and holds at most `limit` rows (default
+    PAGE_SIZE_DEFAULT, capped at PAGE_SIZE_MAX).
+
+    Returns (rows, next_cursor); next_cursor is None on the last page.
+    Raises InvalidCursor for a malformed cursor.
+    """
+    limit = _page_limit()
+    cursor = request.args.get('cursor')
+    after = _decode_cursor(cursor, keyset.columns) if cursor else None
+
+    rows = keyset_seek(keyset, after).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_cursor([getattr(rows[-1], c.key) for c in keyset.columns])
+
+
+def keyset_page_list(items, key):
+    """
+    keyset_page() for a list computed in Python rather than a query: sorts
+    `items` by `key`, a function returning a tuple of JSON scalars that ends
+    in a unique value, and returns the page after the request's cursor.
+    The cursor is the key of the last item, so a page boundary doesn't
+    shift when items before it come or go.
+
+    Returns (items, next_cursor). Raises InvalidCursor for a malformed cursor.
+    """
+    limit = _page_limit()
+    keyed = sorted(((key(item), item) for item in items), key=lambda pair: pair[0])
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after = tuple(json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))))
+            if keyed and len(after) != len(keyed[0][0]):
+                raise ValueError('wrong key length')
+            keyed = [pair for pair in keyed if pair[0] > after]
+        except (ValueError, TypeError) as e:
+            raise InvalidCursor(str(e))
+    if len(keyed) <= limit:
+        return [item for _, item in keyed], None
+    keyed = keyed[:limit]
+    return [item for _, item in keyed], _encode_cursor(list(keyed[-1][0]))
+
+
 # ---------------------------------------------------------------------------
 # Meal helpers
 # ---------------------------------------------------------------------------
 
-def apply_preset_to_meal(meal, user, attendance=None):
-    preset = WeeklyPreset.query.filter_by(
-        user_id=user.id,
-        day_of_week=meal.meal_date.weekday(),
-        meal_type=meal.meal_type,
-        enabled=True,
-    ).first()
-    if not preset:
-        return
-    if not preset.attending and attendance:
-        db.session.delete(attendance)
-    if preset.late_plate:
-        existing = LatePlate.query.filter_by(user_id=user.id, meal_id=meal.id).first()
-        if not existing:
-            db.session.add(LatePlate(
-                meal_id=meal.id,
-                user_id=user.id,
-                notes=preset.late_plate_notes,
-                pickup_time=preset.late_plate_pickup_time,
-                status='pending',
-                request_date=datetime.now(timezone.utc).date(),
-            ))
-
-
-def _enrich_meals(meals_with_counts, user_id):
-    """Attach avg_rating, review_count, user_review, attendance and late-plate status."""
-    meal_ids = [m.id for m, _ in meals_with_counts]
-    if not meal_ids:
-        return []
+def day_range(day, days=1):
+    """
+    Half-open [start, end) datetimes covering `days` calendar days from
+    `day` (a date or datetime). Filtering Meal.meal_date >= start and < end
+    keeps the predicate on the bare column, so the (chapter_id, meal_date)
+    index can serve it — unlike func.date(Meal.meal_date) == day.
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, datetime.min.time())
+    return start, start + timedelta(days=days)
 
-    # Fetch raw ratings so Welford's can compute mean + variance in one pass.
-    # SQL AVG only gives mean; Welford's also gives std and the sharpe_analog
-    # (mean/std) — a quality-adjusted score that penalises divisive meals.
-    _ratings_by_meal = defaultdict(list)
-    for meal_id, rating in db.session.query(Review.meal_id, Review.rating).filter(
-        Review.meal_id.in_(meal_ids)
-    ).all():
-        _ratings_by_meal[meal_id].append(rating)
 
-    review_stats = {
-        meal_id: welford_from_list(ratings)
-        for meal_id, ratings in _ratings_by_meal.items()
-    }
+def week_range(day):
+    """day_range() of the Sunday-to-Saturday week containing `day`."""
+    if isinstance(day, datetime):
+        day = day.date()
+    return day_range(day - timedelta(days=(day.weekday() + 1) % 7), 7)
 
-    user_reviews = {
-        r.meal_id: {'id': r.id, 'rating': r.rating, 'comment': r.comment}
-        for r in Review.query.filter(
-            Review.meal_id.in_(meal_ids), Review.user_id == user_id
-        ).all()
-    }
 
-    user_attendance = {
-        att.meal_id: att.confirmed
-        for att in MealAttendance.query.filter_by(user_id=user_id).all()
-    }
+def _meal_base(meals_with_counts):
+    """
+    The part of an enriched meal that is the same for every member of the
+    chapter: meal fields, attendance count and rating stats. Safe to cache
+    (see response_cache.py) and shared between requests, so callers must
+    not mutate the dicts.
+
+    Rating aggregates come from the materialised Welford moments in
+    meal_rating_stats (see rollups.py) rather than the raw reviews, so the
+    mean, std and sharpe_analog (mean/std — a quality-adjusted score that
+    penalises divisive meals) cost one row per meal.
+    """
+    meal_ids = [m.id for m, _ in meals_with_counts]
+    if not meal_ids:
+        return []
 
-    user_late_plates = {
-        lp.meal_id: lp.id
-        for lp in LatePlate.query.filter_by(user_id=user_id).all()
+    review_stats = {
+        row.meal_id: welford_from_moments(row.n, row.mean, row.m2)
+        for row in MealRatingStats.query.filter(MealRatingStats.meal_id.in_(meal_ids))
     }
 
     _empty_stats = {'mean': None, 'n': 0, 'std': None, 'sharpe_analog': None}
@@ -169,15 +325,38 @@ def _enrich_meals(meals_with_counts, user_id):
             'dish_name': meal.dish_name,
             'description': meal.description,
             'image_url': meal.image_url,
-            'is_attending': meal.id in user_attendance,
-            'attendance_confirmed': user_attendance.get(meal.id),
+            'image_variants': image_variant_urls(meal.image_url),
             'attendance_count': attendance_count or 0,
             'avg_rating': stats['mean'],
             'review_count': stats['n'],
             'rating_std': stats['std'],
             'sharpe_analog': stats['sharpe_analog'],
-            'user_review': user_reviews.get(meal.id),
             'late_plate_hours_before': meal.late_plate_hours_before,
-            'has_late_plate': meal.id in user_late_plates,
         })
     return result
+
+
+def _overlay_user_state(base, user_id):
+    """Copy `base` meal dicts with the user's attendance, review and late-plate status added."""
+    if not base:
+        return []
+
+    user_reviews = {}
+    user_attendance = {}
+    user_late_plates = {}
+    rows = db.session.execute(user_meal_state([m['id'] for m in base], user_id))
+    for kind, meal_id, ref_id, flag, value, comment in rows:
+        if kind == 'attendance':
+            user_attendance[meal_id] = flag
+        elif kind == 'late_plate':
+            user_late_plates[meal_id] = ref_id
+        elif kind == 'user_review':
+            user_reviews[meal_id] = {'id': ref_id, 'rating': value, 'comment': comment}
+
+    return [{
+        **meal,
+        'is_attending': meal['id'] in user_attendance,
+        'attendance_confirmed': user_attendance.get(meal['id']),
+        'user_review': user_reviews.get(meal['id']),
+        'has_late_plate': meal['id'] in user_late_plates,
+    } for meal in base]
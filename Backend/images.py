@@ -0,0 +1,308 @@
+"""
+Meal image pipeline.
+
+Request handlers never wait on S3. They persist the meal straight away with
+image_status='pending' and enqueue an ImageJob carrying either the uploaded
+bytes or the web URL to fetch (enqueue_image). The image worker — the
+`flask image-worker` process, or the scheduler's periodic drain — claims due
+jobs with FOR UPDATE SKIP LOCKED, stores them concurrently on a bounded
+thread pool and patches Meal.image_url as each one lands
+(process_image_jobs). Failed jobs are retried with exponential backoff and
+marked failed after IMAGE_JOB_MAX_ATTEMPTS; admins poll
+/api/meals/<id>/image-status for progress.
+
+Every stored image is re-encoded into fixed-size variants (thumb, card,
+full) with metadata stripped, under predictable sibling keys
+uploads/meals/<uuid>/<variant>.<ext>. Meal.image_url points at the full
+variant and image_variant_urls() derives the others from it, so no extra
+columns are needed.
+
+The storage backend is picked by IMAGE_STORE: 's3' (default) or 'local',
+which writes under uploads/ (served by /uploads/<path>) so the whole
+pipeline can run without AWS.
+"""
+import io
+import os
+import re
+import uuid
+import boto3
+import requests as req_lib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from PIL import Image, ImageOps, features
+from requests.adapters import HTTPAdapter
+from sqlalchemy import and_, or_, exists
+from sqlalchemy.orm import aliased
+
+from database import db
+from models import Meal, Dish, ImageJob
+from response_cache import bump_chapter_version
+
+IMAGE_STORE = os.getenv('IMAGE_STORE', 's3')
+IMAGE_INGEST_WORKERS = int(os.getenv('IMAGE_INGEST_WORKERS', 16))
+IMAGE_JOB_BATCH = int(os.getenv('IMAGE_JOB_BATCH', 16))
+IMAGE_JOB_MAX_ATTEMPTS = int(os.getenv('IMAGE_JOB_MAX_ATTEMPTS', 5))
+IMAGE_JOB_BACKOFF_SECONDS = 30
+IMAGE_JOB_BACKOFF_CAP_SECONDS = 3600
+IMAGE_JOB_LEASE = timedelta(minutes=10)   # a 'processing' job older than this is presumed orphaned
+WEB_IMAGE_TIMEOUT = 10
+
+# name -> (bounding box, crop). Cropped variants are cut to exactly that size
+# (thumb for lists, card for the h-48 MealCard at 2x DPR); 'full' is only
+# shrunk to fit.
+IMAGE_VARIANTS = {
+    'thumb': ((160, 160), True),
+    'card':  ((768, 480), True),
+    'full':  ((1600, 1600), False),
+}
+IMAGE_QUALITY = 80
+
+# WebP when this Pillow build can write it, JPEG otherwise.
+if features.check('webp'):
+    _VARIANT_FORMAT, _VARIANT_CONTENT_TYPE, _VARIANT_EXT = 'WEBP', 'image/webp', 'webp'
+else:
+    _VARIANT_FORMAT, _VARIANT_CONTENT_TYPE, _VARIANT_EXT = 'JPEG', 'image/jpeg', 'jpg'
+
+_VARIANT_URL = re.compile(r'^(?P<base>.*/meals/[0-9a-f-]{36}/)full\.(?P<ext>webp|jpg)$')
+
+# ---------------------------------------------------------------------------
+# Storage backends
+# ---------------------------------------------------------------------------
+
+AWS_BUCKET_NAME = os.getenv('AWS_BUCKET_NAME')
+AWS_REGION = os.getenv('AWS_REGION')
+S3_BASE_URL = f"https://{AWS_BUCKET_NAME}.s3.{AWS_REGION}.amazonaws.com/"
+
+# boto3 clients are thread-safe, so the worker pool shares this one.
+_s3 = boto3.client(
+    's3',
+    aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID'),
+    aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY'),
+    region_name=AWS_REGION,
+)
+
+
+class S3ImageStore:
+    def put(self, key, data, content_type):
+        _s3.upload_fileobj(io.BytesIO(data), AWS_BUCKET_NAME, key, ExtraArgs={"ContentType": content_type})
+        return f"{S3_BASE_URL}{key}"
+
+
+class LocalImageStore:
+    """Writes images beside the app so /uploads/<path> serves them."""
+
+    def __init__(self, root=os.path.dirname(os.path.abspath(__file__))):
+        self.root = root
+
+    def put(self, key, data, content_type):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return f"/{key}"
+
+
+image_store = LocalImageStore() if IMAGE_STORE == 'local' else S3ImageStore()
+
+_http = req_lib.Session()
+_http.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_INGEST_WORKERS))
+_http.mount('http://', HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_INGEST_WORKERS))
+
+
+# ---------------------------------------------------------------------------
+# Variants
+# ---------------------------------------------------------------------------
+
+class UnusableImage(Exception):
+    """The bytes aren't a decodable image; retrying won't help."""
+
+
+def render_variants(data):
+    """
+    Decode `data` once and encode every IMAGE_VARIANTS size from it. EXIF
+    orientation is applied to the pixels, then all metadata (EXIF, GPS,
+    ICC, comments) is dropped. Returns {variant_name: bytes}.
+    """
+    try:
+        with Image.open(io.BytesIO(data)) as src:
+            src.draft('RGB', IMAGE_VARIANTS['full'][0])   # JPEG: decode at reduced scale when possible
+            im = ImageOps.exif_transpose(src)
+            keep_alpha = _VARIANT_FORMAT == 'WEBP' and 'A' in im.getbands()
+            im = im.convert('RGBA' if keep_alpha else 'RGB')
+    except (Image.UnidentifiedImageError, Image.DecompressionBombError, OSError) as e:
+        raise UnusableImage(str(e))
+    im.info = {}
+
+    variants = {}
+    for name, (size, crop) in IMAGE_VARIANTS.items():
+        if crop:
+            out = ImageOps.fit(im, size, Image.LANCZOS)
+        else:
+            out = im.copy()
+            out.thumbnail(size, Image.LANCZOS)
+        buf = io.BytesIO()
+        out.save(buf, _VARIANT_FORMAT, quality=IMAGE_QUALITY)
+        variants[name] = buf.getvalue()
+    return variants
+
+
+def image_variant_urls(image_url):
+    """
+    {variant_name: url} for a meal's image_url. Images stored before
+    variants existed (or set by URL) have a single size, which is returned
+    for every variant.
+    """
+    if not image_url:
+        return None
+    m = _VARIANT_URL.match(image_url)
+    if not m:
+        return {name: image_url for name in IMAGE_VARIANTS}
+    return {name: f"{m['base']}{name}.{m['ext']}" for name in IMAGE_VARIANTS}
+
+
+# ---------------------------------------------------------------------------
+# Enqueue (request path)
+# ---------------------------------------------------------------------------
+
+def enqueue_image(meal, file=None, url=None):
+    """
+    Queue an image for `meal` and mark it pending. Runs inside the caller's
+    transaction, so the job only exists if the meal write commits. The meal
+    must already be flushed. A newer image supersedes any still-pending one.
+    """
+    ImageJob.query.filter(
+        ImageJob.meal_id == meal.id, ImageJob.status == 'pending',
+    ).update({'status': 'superseded'}, synchronize_session=False)
+
+    job = ImageJob(meal_id=meal.id, status='pending', attempts=0,
+                   next_attempt_at=datetime.now(timezone.utc))
+    if file is not None:
+        job.data = file.read()   # re-encoded into variants, so its name and type don't matter
+    else:
+        job.source_url = url
+    db.session.add(job)
+    meal.image_status = 'pending'
+    return job
+
+
+def queue_variant_backfill():
+    """
+    Queue every meal whose image predates variants to be re-fetched and
+    re-encoded. Local (/uploads/...) images are skipped. The old URL keeps
+    serving until the job lands. Returns the number of jobs queued.
+    """
+    queued = 0
+    for meal in Meal.query.filter(Meal.image_url.like('http%')).all():
+        if not _VARIANT_URL.match(meal.image_url):
+            enqueue_image(meal, url=meal.image_url)
+            queued += 1
+    db.session.commit()
+    return queued
+
+
+# ---------------------------------------------------------------------------
+# Worker
+# ---------------------------------------------------------------------------
+
+def _fetch_web_image(url):
+    r = _http.get(url, timeout=WEB_IMAGE_TIMEOUT)
+    r.raise_for_status()
+    return r.content
+
+
+def _store_job(job):
+    """
+    Render and store one claimed job's variants. Returns (url, error,
+    retryable) with url pointing at the 'full' variant — never raises.
+    """
+    job_id, source_url, data = job
+    try:
+        if source_url:
+            data = _fetch_web_image(source_url)
+        variants = render_variants(data)
+        prefix = f"uploads/meals/{uuid.uuid4()}"
+        urls = {
+            name: image_store.put(f"{prefix}/{name}.{_VARIANT_EXT}", body, _VARIANT_CONTENT_TYPE)
+            for name, body in variants.items()
+        }
+        return urls['full'], None, False
+    except UnusableImage as e:
+        print(f"Image job {job_id} failed permanently: {e}")
+        return None, f"Unusable image: {e}"[:500], False
+    except Exception as e:
+        print(f"Image job {job_id} failed: {e}")
+        return None, str(e)[:500], True
+
+
+def _claim_jobs(limit):
+    now = datetime.now(timezone.utc)
+    due = or_(
+        and_(ImageJob.status == 'pending', ImageJob.next_attempt_at <= now),
+        and_(ImageJob.status == 'processing', ImageJob.updated_at < now - IMAGE_JOB_LEASE),
+    )
+    jobs = ImageJob.query.filter(due).order_by(ImageJob.id).limit(limit).with_for_update(skip_locked=True).all()
+    claimed = []
+    for job in jobs:
+        job.status = 'processing'
+        job.attempts += 1
+        claimed.append((job.id, job.source_url, job.data))
+    db.session.commit()
+    return claimed
+
+
+def _latest_job_for_meal(job):
+    newer = aliased(ImageJob)
+    return ~exists().where(newer.meal_id == job.meal_id, newer.id > job.id)
+
+
+def process_image_jobs(limit=IMAGE_JOB_BATCH):
+    """
+    Claim up to `limit` due jobs, store them concurrently and record the
+    outcome. Safe to run from any number of processes at once. Returns a
+    dict of counts: claimed, stored, retrying, failed.
+    """
+    claimed = _claim_jobs(limit)
+    report = {'claimed': len(claimed), 'stored': 0, 'retrying': 0, 'failed': 0}
+    if not claimed:
+        return report
+
+    with ThreadPoolExecutor(max_workers=min(IMAGE_INGEST_WORKERS, len(claimed)),
+                            thread_name_prefix='image-worker') as pool:
+        outcomes = list(zip((j[0] for j in claimed), pool.map(_store_job, claimed)))
+
+    now = datetime.now(timezone.utc)
+    touched_meals = set()
+    for job_id, (url, error, retryable) in outcomes:
+        job = ImageJob.query.get(job_id)
+        if job is None:   # meal deleted while the upload was in flight
+            continue
+        meal_update = None
+        if url:
+            job.status, job.data, job.last_error = 'done', None, None
+            meal_update = {'image_url': url, 'image_status': 'ready'}
+            report['stored'] += 1
+        elif not retryable or job.attempts >= IMAGE_JOB_MAX_ATTEMPTS:
+            job.status, job.last_error = 'failed', error
+            meal_update = {'image_status': 'failed'}
+            report['failed'] += 1
+        else:
+            backoff = min(IMAGE_JOB_BACKOFF_SECONDS * 2 ** (job.attempts - 1), IMAGE_JOB_BACKOFF_CAP_SECONDS)
+            job.status, job.last_error = 'pending', error
+            job.next_attempt_at = now + timedelta(seconds=backoff)
+            report['retrying'] += 1
+        if meal_update:
+            # Only the meal's most recent job may touch it, so a slow upload of
+            # a replaced image can't overwrite the newer one.
+            Meal.query.filter(Meal.id == job.meal_id, _latest_job_for_meal(job)).update(
+                meal_update, synchronize_session=False)
+            if url:   # the dish card shows its latest image
+                Dish.query.filter(Dish.id == db.select(Meal.dish_id).where(
+                    Meal.id == job.meal_id, _latest_job_for_meal(job)).scalar_subquery()
+                ).update({'image_url': url}, synchronize_session=False)
+            touched_meals.add(job.meal_id)
+    db.session.commit()
+    if touched_meals:
+        chapter_ids = db.session.query(Meal.chapter_id).filter(Meal.id.in_(touched_meals)).distinct()
+        for (chapter_id,) in chapter_ids.all():
+            bump_chapter_version(chapter_id)
+    return report
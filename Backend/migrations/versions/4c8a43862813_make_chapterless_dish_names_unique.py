@@ -0,0 +1,79 @@
+"""make chapterless dish names unique
+
+Revision ID: 4c8a43862813
+Revises: 3642a5719bae
+Create Date: 2026-10-18 06:17:21.702034
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8a43862813'
+down_revision = '3642a5719bae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # The old constraint let chapterless dishes repeat a name. Fold each
+    # repeat into the lowest id, then recompute those dishes' rollups.
+    op.execute("""
+        CREATE TEMPORARY TABLE dish_merges AS
+        SELECT id, min(id) OVER (PARTITION BY name) AS keeper FROM dishes WHERE chapter_id IS NULL
+    """)
+    op.execute("DELETE FROM dish_merges WHERE keeper NOT IN (SELECT keeper FROM dish_merges WHERE id <> keeper)")
+    op.execute("""
+        UPDATE meals SET dish_id = dm.keeper
+        FROM dish_merges dm
+        WHERE meals.dish_id = dm.id AND dm.id <> dm.keeper
+    """)
+    op.execute("DELETE FROM dishes USING dish_merges dm WHERE dishes.id = dm.id AND dm.id <> dm.keeper")
+    op.execute("""
+        UPDATE dishes SET times_served = s.served, served_by_type = s.served_by_type, last_served_at = s.last
+        FROM (
+            SELECT dish_id, SUM(served) AS served, json_object_agg(meal_type, served) AS served_by_type, MAX(last) AS last
+            FROM (SELECT dish_id, meal_type, COUNT(*) AS served, MAX(meal_date) AS last
+                  FROM meals GROUP BY dish_id, meal_type) per_type
+            GROUP BY dish_id
+        ) s
+        WHERE dishes.id = s.dish_id AND dishes.id IN (SELECT keeper FROM dish_merges)
+    """)
+    op.execute("""
+        UPDATE dishes SET attendance_total = a.attendance
+        FROM (
+            SELECT m.dish_id, COUNT(*) AS attendance
+            FROM meal_attendance ma JOIN meals m ON m.id = ma.meal_id
+            GROUP BY m.dish_id
+        ) a
+        WHERE dishes.id = a.dish_id AND dishes.id IN (SELECT keeper FROM dish_merges)
+    """)
+    # M2 = sample variance * (n - 1), as in meal_rating_stats.
+    op.execute("""
+        UPDATE dishes SET n = r.n, mean = r.mean, m2 = r.m2
+        FROM (
+            SELECT m.dish_id, COUNT(*) AS n, AVG(rv.rating) AS mean,
+                   COALESCE(VAR_SAMP(rv.rating), 0) * (COUNT(*) - 1) AS m2
+            FROM reviews rv JOIN meals m ON m.id = rv.meal_id
+            GROUP BY m.dish_id
+        ) r
+        WHERE dishes.id = r.dish_id AND dishes.id IN (SELECT keeper FROM dish_merges)
+    """)
+    op.execute("DROP TABLE dish_merges")
+
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('dishes', schema=None) as batch_op:
+        batch_op.drop_constraint(batch_op.f('chapter_dish_uc'), type_='unique')
+        batch_op.create_unique_constraint('chapter_dish_uc', ['chapter_id', 'name'], postgresql_nulls_not_distinct=True)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    with op.batch_alter_table('dishes', schema=None) as batch_op:
+        batch_op.drop_constraint('chapter_dish_uc', type_='unique')
+        batch_op.create_unique_constraint(batch_op.f('chapter_dish_uc'), ['chapter_id', 'name'], postgresql_nulls_not_distinct=False)
+
+    # ### end Alembic commands ###
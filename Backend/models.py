@@ -36,6 +36,9 @@ class User(db.Model):
     eaten_meals = db.relationship('MealAttendance', backref='user', lazy=True, cascade='all, delete-orphan')
     weekly_presets = db.relationship('WeeklyPreset', backref='user', lazy=True, cascade='all, delete-orphan')
 
+    # Chapter rosters are listed by name.
+    __table_args__ = (db.Index('ix_users_chapter_id_name_id', 'chapter_id', 'name', 'id'),)
+
     def __repr__(self):
         return f'<User {self.email}>'
 
@@ -48,18 +51,50 @@ class Meal(db.Model):
     dish_name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     image_url = db.Column(db.String(200), nullable=True)
+    image_status = db.Column(db.String(20), nullable=True)  # None | 'pending' | 'ready' | 'failed'
     late_plate_hours_before = db.Column(db.Integer, nullable=True)
     chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=True)
+    dish_id = db.Column(db.Integer, db.ForeignKey('dishes.id'), nullable=False)  # set by rollups.record_meal
     created_at = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    presets_applied_at = db.Column(db.DateTime, nullable=True)  # last time weekly presets were applied chapter-wide
 
     reviews = db.relationship('Review', backref='meal', lazy=True, cascade="all, delete-orphan")
     late_plates = db.relationship('LatePlate', backref='meal', lazy=True, cascade='all, delete-orphan')
     attendees = db.relationship('MealAttendance', backref='meal', lazy=True, cascade='all, delete-orphan')
 
+    __table_args__ = (
+        # Every menu, dashboard and analytics read is a chapter + date range.
+        db.Index('ix_meals_chapter_id_meal_date', 'chapter_id', 'meal_date'),
+        # A dish's occurrences, newest first; also its last-served lookup.
+        db.Index('ix_meals_dish_id_meal_date', 'dish_id', 'meal_date'),
+    )
+
     def __repr__(self):
         return f'<Meal {self.dish_name} on {self.meal_date}>'
 
 
+class ImageJob(db.Model):
+    """Deferred meal image upload, drained by the image worker (see images.py)."""
+    __tablename__ = 'image_jobs'
+    id = db.Column(db.Integer, primary_key=True)
+    meal_id = db.Column(db.Integer, db.ForeignKey('meals.id', ondelete='CASCADE'), nullable=False)
+    source_url = db.Column(db.String(500), nullable=True)   # web image to download, or
+    data = db.Column(db.LargeBinary, nullable=True)         # uploaded file bytes (cleared once stored)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending | processing | done | failed | superseded
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now())
+    __table_args__ = (
+        db.Index('ix_image_jobs_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_image_jobs_meal_id', 'meal_id'),
+    )
+
+    def __repr__(self):
+        return f'<ImageJob {self.id} meal={self.meal_id} {self.status}>'
+
+
 class Review(db.Model):
     __tablename__ = 'reviews'
 
@@ -69,14 +104,153 @@ class Review(db.Model):
     rating = db.Column(db.Float, nullable=False)
     comment = db.Column(db.Text, nullable=True)
     hidden = db.Column(db.Boolean, default=False, nullable=False)
-    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), server_default=db.func.now(),
+                           nullable=False)  # keyset sort key of the admin review log
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'meal_id', name='user_meal_review_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'meal_id', name='user_meal_review_uc'),
+        db.Index('ix_reviews_meal_id_created_at', 'meal_id', 'created_at'),
+        # Keyset order of the admin review log.
+        db.Index('ix_reviews_created_at_id', 'created_at', 'id'),
+    )
 
     def __repr__(self):
         return f'<Review {self.id} by User {self.user_id} for Meal {self.meal_id}>'
 
 
+class MealRatingStats(db.Model):
+    """Materialised Welford moments (n, mean, M2) of a meal's review ratings."""
+    __tablename__ = 'meal_rating_stats'
+    meal_id = db.Column(db.Integer, db.ForeignKey('meals.id', ondelete='CASCADE'), primary_key=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now())
+
+    def __repr__(self):
+        return f'<MealRatingStats meal={self.meal_id} n={self.n} mean={self.mean}>'
+
+
+class Dish(db.Model):
+    """
+    A chapter's dish, shared by every meal that serves it, with rollups kept
+    current by rollups.py: how often and when it was served, total attendance
+    and the Welford moments (n, mean, M2) of its review ratings.
+    """
+    __tablename__ = 'dishes'
+    id = db.Column(db.Integer, primary_key=True)
+    chapter_id = db.Column(db.Integer, db.ForeignKey('chapters.id'), nullable=True)
+    name = db.Column(db.String(100), nullable=False)
+    description = db.Column(db.Text, nullable=True)                     # latest meal's, when it had one
+    image_url = db.Column(db.String(200), nullable=True)                # likewise
+    times_served = db.Column(db.Integer, nullable=False, default=0)
+    served_by_type = db.Column(db.JSON, nullable=False, default=dict)   # {'Lunch': 3, 'Dinner': 5}
+    attendance_total = db.Column(db.Integer, nullable=False, default=0)
+    last_served_at = db.Column(db.DateTime, nullable=True)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now())
+
+    meals = db.relationship('Meal', backref='dish', lazy=True)
+
+    __table_args__ = (
+        # NULLS NOT DISTINCT (PostgreSQL 15+): chapterless dishes are unique by name too,
+        # so the ON CONFLICT in rollups._locked_dish_named dedupes them.
+        db.UniqueConstraint('chapter_id', 'name', name='chapter_dish_uc', postgresql_nulls_not_distinct=True),
+        # Dish-name autocomplete: trigram matches (typos, %> / <%) and ILIKE '%q%'.
+        db.Index('ix_dishes_name_trgm', 'name', postgresql_using='gin', postgresql_ops={'name': 'gin_trgm_ops'}),
+    )
+
+    def __repr__(self):
+        return f'<Dish {self.name} served={self.times_served} n={self.n}>'
+
+
+class ChapterVersion(db.Model):
+    """Per-chapter change counter; cached menu payloads are keyed on it (see response_cache.py)."""
+    __tablename__ = 'chapter_versions'
+    chapter_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 for chapterless meals
+    version = db.Column(db.BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<ChapterVersion chapter={self.chapter_id} v{self.version}>'
+
+
+class AnalyticsDay(db.Model):
+    """
+    One chapter-day of admin dashboard rollups, keyed by meal date (see
+    analytics_snapshot.py). Writes bump `marks`; the refresh job recomputes
+    the day while marks > built_marks.
+    """
+    __tablename__ = 'analytics_days'
+    chapter_id = db.Column(db.Integer, primary_key=True, autoincrement=False)  # 0 for chapterless meals
+    day = db.Column(db.Date, primary_key=True)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+    attendance_total = db.Column(db.Integer, nullable=False, default=0)
+    late_plate_count = db.Column(db.Integer, nullable=False, default=0)  # live + archived
+    n = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)
+    meals = db.Column(db.JSON, nullable=False, default=list)  # [{id, dish_name, meal_type, meal_date, attendance, n, mean, m2}]
+    marks = db.Column(db.BigInteger, nullable=False, default=0)
+    built_marks = db.Column(db.BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        # The refresh job's "which chapters have dirty days" probe.
+        db.Index('ix_analytics_days_dirty_chapter_id', 'chapter_id', postgresql_where=db.text('marks > built_marks')),
+    )
+
+    def __repr__(self):
+        return f'<AnalyticsDay chapter={self.chapter_id} {self.day} meals={self.meal_count}>'
+
+
+class AnalyticsWeek(db.Model):
+    """A chapter's Monday-to-Sunday week, merged from its analytics_days rows."""
+    __tablename__ = 'analytics_weeks'
+    chapter_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    week_start = db.Column(db.Date, primary_key=True)
+    meal_count = db.Column(db.Integer, nullable=False, default=0)
+    attendance_total = db.Column(db.Integer, nullable=False, default=0)
+    late_plate_count = db.Column(db.Integer, nullable=False, default=0)
+    n = db.Column(db.Integer, nullable=False, default=0)
+    mean = db.Column(db.Float, nullable=False, default=0.0)
+    m2 = db.Column(db.Float, nullable=False, default=0.0)
+
+    def __repr__(self):
+        return f'<AnalyticsWeek chapter={self.chapter_id} {self.week_start} meals={self.meal_count}>'
+
+
+class AnalyticsSnapshot(db.Model):
+    """The admin dashboard payload of one chapter, as of built_at."""
+    __tablename__ = 'analytics_snapshots'
+    chapter_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    payload = db.Column(db.JSON, nullable=False)
+    source_version = db.Column(db.BigInteger, nullable=False)  # chapter version it was built from
+    built_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    build_ms = db.Column(db.Float, nullable=False)
+
+    def __repr__(self):
+        return f'<AnalyticsSnapshot chapter={self.chapter_id} v{self.source_version} {self.built_at}>'
+
+
+class JobRun(db.Model):
+    """One execution of a scheduled job (see scheduler.py)."""
+    __tablename__ = 'job_runs'
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(64), nullable=False)
+    host = db.Column(db.String(128), nullable=True)              # hostname:pid of the leader that ran it
+    started_at = db.Column(db.DateTime(timezone=True), nullable=False)
+    duration_ms = db.Column(db.Float, nullable=False)
+    rows = db.Column(db.Integer, nullable=True)                  # rows the job reported touching
+    status = db.Column(db.String(10), nullable=False)            # 'ok' | 'error'
+    error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (db.Index('ix_job_runs_job_name_started_at', 'job_name', 'started_at'),)
+
+    def __repr__(self):
+        return f'<JobRun {self.job_name} {self.status} {self.duration_ms}ms>'
+
+
 class LatePlate(db.Model):
     __tablename__ = 'late_plates'
     id = db.Column(db.Integer, primary_key=True)
@@ -88,21 +262,60 @@ class LatePlate(db.Model):
     notes = db.Column(db.Text, nullable=True)
     pickup_time = db.Column(db.Time, nullable=True)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'meal_id', 'request_date', name='user_meal_late_plate_date_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'meal_id', 'request_date', name='user_meal_late_plate_date_uc'),
+        db.Index('ix_late_plates_meal_id_request_date', 'meal_id', 'request_date'),
+        # Only pending requests are polled (admin badge count); keep that index tiny.
+        db.Index('ix_late_plates_pending_meal_id', 'meal_id', postgresql_where=db.text("status = 'pending'")),
+    )
 
     def __repr__(self):
         return f'<LatePlate {self.id} by User {self.user_id}'
 
 
+class LatePlateHistory(db.Model):
+    """
+    Archived late plate (see retention.py). Keeps the original id and what
+    analytics needs; chapter_id and meal_date are copied off the meal so
+    history queries don't join meals. Notes are not archived.
+    """
+    __tablename__ = 'late_plate_history'
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    meal_id = db.Column(db.Integer, db.ForeignKey('meals.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    chapter_id = db.Column(db.Integer, nullable=True)
+    meal_date = db.Column(db.DateTime, nullable=False)
+    request_time = db.Column(db.DateTime(timezone=True), nullable=True)
+    request_date = db.Column(db.Date, nullable=False)
+    status = db.Column(db.String(20), nullable=True)
+    pickup_time = db.Column(db.Time, nullable=True)
+    archived_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_late_plate_history_chapter_id_request_date', 'chapter_id', 'request_date'),
+        db.Index('ix_late_plate_history_meal_id', 'meal_id'),
+    )
+
+    def __repr__(self):
+        return f'<LatePlateHistory {self.id} by User {self.user_id}>'
+
+
 class MealAttendance(db.Model):
     __tablename__ = 'meal_attendance'
     id = db.Column(db.Integer, primary_key=True)
     meal_id = db.Column(db.Integer, db.ForeignKey('meals.id'), nullable=False)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
-    attendance_time = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    attendance_time = db.Column(db.DateTime(timezone=True), default=db.func.now(), server_default=db.func.now(),
+                                nullable=False)  # keyset sort key of the admin attendance log
     confirmed = db.Column(db.Boolean, nullable=True)
 
-    __table_args__ = (db.UniqueConstraint('user_id', 'meal_id', name='user_meal_attendance_uc'),)
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'meal_id', name='user_meal_attendance_uc'),
+        # The unique constraint leads with user_id; per-meal counts need meal_id first.
+        db.Index('ix_meal_attendance_meal_id', 'meal_id'),
+        # Keyset order of the admin attendance log.
+        db.Index('ix_meal_attendance_attendance_time_id', 'attendance_time', 'id'),
+    )
 
     def __repr__(self):
         return f'<MealAttendance {self.id} by User {self.user_id} for Meal {self.meal_id}>'
@@ -133,10 +346,13 @@ class Recommendation(db.Model):
     meal_name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=True)
     link = db.Column(db.String(200), nullable=True)
-    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), server_default=db.func.now(),
+                           nullable=False)  # keyset sort key of the admin recommendation list
 
     user = db.relationship('User', backref='recommendations', lazy=True)
 
+    __table_args__ = (db.Index('ix_recommendations_created_at_id', 'created_at', 'id'),)
+
     def __repr__(self):
         return f'<Recommendation {self.id} - {self.meal_name}>'
 
@@ -166,3 +382,27 @@ class PendingRegistration(db.Model):
 
     def __repr__(self):
         return f'<PendingRegistration {self.email}>'
+
+
+class EmailOutbox(db.Model):
+    """Transactional email queued by a request and sent by the email dispatcher (see email_utils.py)."""
+    __tablename__ = 'email_outbox'
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)                       # verification | reset
+    to_email = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    html = db.Column(db.Text, nullable=True)                              # cleared once sent (carries a token link)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # pending | sending | sent | dead | superseded
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), nullable=False)
+    last_error = db.Column(db.Text, nullable=True)
+    sent_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    created_at = db.Column(db.DateTime(timezone=True), default=db.func.now())
+    updated_at = db.Column(db.DateTime(timezone=True), default=db.func.now(), onupdate=db.func.now())
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt_at', 'status', 'next_attempt_at'),
+        db.Index('ix_email_outbox_to_email_kind', 'to_email', 'kind'),
+    )
+
+    def __repr__(self):
+        return f'<EmailOutbox {self.id} {self.kind} to={self.to_email} {self.status}>'
@@ -0,0 +1,130 @@
+"""
+Password hashing off the request thread.
+
+bcrypt at a sensible cost is ~250 ms of pure CPU. Done inline, every login
+holds a request thread (and, under the GIL, slows every other thread in the
+worker) for that long. Instead hash_password / check_password hand the
+work to a per-worker process pool of PASSWORD_HASH_WORKERS processes and
+wait for the result. At most PASSWORD_HASH_QUEUE hashes may be queued or
+running per worker; past that they raise PasswordHasherBusy, which routes
+turn into a 429 with Retry-After. A login burst then gets a fast "try again"
+instead of piling up behind the pool while every other request waits.
+
+The cost is BCRYPT_LOG_ROUNDS. needs_rehash() reports hashes made at a
+different cost, and login upgrades them once the password has checked out,
+so raising (or lowering) the cost takes effect user by user without resets.
+
+The pool is created lazily on first use, i.e. in each gunicorn worker after
+it has forked. Its processes come from a fork server rather than a fork()
+of the worker: the worker runs request threads, and a child forked from it
+can inherit a lock another thread held at that moment (logging, the DB
+pool) and hang on it. The fork server is a fresh interpreter that imports
+the main module once (gunicorn's, or app.py under `python app.py`, which
+then skips the scheduler) plus this module, and the pool processes fork
+from it ready to hash. Set PASSWORD_HASH_WORKERS=0 to hash inline (tests,
+one-off scripts).
+
+A queue slot is held until the hash itself finishes, not until the caller
+stops waiting: a hash that timed out still occupies a pool process, so it
+keeps counting against PASSWORD_HASH_QUEUE.
+"""
+import atexit
+import multiprocessing
+import os
+import threading
+import bcrypt
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from flask import jsonify
+
+BCRYPT_LOG_ROUNDS = int(os.getenv('BCRYPT_LOG_ROUNDS', 12))
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+PASSWORD_HASH_QUEUE = int(os.getenv('PASSWORD_HASH_QUEUE', 4))   # keep below gunicorn --threads
+PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+
+
+class PasswordHasherBusy(Exception):
+    """The hashing queue is full (or a hash timed out); the client should retry shortly."""
+
+
+def busy_response():
+    return jsonify({'error': 'Too many sign-in attempts right now. Please try again in a moment.'}), 429, {'Retry-After': '1'}
+
+
+# ---------------------------------------------------------------------------
+# Work done in the pool (module-level so the children can run it)
+# ---------------------------------------------------------------------------
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(pw_hash, password):
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), pw_hash.encode('utf-8'))
+    except ValueError:   # not a bcrypt hash
+        return False
+
+
+# ---------------------------------------------------------------------------
+# Pool
+# ---------------------------------------------------------------------------
+
+_pool = {'pid': None, 'executor': None}
+_pool_lock = threading.Lock()
+_slots = threading.BoundedSemaphore(PASSWORD_HASH_QUEUE)
+
+
+def _executor():
+    with _pool_lock:
+        if _pool['pid'] != os.getpid():   # first use in this (forked) worker
+            context = multiprocessing.get_context('forkserver')
+            context.set_forkserver_preload(['__main__', 'passwords'])
+            _pool['executor'] = ProcessPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, mp_context=context)
+            _pool['pid'] = os.getpid()
+        return _pool['executor']
+
+
+@atexit.register
+def _shutdown():
+    if _pool['executor'] is not None and _pool['pid'] == os.getpid():
+        _pool['executor'].shutdown(wait=False, cancel_futures=True)
+
+
+def _run(fn, *args):
+    if PASSWORD_HASH_WORKERS <= 0:
+        return fn(*args)
+    if not _slots.acquire(blocking=False):
+        raise PasswordHasherBusy()
+    try:
+        future = _executor().submit(fn, *args)
+    except BaseException:
+        _slots.release()
+        raise
+    future.add_done_callback(lambda _: _slots.release())
+    try:
+        return future.result(timeout=PASSWORD_HASH_TIMEOUT)
+    except TimeoutError:
+        future.cancel()   # frees the slot if it never started; a running hash keeps it
+        raise PasswordHasherBusy()
+
+
+# ---------------------------------------------------------------------------
+# API
+# ---------------------------------------------------------------------------
+
+def hash_password(password, rounds=None):
+    """bcrypt hash of `password` at BCRYPT_LOG_ROUNDS. Raises PasswordHasherBusy when saturated."""
+    return _run(_hash, password, rounds or BCRYPT_LOG_ROUNDS)
+
+
+def check_password(pw_hash, password):
+    """Whether `password` matches `pw_hash`. Raises PasswordHasherBusy when saturated."""
+    return _run(_check, pw_hash, password)
+
+
+def needs_rehash(pw_hash):
+    """True when `pw_hash` wasn't made at the configured cost ($2b$<rounds>$...)."""
+    try:
+        return int(pw_hash.split('$')[2]) != BCRYPT_LOG_ROUNDS
+    except (IndexError, ValueError):
+        return True
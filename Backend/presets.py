@@ -0,0 +1,268 @@
+"""
+Set-based weekly preset engine.
+
+Weekly presets say, per (user, weekday, meal type), whether the member is
+attending and whether a late plate should be requested for them. Rather
+than walking meals or users one at a time, the functions here work on
+whole sets — joining meals against chapter members and their enabled
+presets inside Postgres, or diffing one member's presets against
+preloaded state — so the number of statements does not depend on how
+many members or meals are involved.
+"""
+import os
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import and_, or_, cast, literal, func, exists, Integer, Date
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import Meal, User, MealAttendance, LatePlate, WeeklyPreset
+from response_cache import bump_chapter_version
+from rollups import shift_attendance
+from analytics_snapshot import mark_meals_dirty
+
+# How far ahead the scheduled chapter-wide pass applies presets; matches
+# the window of the member's own "apply presets" button.
+PRESET_APPLY_DAYS = int(os.getenv('PRESET_APPLY_DAYS', 8))
+
+# pg advisory lock key held while the chapter-wide pass runs, so concurrent
+# schedulers (one per gunicorn worker) don't apply the same meals twice.
+_APPLY_ALL_LOCK = 0x70726573   # 'pres'
+
+# Postgres ISODOW is 1=Mon..7=Sun; presets use Python's weekday() (0=Mon..6=Sun).
+_MEAL_WEEKDAY = cast(func.extract('isodow', Meal.meal_date), Integer) - 1
+
+
+def _chapter_members(chapter_id):
+    return User.chapter_id.is_(None) if chapter_id is None else User.chapter_id == chapter_id
+
+
+def _preset_match():
+    return and_(
+        WeeklyPreset.user_id == User.id,
+        WeeklyPreset.enabled.is_(True),
+        WeeklyPreset.day_of_week == _MEAL_WEEKDAY,
+        WeeklyPreset.meal_type == Meal.meal_type,
+    )
+
+
+def seed_meal_attendance(meal_ids, chapter_id):
+    """
+    Seed attendance and preset late plates for freshly created meals.
+
+    Every chapter member is marked attending unless an enabled preset for
+    that weekday and meal type opts them out; presets with late_plate set
+    also get a pending late plate request dated today (UTC), unless the
+    member already has one for the meal. Two INSERT ...
+    SELECT statements regardless of chapter size or number of meals, plus
+    stamping the meals' presets_applied_at.
+
+    Returns (attendance_rows, late_plate_rows) inserted.
+    """
+    if not meal_ids:
+        return 0, 0
+
+    attending = db.select(Meal.id, User.id).select_from(Meal).join(
+        User, _chapter_members(chapter_id)
+    ).outerjoin(WeeklyPreset, _preset_match()).where(
+        Meal.id.in_(meal_ids),
+        or_(WeeklyPreset.id.is_(None), WeeklyPreset.attending.is_(True)),
+    )
+    attended = db.session.execute(
+        pg_insert(MealAttendance).from_select(['meal_id', 'user_id'], attending)
+        .on_conflict_do_nothing().returning(MealAttendance.meal_id)
+    ).scalars().all()
+    shift_attendance(Counter(attended))
+
+    request_date = datetime.now(timezone.utc).date()
+    has_late_plate = exists().where(LatePlate.meal_id == Meal.id, LatePlate.user_id == User.id)
+    late_plates = db.select(
+        Meal.id, User.id,
+        WeeklyPreset.late_plate_notes, WeeklyPreset.late_plate_pickup_time,
+        literal('pending'), cast(literal(request_date), Date),
+    ).select_from(Meal).join(
+        User, _chapter_members(chapter_id)
+    ).join(WeeklyPreset, _preset_match()).where(
+        Meal.id.in_(meal_ids),
+        WeeklyPreset.late_plate.is_(True),
+        ~has_late_plate,
+    )
+    late_plate_rows = db.session.execute(
+        pg_insert(LatePlate).from_select(
+            ['meal_id', 'user_id', 'notes', 'pickup_time', 'status', 'request_date'], late_plates,
+        ).on_conflict_do_nothing()
+    ).rowcount
+    if late_plate_rows:
+        mark_meals_dirty(meal_ids)
+
+    Meal.query.filter(Meal.id.in_(meal_ids)).update(
+        {'presets_applied_at': datetime.now()}, synchronize_session=False)
+    return len(attended), late_plate_rows
+
+
+def apply_user_presets(user_id, chapter_id, start, end):
+    """
+    Apply one member's enabled presets to the chapter's meals in
+    [start, end). A preset with attending set adds the member's attendance,
+    one without removes it, and late_plate adds a pending late plate dated
+    today unless the member already has one for that meal. Presets and the
+    member's existing attendance and late plates are loaded once, and the
+    difference is written with one bulk statement per table, so the
+    statement count is constant in the number of meals.
+
+    Returns a list with one entry per meal a preset matched:
+    {meal_id, dish_name, meal_date, meal_type, attendance, late_plate},
+    where attendance is 'added', 'removed' or None (unchanged) and
+    late_plate is 'added' or None. The caller commits.
+    """
+    meals = db.session.query(Meal.id, Meal.dish_name, Meal.meal_date, Meal.meal_type).filter(
+        Meal.chapter_id == chapter_id,
+        Meal.meal_date >= start,
+        Meal.meal_date < end,
+    ).order_by(Meal.meal_date).all()
+    if not meals:
+        return []
+
+    presets = {
+        (p.day_of_week, p.meal_type): p
+        for p in WeeklyPreset.query.filter_by(user_id=user_id, enabled=True)
+    }
+    matched = [(m, presets[(m.meal_date.weekday(), m.meal_type)])
+               for m in meals if (m.meal_date.weekday(), m.meal_type) in presets]
+    if not matched:
+        return []
+
+    meal_ids = [m.id for m, _ in matched]
+    attending = {meal_id for (meal_id,) in db.session.query(MealAttendance.meal_id).filter(
+        MealAttendance.user_id == user_id, MealAttendance.meal_id.in_(meal_ids))}
+    has_late_plate = {meal_id for (meal_id,) in db.session.query(LatePlate.meal_id).filter(
+        LatePlate.user_id == user_id, LatePlate.meal_id.in_(meal_ids))}
+
+    request_date = date.today()
+    add_attendance, remove_attendance, add_late_plates, report = [], [], [], []
+    for meal, preset in matched:
+        change = {
+            'meal_id': meal.id,
+            'dish_name': meal.dish_name,
+            'meal_date': meal.meal_date.isoformat(),
+            'meal_type': meal.meal_type,
+            'attendance': None,
+            'late_plate': None,
+        }
+        if preset.attending and meal.id not in attending:
+            add_attendance.append({'meal_id': meal.id, 'user_id': user_id})
+            change['attendance'] = 'added'
+        elif not preset.attending and meal.id in attending:
+            remove_attendance.append(meal.id)
+            change['attendance'] = 'removed'
+        if preset.late_plate and meal.id not in has_late_plate:
+            add_late_plates.append({
+                'meal_id': meal.id, 'user_id': user_id,
+                'notes': preset.late_plate_notes,
+                'pickup_time': preset.late_plate_pickup_time,
+                'status': 'pending',
+                'request_date': request_date,
+            })
+            change['late_plate'] = 'added'
+        report.append(change)
+
+    deltas = Counter()
+    if remove_attendance:
+        deltas.subtract(db.session.execute(db.delete(MealAttendance).where(
+            MealAttendance.user_id == user_id, MealAttendance.meal_id.in_(remove_attendance),
+        ).returning(MealAttendance.meal_id)).scalars().all())
+    if add_attendance:
+        deltas.update(db.session.execute(pg_insert(MealAttendance).values(add_attendance)
+                                         .on_conflict_do_nothing().returning(MealAttendance.meal_id)).scalars().all())
+    shift_attendance(deltas)
+    if add_late_plates:
+        db.session.execute(pg_insert(LatePlate).values(add_late_plates).on_conflict_do_nothing())
+        mark_meals_dirty(lp['meal_id'] for lp in add_late_plates)
+    return report
+
+
+def _same_chapter():
+    # Chapterless users and meals form one group, as in the response cache.
+    return func.coalesce(User.chapter_id, 0) == func.coalesce(Meal.chapter_id, 0)
+
+
+def apply_presets_to_upcoming_meals(days=PRESET_APPLY_DAYS):
+    """
+    Apply every member's enabled presets to upcoming meals in every
+    chapter, in one set-based pass: one DELETE for attendance that presets
+    opt out of, one INSERT ... SELECT each for attendance and late plates
+    they opt into, whatever the number of chapters, members or meals.
+
+    Each meal is handled once, when it comes within `days` of starting — a
+    meal whose presets were last applied (by this pass, or by seeding when
+    it was created) before it entered that window is picked up; anything
+    stamped since is skipped. Re-running is therefore a no-op, and an RSVP a
+    member toggles by hand afterwards is left alone. Only one caller at a
+    time does the work (pg advisory lock); others return None.
+
+    Commits, and returns {meals, attendance_added, attendance_removed,
+    late_plates_added, timings_ms}.
+    """
+    started = time.perf_counter()
+    if not db.session.execute(db.select(func.pg_try_advisory_xact_lock(_APPLY_ALL_LOCK))).scalar():
+        db.session.rollback()
+        return None
+
+    now = datetime.now()
+    horizon = timedelta(days=days)
+    due = db.session.query(Meal.id, Meal.chapter_id).filter(
+        Meal.meal_date >= now,
+        Meal.meal_date < now + horizon,
+        or_(Meal.presets_applied_at.is_(None), Meal.presets_applied_at < Meal.meal_date - horizon),
+    ).all()
+    meal_ids = [meal_id for meal_id, _ in due]
+    report = {'meals': len(meal_ids), 'attendance_added': 0, 'attendance_removed': 0,
+              'late_plates_added': 0, 'timings_ms': {}}
+
+    def timed(step, stmt, returning=False):
+        # With returning=True the statement's RETURNING column comes back as a list.
+        t = time.perf_counter()
+        result = db.session.execute(stmt)
+        returned = result.scalars().all() if returning else None
+        report[step] = len(returned) if returning else result.rowcount
+        report['timings_ms'][step] = round((time.perf_counter() - t) * 1000, 1)
+        return returned
+
+    if meal_ids:
+        in_window = and_(Meal.id.in_(meal_ids), _same_chapter(), _preset_match())
+        removed = timed('attendance_removed', db.delete(MealAttendance).where(
+            MealAttendance.meal_id == Meal.id,
+            MealAttendance.user_id == User.id,
+            WeeklyPreset.attending.is_(False),
+            in_window,
+        ).returning(MealAttendance.meal_id), returning=True)
+        added = timed('attendance_added', pg_insert(MealAttendance).from_select(
+            ['meal_id', 'user_id'],
+            db.select(Meal.id, User.id).where(WeeklyPreset.attending.is_(True), in_window),
+        ).on_conflict_do_nothing().returning(MealAttendance.meal_id), returning=True)
+        has_late_plate = exists().where(LatePlate.meal_id == Meal.id, LatePlate.user_id == User.id)
+        timed('late_plates_added', pg_insert(LatePlate).from_select(
+            ['meal_id', 'user_id', 'notes', 'pickup_time', 'status', 'request_date'],
+            db.select(
+                Meal.id, User.id,
+                WeeklyPreset.late_plate_notes, WeeklyPreset.late_plate_pickup_time,
+                literal('pending'), cast(literal(date.today()), Date),
+            ).where(WeeklyPreset.late_plate.is_(True), ~has_late_plate, in_window),
+        ).on_conflict_do_nothing())
+        if report['late_plates_added']:
+            mark_meals_dirty(meal_ids)
+        Meal.query.filter(Meal.id.in_(meal_ids)).update(
+            {'presets_applied_at': now}, synchronize_session=False)
+        deltas = Counter(added)
+        deltas.subtract(removed)
+        t = time.perf_counter()
+        shift_attendance(deltas)
+        report['timings_ms']['dish_rollups'] = round((time.perf_counter() - t) * 1000, 1)
+    db.session.commit()
+
+    if report['attendance_added'] or report['attendance_removed'] or report['late_plates_added']:
+        for chapter_id in {chapter_id for _, chapter_id in due}:
+            bump_chapter_version(chapter_id)
+    report['timings_ms']['total'] = round((time.perf_counter() - started) * 1000, 1)
+    return report
@@ -0,0 +1,283 @@
+"""
+The hot read queries — the ones a route runs on every page load or poll —
+shared by the routes and the query-plan check (query_plans.py).
+
+Each builder returns the query its route executes: a Query, a select(), or
+a Keyset for the paginated lists (helpers.keyset_page). @hot_query
+registers the builder with example arguments, so check_hot_query_plans()
+EXPLAINs exactly what the routes run rather than a copy of it. A query a
+route should never serve by reading a whole table belongs here, not inline
+in the route.
+"""
+from collections import namedtuple
+from sqlalchemy import func, literal, null, cast, or_, union_all, Integer, Boolean, Float, Text
+from sqlalchemy.orm import joinedload, contains_eager
+
+from database import db
+from models import (Meal, MealAttendance, LatePlate, Review, Recommendation, User, Dish,
+                    MealRatingStats, AnalyticsDay)
+
+# A paginated list: `query` is read in `columns` order, descending or not.
+# The columns must end in a unique one (usually the id).
+Keyset = namedtuple('Keyset', ['query', 'columns', 'descending'])
+
+# (name, builder, example): example maps a query_plans.Example to the
+# builder's arguments.
+HOT_QUERIES = []
+
+
+def hot_query(name, example):
+    """
+    Register the decorated builder with the plan check as `name`, called
+    with the arguments `example(e)` returns for the check's sample ids and
+    dates `e`. Stack it to check one builder under several arguments.
+    """
+    def register(builder):
+        HOT_QUERIES.append((name, builder, example))
+        return builder
+    return register
+
+
+def attendance_count():
+    """
+    Correlated attendance count for each Meal row of the enclosing query.
+    Evaluated per selected meal off ix_meal_attendance_meal_id, so the cost
+    tracks the meals being shown rather than the size of meal_attendance.
+    """
+    return db.select(func.count()).where(
+        MealAttendance.meal_id == Meal.id
+    ).correlate(Meal).scalar_subquery()
+
+
+# ---------------------------------------------------------------------------
+# Menu
+# ---------------------------------------------------------------------------
+
+@hot_query('today meals + attendance counts', lambda e: (e.chapter_id, e.today, e.tomorrow))
+@hot_query('menu: week meals + attendance counts', lambda e: (e.chapter_id, e.week_start, e.week_end))
+def meals_between(chapter_id, start, end):
+    """(Meal, attendance count) rows of the chapter's meals in [start, end), by date."""
+    return db.session.query(Meal, attendance_count()).filter(
+        Meal.chapter_id == chapter_id,
+        Meal.meal_date >= start,
+        Meal.meal_date < end,
+    ).order_by(Meal.meal_date)
+
+
+@hot_query('menu: user state overlay', lambda e: ([e.meal_id, e.meal_id + 1, e.meal_id + 2], e.user_id))
+def user_meal_state(meal_ids, user_id):
+    """
+    The user's own state for `meal_ids` — attendance, late plates and their
+    review — in one UNION ALL round trip as plain
+    (kind, meal_id, ref_id, flag, value, comment) tuples.
+
+    Every branch is filtered by meal_id, so the cost tracks the size of the
+    page being rendered rather than how much history the user has.
+    """
+    def _row(kind, meal_id, ref_id=None, flag=None, value=None, comment=None):
+        return (
+            literal(kind).label('kind'),
+            meal_id.label('meal_id'),
+            (ref_id if ref_id is not None else cast(null(), Integer)).label('ref_id'),
+            (flag if flag is not None else cast(null(), Boolean)).label('flag'),
+            (value if value is not None else cast(null(), Float)).label('value'),
+            (comment if comment is not None else cast(null(), Text)).label('comment'),
+        )
+
+    return union_all(
+        db.select(*_row('attendance', MealAttendance.meal_id, flag=MealAttendance.confirmed)).where(
+            MealAttendance.meal_id.in_(meal_ids), MealAttendance.user_id == user_id),
+        db.select(*_row('late_plate', LatePlate.meal_id, ref_id=LatePlate.id)).where(
+            LatePlate.meal_id.in_(meal_ids), LatePlate.user_id == user_id),
+        db.select(*_row('user_review', Review.meal_id, ref_id=Review.id,
+                        value=Review.rating, comment=Review.comment)).where(
+            Review.meal_id.in_(meal_ids), Review.user_id == user_id),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Past meals and search
+# ---------------------------------------------------------------------------
+
+@hot_query('past meals: dish rollups', lambda e: (e.chapter_id,))
+def served_dishes(chapter_id):
+    """The chapter's Dish rows that have been served at least once."""
+    return Dish.query.filter(Dish.chapter_id == chapter_id, Dish.times_served > 0)
+
+
+@hot_query('past meals: meals since week start', lambda e: (e.chapter_id, e.week_start))
+def meals_since(chapter_id, start):
+    """(dish_id, meal_type, attendance, n, mean, m2) of the chapter's meals from `start` on."""
+    return db.session.query(
+        Meal.dish_id, Meal.meal_type, attendance_count(),
+        MealRatingStats.n, MealRatingStats.mean, MealRatingStats.m2,
+    ).outerjoin(MealRatingStats, MealRatingStats.meal_id == Meal.id).filter(
+        Meal.meal_date >= start,
+        Meal.chapter_id == chapter_id,
+    )
+
+
+@hot_query('past meals: last served before week start', lambda e: ([e.meal_id, e.meal_id + 1], e.week_start))
+def last_served_before(dish_ids, before):
+    """(dish_id, latest meal_date before `before`) for each of `dish_ids`, one index probe each."""
+    return db.session.query(
+        Dish.id,
+        db.select(func.max(Meal.meal_date)).where(
+            Meal.dish_id == Dish.id, Meal.meal_date < before,
+        ).scalar_subquery(),
+    ).filter(Dish.id.in_(dish_ids))
+
+
+@hot_query('past meal occurrences', lambda e: (e.meal_id, e.week_start))
+def dish_occurrences(dish_id, before, meal_type=None):
+    """A dish's meals before `before`, newest first, optionally of one meal type."""
+    query = db.session.query(
+        Meal.id, Meal.meal_date, Meal.meal_type, attendance_count().label('attendance'),
+    ).filter(
+        Meal.dish_id == dish_id,
+        Meal.meal_date < before,
+    )
+    if meal_type:
+        query = query.filter(Meal.meal_type == meal_type)
+    return Keyset(query, (Meal.meal_date, Meal.id), descending=True)
+
+
+# Dish-name autocomplete: how many suggestions, how many recent dates each,
+# and how much a recently served dish is favoured over an equally close match.
+SEARCH_RESULTS = 10
+SEARCH_PAST_DATES = 5
+SEARCH_RECENCY_WEIGHT = 0.2
+SEARCH_RECENCY_DAYS = 30
+
+
+@hot_query('meal search: dish autocomplete', lambda e: (e.chapter_id, 'lasagne', e.now))
+def dish_search(chapter_id, q, now):
+    """
+    (Dish, recent meal dates) for the chapter's dishes whose name contains
+    `q` or is a close trigram match (word_similarity >=
+    pg_trgm.word_similarity_threshold, so "lasagne" finds "Lasagna"); both
+    are served by the trigram GIN index. Ranked by word similarity plus a
+    bonus that fades over SEARCH_RECENCY_DAYS since the dish was last served.
+    """
+    similarity = func.word_similarity(q, Dish.name)
+    days_since = func.greatest(func.extract('epoch', now - Dish.last_served_at) / 86400, 0)
+    rank = similarity + SEARCH_RECENCY_WEIGHT / (1 + days_since / SEARCH_RECENCY_DAYS)
+    recent_dates = func.array(
+        db.select(Meal.meal_date).where(Meal.dish_id == Dish.id)
+        .order_by(Meal.meal_date.desc()).limit(SEARCH_PAST_DATES).scalar_subquery()
+    )
+    return db.session.query(Dish, recent_dates).filter(
+        Dish.chapter_id == chapter_id,
+        Dish.times_served > 0,
+        or_(Dish.name.op('%>')(q), Dish.name.icontains(q, autoescape=True)),
+    ).order_by(func.coalesce(rank, similarity).desc(), Dish.name).limit(SEARCH_RESULTS)
+
+
+# ---------------------------------------------------------------------------
+# Per-meal lists
+# ---------------------------------------------------------------------------
+
+@hot_query('meal attendance roster', lambda e: (e.meal_id,))
+def meal_attendance(meal_id):
+    return db.session.query(MealAttendance).options(
+        joinedload(MealAttendance.user)
+    ).filter_by(meal_id=meal_id)
+
+
+@hot_query('meal late plates', lambda e: (e.meal_id,))
+def meal_late_plates(meal_id):
+    return db.session.query(LatePlate).options(
+        joinedload(LatePlate.user), joinedload(LatePlate.meal)
+    ).filter_by(meal_id=meal_id).order_by(LatePlate.request_time.desc())
+
+
+@hot_query('late plate request for a meal today', lambda e: (e.user_id, e.meal_id, e.today.date()))
+def late_plate_request(user_id, meal_id, request_date):
+    return LatePlate.query.filter_by(user_id=user_id, meal_id=meal_id, request_date=request_date)
+
+
+@hot_query('meal reviews', lambda e: (e.meal_id,))
+def meal_reviews(meal_id):
+    return Review.query.filter_by(meal_id=meal_id).order_by(Review.created_at.desc())
+
+
+# ---------------------------------------------------------------------------
+# Admin
+# ---------------------------------------------------------------------------
+
+@hot_query('admin: late plates from today', lambda e: (e.chapter_id, e.today))
+def late_plates_from(chapter_id, start):
+    """The chapter's late plates for meals from `start` on, by meal date then request time."""
+    return db.session.query(LatePlate).options(
+        joinedload(LatePlate.user), joinedload(LatePlate.meal)
+    ).join(Meal, LatePlate.meal_id == Meal.id).filter(
+        Meal.meal_date >= start,
+        Meal.chapter_id == chapter_id,
+    ).order_by(Meal.meal_date.asc(), LatePlate.request_time.asc())
+
+
+@hot_query('admin: pending late plate count', lambda e: (e.chapter_id, e.now))
+def pending_late_plate_count(chapter_id, now):
+    """Pending late plates for the chapter's meals that haven't started yet (polled for the badge)."""
+    return db.session.query(func.count(LatePlate.id)).join(
+        Meal, LatePlate.meal_id == Meal.id
+    ).filter(
+        LatePlate.status == 'pending',
+        Meal.meal_date >= now,
+        Meal.chapter_id == chapter_id,
+    )
+
+
+@hot_query('admin: users page', lambda e: (e.chapter_id,))
+def chapter_users(chapter_id):
+    return Keyset(User.query.filter_by(chapter_id=chapter_id), (User.name, User.id), descending=False)
+
+
+@hot_query('admin: attendance log page', lambda e: (e.chapter_id,))
+def attendance_log(chapter_id):
+    return Keyset(db.session.query(MealAttendance).join(
+        Meal, MealAttendance.meal_id == Meal.id
+    ).options(
+        contains_eager(MealAttendance.meal), joinedload(MealAttendance.user)
+    ).filter(
+        Meal.chapter_id == chapter_id
+    ), (MealAttendance.attendance_time, MealAttendance.id), descending=True)
+
+
+@hot_query('admin: review log page', lambda e: (e.chapter_id,))
+def review_log(chapter_id):
+    return Keyset(db.session.query(Review).join(
+        Meal, Review.meal_id == Meal.id
+    ).options(
+        contains_eager(Review.meal), joinedload(Review.user)
+    ).filter(
+        Meal.chapter_id == chapter_id
+    ), (Review.created_at, Review.id), descending=True)
+
+
+@hot_query('admin: recommendations page', lambda e: (e.chapter_id,))
+def recommendation_log(chapter_id):
+    return Keyset(db.session.query(Recommendation).join(
+        User, Recommendation.user_id == User.id
+    ).options(contains_eager(Recommendation.user)).filter(
+        User.chapter_id == chapter_id
+    ), (Recommendation.created_at, Recommendation.id), descending=True)
+
+
+# ---------------------------------------------------------------------------
+# Analytics snapshot refresh (every ANALYTICS_REFRESH_INTERVAL)
+# ---------------------------------------------------------------------------
+
+@hot_query('analytics refresh: chapters with dirty days', lambda e: ())
+def dirty_analytics_chapters():
+    return db.session.query(AnalyticsDay.chapter_id).filter(
+        AnalyticsDay.marks > AnalyticsDay.built_marks).distinct()
+
+
+@hot_query('analytics refresh: dirty days', lambda e: (e.chapter_id,))
+def marked_analytics_days(key, dirty_only=True):
+    """(day, marks) of the chapter's day rollups; only the dirty ones unless dirty_only is off."""
+    query = db.session.query(AnalyticsDay.day, AnalyticsDay.marks).filter(AnalyticsDay.chapter_id == key)
+    if dirty_only:
+        query = query.filter(AnalyticsDay.marks > AnalyticsDay.built_marks)
+    return query
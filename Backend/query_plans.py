@@ -0,0 +1,119 @@
+"""
+Query-plan regression check for the hot read paths.
+
+The queries are the routes' own, registered in queries.py with @hot_query.
+check_hot_query_plans() EXPLAINs each with example arguments and
+enable_seqscan off, so even on a small or freshly seeded database the
+planner reports whether an index *can* serve the query, and flags any plan
+that still reads a whole table: a Seq Scan, or an index scan whose
+condition doesn't constrain the index's leading column (a full walk of an
+unrelated index, which is how the planner dodges a disabled seq scan).
+Partial indexes are exempt — their predicate is the bound. A paginated
+list is checked as a page after a cursor. `flask explain-hot-queries` and
+tests/test_query_plans.py run it and fail on a regression, so a dropped or
+mis-ordered index, or a route query that stops using one, fails CI.
+"""
+import json
+import re
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Query
+
+import queries
+from database import db
+from helpers import day_range, week_range, keyset_seek, PAGE_SIZE_DEFAULT
+
+# The sample ids and dates the registered examples draw their arguments from.
+Example = namedtuple('Example', ['chapter_id', 'meal_id', 'user_id', 'now', 'today', 'tomorrow',
+                                 'week_start', 'week_end'])
+
+
+def _example(chapter_id, meal_id, user_id):
+    now = datetime.now()
+    return Example(chapter_id, meal_id, user_id, now, *day_range(now), *week_range(now))
+
+
+def _cursor_value(column, e):
+    """A plausible cursor value for a keyset column, by its Python type."""
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return e.now
+    if python_type is int:
+        return e.meal_id
+    return 'm'
+
+
+def _statement(built, e):
+    """The statement a route executes for `built`: a page after a cursor for a Keyset."""
+    if isinstance(built, queries.Keyset):
+        after = [_cursor_value(c, e) for c in built.columns]
+        built = keyset_seek(built, after).limit(PAGE_SIZE_DEFAULT + 1)
+    return built.statement if isinstance(built, Query) else built
+
+
+def _plan_nodes(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from _plan_nodes(child)
+
+
+_INDEX_SCANS = ('Index Scan', 'Index Only Scan', 'Bitmap Index Scan')
+
+
+def _index_catalog(conn):
+    """{index_name: (leading_column, is_partial)} for every index in the schema."""
+    rows = conn.execute(text(
+        'SELECT c.relname, a.attname, i.indpred IS NOT NULL '
+        'FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid '
+        'JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = i.indkey[0]'
+    ))
+    return {name: (column, partial) for name, column, partial in rows}
+
+
+def _full_scans(nodes, catalog):
+    full = set()
+    for n in nodes:
+        if n['Node Type'] == 'Seq Scan':
+            full.add(n['Relation Name'])
+        elif n['Node Type'] in _INDEX_SCANS:
+            leading, partial = catalog.get(n['Index Name'], (None, False))
+            # "(col = ...)", a keyset row comparison "(ROW(col, ...) < ...)", or a
+            # trigram / ILIKE match "((col)::text %> ...)".
+            col = re.escape(leading or '')
+            bounded = leading and re.search(
+                rf'\((\s*{col}\s*(=|<|>)|ROW\({col},|\({col}\)::\w+ (%|<%|%>|~~\*?) )', n.get('Index Cond', ''))
+            if not (bounded or partial):
+                full.add(n['Index Name'])
+    return sorted(full)
+
+
+def check_hot_query_plans(chapter_id=1, meal_id=1, user_id=1):
+    """
+    EXPLAIN every hot query. Returns a list of dicts with name, ok,
+    full_scans (tables or indexes read end to end) and indexes (indexes used).
+    """
+    dialect = postgresql.dialect()
+    results = []
+    conn = db.session.connection()
+    catalog = _index_catalog(conn)
+    conn.execute(text('SET LOCAL enable_seqscan = off'))
+    try:
+        e = _example(chapter_id, meal_id, user_id)
+        for name, builder, example in queries.HOT_QUERIES:
+            stmt = _statement(builder(*example(e)), e)
+            compiled = stmt.compile(dialect=dialect, compile_kwargs={'render_postcompile': True})
+            raw = conn.exec_driver_sql(f'EXPLAIN (FORMAT JSON) {compiled}', compiled.params).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]['Plan']
+            nodes = list(_plan_nodes(plan))
+            full_scans = _full_scans(nodes, catalog)
+            results.append({
+                'name': name,
+                'ok': not full_scans,
+                'full_scans': full_scans,
+                'indexes': sorted({n['Index Name'] for n in nodes if 'Index Name' in n}),
+            })
+    finally:
+        db.session.rollback()
+    return results
@@ -0,0 +1,139 @@
+"""
+Two-tier cache for the chapter menu endpoints (/api/menu, /api/today-meals).
+
+The expensive part of those responses — meal rows, chapter-wide attendance
+counts and rating stats — is identical for every member of a chapter, so it
+is built once and kept in a per-process TTLCache keyed by
+(chapter_id, scope, version). Only the cheap per-user overlay (is_attending,
+user_review, has_late_plate) is computed per request on top of it.
+
+Invalidation is by version rather than by deleting entries: any successful
+write in a registered blueprint bumps its chapter's version after the view
+has committed, so the next read misses and rebuilds, and the old entries age
+out of the LRU. With the default 'db' version store the counter lives in
+chapter_versions, so a write handled by one gunicorn worker re-keys every
+worker's cache; 'local' keeps it in-process (single-worker / dev setups).
+"""
+import os
+import threading
+from flask import g, request
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import ChapterVersion
+from cache import TTLCache
+
+RESPONSE_CACHE_VERSIONS = os.getenv('RESPONSE_CACHE_VERSIONS', 'db')
+
+_payload_cache = TTLCache(
+    maxsize=int(os.getenv('RESPONSE_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('RESPONSE_CACHE_TTL', 300)),
+)
+
+
+def _chapter_key(chapter_id):
+    # Users and meals without a chapter share one bucket.
+    return chapter_id or 0
+
+
+class LocalVersionStore:
+    """Per-process counters. Only correct when a single process serves requests."""
+    name = 'local'
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, chapter_id):
+        return self._versions.get(_chapter_key(chapter_id), 0)
+
+    def bump(self, chapter_id):
+        with self._lock:
+            key = _chapter_key(chapter_id)
+            self._versions[key] = self._versions.get(key, 0) + 1
+
+    def bump_all(self):
+        with self._lock:
+            for key in self._versions:
+                self._versions[key] += 1
+            self._versions.setdefault(0, 0)
+
+
+class DatabaseVersionStore:
+    """Counters in the chapter_versions table, shared by every worker."""
+    name = 'db'
+
+    def get(self, chapter_id):
+        version = db.session.query(ChapterVersion.version).filter_by(
+            chapter_id=_chapter_key(chapter_id)).scalar()
+        return version or 0
+
+    def bump(self, chapter_id):
+        stmt = pg_insert(ChapterVersion).values(chapter_id=_chapter_key(chapter_id), version=1)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=[ChapterVersion.chapter_id],
+            set_={'version': ChapterVersion.version + 1},
+        ))
+        db.session.commit()
+
+    def bump_all(self):
+        db.session.execute(text('UPDATE chapter_versions SET version = version + 1'))
+        db.session.commit()
+
+
+versions = LocalVersionStore() if RESPONSE_CACHE_VERSIONS == 'local' else DatabaseVersionStore()
+
+
+def chapter_version(chapter_id):
+    return versions.get(chapter_id)
+
+
+def bump_chapter_version(chapter_id):
+    versions.bump(chapter_id)
+
+
+def bump_all_chapter_versions():
+    """For out-of-band changes that may touch any chapter (CLI rebuilds)."""
+    versions.bump_all()
+
+
+def cached_chapter_payload(chapter_id, scope, build):
+    """
+    Return the chapter-wide payload for `scope` (e.g. ('week', date)),
+    calling `build()` only when this process has nothing cached for the
+    chapter's current version. The result is shared between requests and
+    must not be mutated.
+    """
+    key = (_chapter_key(chapter_id), scope, versions.get(chapter_id))
+    payload = _payload_cache.get(key)
+    if payload is None:
+        payload = build()
+        _payload_cache.set(key, payload)
+    return payload
+
+
+def invalidate_chapter_on_write(blueprint):
+    """
+    Bump the acting user's chapter version after every successful write
+    handled by `blueprint`. Must be called before the blueprint is
+    registered on the app.
+    """
+    @blueprint.after_request
+    def _bump_chapter_version(response):
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return response
+        user = getattr(g, 'current_user', None)
+        if user is None:
+            return response
+        try:
+            bump_chapter_version(user.chapter_id)
+        except Exception as e:
+            db.session.rollback()
+            print(f"Error bumping chapter version: {e}")
+        return response
+    return blueprint
+
+
+def response_cache_stats():
+    return {'versions': versions.name, **_payload_cache.stats()}
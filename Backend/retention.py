@@ -0,0 +1,119 @@
+"""
+Late plate retention.
+
+Late plates are only live until their meal's day has passed. The nightly job
+moves expired rows into late_plate_history and, once the archive is older than
+its own retention window, purges it. Both run in chunks of RETENTION_BATCH rows,
+each in its own short transaction. That way the sweep never holds locks on
+(or writes WAL for) the whole backlog at once, and an interrupted run simply
+resumes where it stopped.
+
+A chunk is a single statement: a CTE DELETEs up to RETENTION_BATCH expired
+late_plates (SKIP LOCKED, so a row a member is editing is left for the next
+run) RETURNING them, and the INSERT into late_plate_history consumes that
+output. A row is never deleted without being archived. Expiry goes by the
+meal's date, not the request's: a plate requested today for next week's
+meal, by a member or a weekly preset, stays live until that meal is past.
+
+LATE_PLATE_RETENTION_DAYS   days a late plate stays live after its meal's
+                            day (0: archived the day after).
+LATE_PLATE_HISTORY_DAYS     days archived rows are kept (0: forever).
+RETENTION_BATCH             rows per chunk.
+"""
+import os
+import time
+from datetime import date, timedelta
+from sqlalchemy import text
+
+from database import db
+
+LATE_PLATE_RETENTION_DAYS = int(os.getenv('LATE_PLATE_RETENTION_DAYS', 0))
+LATE_PLATE_HISTORY_DAYS = int(os.getenv('LATE_PLATE_HISTORY_DAYS', 0))
+RETENTION_BATCH = int(os.getenv('RETENTION_BATCH', 5000))
+
+_ARCHIVE_CHUNK = text("""
+    WITH moved AS (
+        DELETE FROM late_plates
+        WHERE id = ANY(ARRAY(
+            SELECT late_plates.id FROM late_plates JOIN meals ON meals.id = late_plates.meal_id
+            WHERE late_plates.id > :after AND meals.meal_date < :cutoff
+            ORDER BY late_plates.id
+            LIMIT :batch
+            FOR UPDATE OF late_plates SKIP LOCKED
+        ))
+        RETURNING id, meal_id, user_id, request_time, request_date, status, pickup_time
+    ), archived AS (
+        INSERT INTO late_plate_history
+            (id, meal_id, user_id, chapter_id, meal_date, request_time, request_date, status, pickup_time, archived_at)
+        SELECT moved.id, moved.meal_id, moved.user_id, meals.chapter_id, meals.meal_date,
+               moved.request_time, moved.request_date, moved.status, moved.pickup_time, now()
+        FROM moved JOIN meals ON meals.id = moved.meal_id
+        ON CONFLICT (id) DO NOTHING
+    )
+    SELECT count(*), max(id) FROM moved
+""")
+
+_PURGE_CHUNK = text("""
+    WITH purged AS (
+        DELETE FROM late_plate_history
+        WHERE id = ANY(ARRAY(
+            SELECT id FROM late_plate_history
+            WHERE id > :after AND request_date < :cutoff
+            ORDER BY id
+            LIMIT :batch
+            FOR UPDATE SKIP LOCKED
+        ))
+        RETURNING id
+    )
+    SELECT count(*), max(id) FROM purged
+""")
+
+
+def _in_chunks(stmt, cutoff, batch, label):
+    """
+    Run `stmt` one committed chunk at a time until a chunk comes back short.
+    Chunks walk the primary key upwards from the last id handled, so each
+    one starts past the dead tuples the previous chunks left behind instead
+    of rescanning them. Returns (rows, chunks).
+    """
+    total = chunks = after = 0
+    while True:
+        moved, last_id = db.session.execute(stmt, {'cutoff': cutoff, 'batch': batch, 'after': after}).one()
+        db.session.commit()
+        total += moved
+        chunks += 1
+        if moved:
+            print(f"[Retention] {label}: chunk {chunks}, {total} row(s) so far.")
+        if moved < batch:
+            return total, chunks
+        after = last_id
+
+
+def archive_late_plates(today=None, batch=RETENTION_BATCH):
+    """
+    Move expired late plates into late_plate_history, then purge history past
+    LATE_PLATE_HISTORY_DAYS. Returns a report dict: archived, purged, chunks,
+    the cutoffs used and timings_ms per phase.
+    """
+    today = today or date.today()
+    archive_cutoff = today - timedelta(days=LATE_PLATE_RETENTION_DAYS)
+    history_cutoff = today - timedelta(days=LATE_PLATE_HISTORY_DAYS) if LATE_PLATE_HISTORY_DAYS else None
+
+    t0 = time.perf_counter()
+    archived, archive_chunks = _in_chunks(_ARCHIVE_CHUNK, archive_cutoff, batch, 'archived')
+    t1 = time.perf_counter()
+    purged, purge_chunks = (_in_chunks(_PURGE_CHUNK, history_cutoff, batch, 'purged from history')
+                            if history_cutoff else (0, 0))
+    t2 = time.perf_counter()
+
+    return {
+        'archived': archived,
+        'purged': purged,
+        'chunks': archive_chunks + purge_chunks,
+        'archive_cutoff': archive_cutoff.isoformat(),
+        'history_cutoff': history_cutoff.isoformat() if history_cutoff else None,
+        'timings_ms': {
+            'archive': round((t1 - t0) * 1000, 1),
+            'purge': round((t2 - t1) * 1000, 1),
+        },
+    }
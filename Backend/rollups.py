@@ -0,0 +1,307 @@
+"""
+Incrementally maintained rollups.
+
+meal_rating_stats holds the Welford moments (n, mean, M2) of each meal's
+review ratings. dishes holds, per dish, how many times and when it was
+served (in total and per meal type), the attendance summed over its meals
+and the moments across all of its meals' ratings. Read paths serve mean /
+std / sharpe_analog, times served and average attendance from these rows
+without rescanning meals, meal_attendance or reviews.
+
+Every write that creates, re-files or deletes a meal, adds or removes
+attendance, or adds, changes or removes a rating calls into this module
+before committing, so the rollups move in the same transaction as the rows
+themselves. Rows are locked FOR UPDATE (meal row first, then dish row;
+several dishes in id order) so concurrent writers serialise instead of
+losing an update. Each hook also marks the meal's day(s) dirty for the
+admin dashboard snapshot (analytics_snapshot.py); day rows are locked last.
+"""
+from sqlalchemy import func, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from database import db
+from models import Meal, Review, MealAttendance, MealRatingStats, Dish
+from analytics import WelfordAccumulator
+from analytics_snapshot import mark_days_dirty, mark_meals_dirty
+
+# Moments are floats; a rebuild only counts a row as drifted beyond these.
+_MEAN_TOLERANCE = 1e-9
+_M2_TOLERANCE   = 1e-6
+
+
+def _dish_filter(chapter_id, name):
+    chapter_clause = Dish.chapter_id.is_(None) if chapter_id is None else Dish.chapter_id == chapter_id
+    return chapter_clause, Dish.name == name
+
+
+def _locked_meal_stats(meal_id):
+    db.session.execute(pg_insert(MealRatingStats).values(
+        meal_id=meal_id, n=0, mean=0.0, m2=0.0,
+    ).on_conflict_do_nothing())
+    return MealRatingStats.query.filter_by(meal_id=meal_id).with_for_update().populate_existing().one()
+
+
+def _locked_dish(dish_id):
+    return Dish.query.filter_by(id=dish_id).with_for_update().populate_existing().one()
+
+
+def _locked_dish_named(chapter_id, name):
+    """The chapter's dish called `name`, locked; created (empty) if it doesn't exist yet."""
+    query = Dish.query.filter(*_dish_filter(chapter_id, name)).with_for_update().populate_existing()
+    row = query.first()
+    if row is None:
+        db.session.execute(pg_insert(Dish).values(
+            chapter_id=chapter_id, name=name, times_served=0, served_by_type={},
+            attendance_total=0, n=0, mean=0.0, m2=0.0,
+        ).on_conflict_do_nothing())
+        row = query.first()
+    return row
+
+
+def _accumulator(row):
+    return WelfordAccumulator.from_moments(row.n, row.mean, row.m2)
+
+
+def _store(row, acc):
+    row.n, row.mean, row.m2 = acc.n, acc.mean, acc.M2
+
+
+def _apply(meal, change):
+    """Run `change(acc)` against the meal's rating rollup and its dish's."""
+    for row in (_locked_meal_stats(meal.id), _locked_dish(meal.dish_id)):
+        acc = _accumulator(row)
+        change(acc)
+        _store(row, acc)
+    mark_days_dirty([(meal.chapter_id, meal.meal_date)])
+
+
+# ---------------------------------------------------------------------------
+# A meal's share of its dish
+# ---------------------------------------------------------------------------
+
+def _contribution(meal):
+    """(attendance, rating accumulator) the meal adds to its dish."""
+    attendance = db.session.query(func.count(MealAttendance.id)).filter(
+        MealAttendance.meal_id == meal.id).scalar()
+    return attendance, _accumulator(_locked_meal_stats(meal.id))
+
+
+def _give(dish, meal, attendance=0, ratings=None):
+    dish.times_served += 1
+    dish.served_by_type = {**dish.served_by_type, meal.meal_type: dish.served_by_type.get(meal.meal_type, 0) + 1}
+    dish.attendance_total += attendance
+    if dish.last_served_at is None or meal.meal_date > dish.last_served_at:
+        dish.last_served_at = meal.meal_date
+    if meal.description:
+        dish.description = meal.description
+    if meal.image_url:
+        dish.image_url = meal.image_url
+    if ratings is not None and ratings.n:
+        acc = _accumulator(dish)
+        acc.merge(ratings)
+        _store(dish, acc)
+
+
+def _take(dish, meal_id, meal_type, meal_date, attendance, ratings):
+    dish.times_served -= 1
+    by_type = dict(dish.served_by_type)
+    by_type[meal_type] = by_type.get(meal_type, 0) - 1
+    dish.served_by_type = {t: c for t, c in by_type.items() if c > 0}
+    dish.attendance_total -= attendance
+    if dish.last_served_at == meal_date:
+        dish.last_served_at = db.session.query(func.max(Meal.meal_date)).filter(
+            Meal.dish_id == dish.id, Meal.id != meal_id).scalar()
+    if ratings.n:
+        acc = _accumulator(dish)
+        acc.unmerge(ratings)
+        _store(dish, acc)
+
+
+# ---------------------------------------------------------------------------
+# Write-path hooks
+# ---------------------------------------------------------------------------
+
+def record_meal(meal):
+    """
+    File a new meal under its chapter's dish of the same name (creating the
+    dish on first use) and set meal.dish_id. Call before the meal is added
+    to the session: its dish_id is required.
+    """
+    dish = _locked_dish_named(meal.chapter_id, meal.dish_name)
+    meal.dish_id = dish.id
+    _give(dish, meal)
+    mark_days_dirty([(meal.chapter_id, meal.meal_date)])
+
+
+def retract_meal(meal):
+    """Take a meal's occurrence, attendance and ratings out of its dish before
+    the meal is deleted. Its own stats row goes with it via ON DELETE CASCADE."""
+    attendance, ratings = _contribution(meal)
+    _take(_locked_dish(meal.dish_id), meal.id, meal.meal_type, meal.meal_date, attendance, ratings)
+    mark_days_dirty([(meal.chapter_id, meal.meal_date)])
+
+
+def move_meal(meal, old_dish_name, old_meal_type, old_meal_date):
+    """Re-file a meal after its dish name, meal type or date changed from the old values."""
+    if (meal.dish_name, meal.meal_type, meal.meal_date) == (old_dish_name, old_meal_type, old_meal_date):
+        return
+    attendance, ratings = _contribution(meal)
+    old_dish = _locked_dish(meal.dish_id)
+    _take(old_dish, meal.id, old_meal_type, old_meal_date, attendance, ratings)
+    new_dish = old_dish if meal.dish_name == old_dish_name else _locked_dish_named(meal.chapter_id, meal.dish_name)
+    meal.dish_id = new_dish.id
+    _give(new_dish, meal, attendance, ratings)
+    mark_days_dirty([(meal.chapter_id, old_meal_date), (meal.chapter_id, meal.meal_date)])
+
+
+_SHIFT_ATTENDANCE = text("""
+    WITH delta AS (
+        SELECT meals.dish_id, sum(x.delta) AS delta
+        FROM unnest(CAST(:meal_ids AS integer[]), CAST(:deltas AS integer[])) AS x(meal_id, delta)
+        JOIN meals ON meals.id = x.meal_id
+        GROUP BY meals.dish_id
+    ), locked AS (
+        SELECT dishes.id FROM dishes JOIN delta ON delta.dish_id = dishes.id
+        ORDER BY dishes.id
+        FOR UPDATE OF dishes
+    )
+    UPDATE dishes SET attendance_total = dishes.attendance_total + delta.delta
+    FROM delta
+    WHERE dishes.id = delta.dish_id AND dishes.id IN (SELECT id FROM locked)
+""")
+
+
+def shift_attendance(deltas):
+    """
+    Apply attendance changes to the dish rollups: `deltas` maps meal_id to
+    the number of attendance rows added (negative: removed). One statement
+    however many meals; dishes are locked in id order.
+    """
+    deltas = {meal_id: d for meal_id, d in deltas.items() if d}
+    if deltas:
+        db.session.execute(_SHIFT_ATTENDANCE, {'meal_ids': list(deltas), 'deltas': list(deltas.values())})
+        mark_meals_dirty(deltas)
+
+
+def retract_user_ratings(user_id):
+    """Remove every rating a user left, ahead of their reviews being cascade-deleted."""
+    rows = db.session.query(Meal, Review.rating).join(
+        Review, Review.meal_id == Meal.id
+    ).filter(Review.user_id == user_id).order_by(Meal.id).all()
+    for meal, rating in rows:
+        retract_rating(meal, rating)
+
+
+def retract_user_attendance(user_id):
+    """Remove a user's attendance from the dish rollups, ahead of it being cascade-deleted."""
+    shift_attendance({meal_id: -1 for (meal_id,) in db.session.query(MealAttendance.meal_id).filter(
+        MealAttendance.user_id == user_id)})
+
+
+def record_rating(meal, rating):
+    _apply(meal, lambda acc: acc.update(rating))
+
+
+def retract_rating(meal, rating):
+    _apply(meal, lambda acc: acc.remove(rating))
+
+
+def replace_rating(meal, old_rating, new_rating):
+    if old_rating == new_rating:
+        return
+
+    def change(acc):
+        acc.remove(old_rating)
+        acc.update(new_rating)
+    _apply(meal, change)
+
+
+# ---------------------------------------------------------------------------
+# Rebuild / verification
+# ---------------------------------------------------------------------------
+
+def _fresh_moments(*group_by):
+    n = func.count(Review.id)
+    rows = db.session.query(
+        *group_by, n, func.avg(Review.rating),
+        func.coalesce(func.var_samp(Review.rating), 0.0) * (n - 1),
+    ).join(Meal, Review.meal_id == Meal.id).group_by(*group_by).all()
+    return {tuple(r[:-3]): (r[-3], float(r[-2]), float(r[-1])) for r in rows}
+
+
+def _fresh_dishes():
+    """Every dish's rollup recomputed from meals, meal_attendance and reviews, keyed by dish id."""
+    fresh = {dish_id: {'times_served': 0, 'served_by_type': {}, 'attendance_total': 0, 'last_served_at': None,
+                       'n': 0, 'mean': 0.0, 'm2': 0.0}
+             for (dish_id,) in db.session.query(Dish.id)}
+    for dish_id, meal_type, served, last in db.session.query(
+        Meal.dish_id, Meal.meal_type, func.count(Meal.id), func.max(Meal.meal_date),
+    ).group_by(Meal.dish_id, Meal.meal_type):
+        row = fresh[dish_id]
+        row['times_served'] += served
+        row['served_by_type'][meal_type] = served
+        row['last_served_at'] = max(filter(None, (row['last_served_at'], last)))
+    for dish_id, attendance in db.session.query(Meal.dish_id, func.count(MealAttendance.id)).join(
+        MealAttendance, MealAttendance.meal_id == Meal.id
+    ).group_by(Meal.dish_id):
+        fresh[dish_id]['attendance_total'] = attendance
+    for (dish_id,), (n, mean, m2) in _fresh_moments(Meal.dish_id).items():
+        fresh[dish_id].update(n=n, mean=mean, m2=m2)
+    return fresh
+
+
+def _drifted(stored, fresh):
+    s_n, s_mean, s_m2 = stored if stored else (0, 0.0, 0.0)
+    f_n, f_mean, f_m2 = fresh if fresh else (0, 0.0, 0.0)
+    return (s_n != f_n
+            or abs(s_mean - f_mean) > _MEAN_TOLERANCE
+            or abs(s_m2 - f_m2) > _M2_TOLERANCE)
+
+
+def _dish_drifted(dish, fresh):
+    return ((dish.times_served, dish.served_by_type, dish.attendance_total, dish.last_served_at)
+            != (fresh['times_served'], fresh['served_by_type'], fresh['attendance_total'], fresh['last_served_at'])
+            or _drifted((dish.n, dish.mean, dish.m2), (fresh['n'], fresh['mean'], fresh['m2'])))
+
+
+def rebuild_rollups(apply=True):
+    """
+    Recompute every meal rating rollup and every dish rollup from the
+    underlying rows and compare them with what is stored. With apply=True
+    the stored rollups are replaced by the fresh ones. Both tables are
+    locked for the duration so a write committed mid-rebuild can't be
+    counted twice or dropped.
+
+    Returns a report dict with the number of rows checked and drifted.
+    """
+    if apply:
+        db.session.execute(text('LOCK TABLE meal_rating_stats, dishes IN EXCLUSIVE MODE'))
+
+    fresh_meals  = _fresh_moments(Meal.id)
+    fresh_dishes = _fresh_dishes()
+
+    stored_meals = {
+        (r.meal_id,): (r.n, r.mean, r.m2) for r in MealRatingStats.query.all()
+    }
+    meal_drift = [k[0] for k in stored_meals.keys() | fresh_meals.keys()
+                  if _drifted(stored_meals.get(k), fresh_meals.get(k))]
+    dish_drift = [dish.id for dish in Dish.query.all() if _dish_drifted(dish, fresh_dishes[dish.id])]
+
+    if apply:
+        MealRatingStats.query.delete()
+        if fresh_meals:
+            db.session.execute(pg_insert(MealRatingStats), [
+                {'meal_id': meal_id, 'n': n, 'mean': mean, 'm2': m2}
+                for (meal_id,), (n, mean, m2) in fresh_meals.items()
+            ])
+        if dish_drift:
+            db.session.execute(update(Dish), [{'id': dish_id, **fresh_dishes[dish_id]} for dish_id in dish_drift])
+        db.session.commit()
+
+    return {
+        'meals_checked':  len(stored_meals.keys() | fresh_meals.keys()),
+        'meals_drifted':  sorted(meal_drift),
+        'dishes_checked': len(fresh_dishes),
+        'dishes_drifted': sorted(dish_drift),
+        'applied':        apply,
+    }
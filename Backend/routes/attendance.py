@@ -4,7 +4,9 @@ from sqlalchemy.orm import joinedload
 
 from database import db
 from models import Meal, MealAttendance, User
-from helpers import jwt_required, admin_required
+from helpers import jwt_required, admin_required, keyset_page, InvalidCursor
+from rollups import shift_attendance
+from queries import meal_attendance, attendance_log
 
 attendance_bp = Blueprint('attendance', __name__)
 
@@ -21,10 +23,12 @@ def mark_attendance(meal_id):
         existing = MealAttendance.query.filter_by(user_id=user_id, meal_id=meal_id).first()
         if existing:
             db.session.delete(existing)
+            shift_attendance({meal_id: -1})
             db.session.commit()
             return jsonify({'message': 'Attendance removed.', 'is_attending': False}), 200
         else:
             db.session.add(MealAttendance(meal_id=meal_id, user_id=user_id))
+            shift_attendance({meal_id: 1})
             db.session.commit()
             return jsonify({'message': 'Attendance marked successfully.', 'is_attending': True}), 201
     except Exception as e:
@@ -72,9 +76,7 @@ def get_meal_attendance(meal_id):
         if not meal:
             return jsonify({'error': 'Meal not found.'}), 404
 
-        records = db.session.query(MealAttendance).options(
-            joinedload(MealAttendance.user)
-        ).filter_by(meal_id=meal_id).all()
+        records = meal_attendance(meal_id).all()
 
         return jsonify({
             'meal_id': meal_id,
@@ -95,18 +97,16 @@ def get_meal_attendance(meal_id):
 @admin_required
 def get_all_attendance():
     try:
-        records = db.session.query(MealAttendance).options(
-            joinedload(MealAttendance.meal), joinedload(MealAttendance.user)
-        ).join(Meal, MealAttendance.meal_id == Meal.id).filter(
-            Meal.chapter_id == g.current_user.chapter_id
-        ).order_by(MealAttendance.attendance_time.desc()).all()
+        records, next_cursor = keyset_page(attendance_log(g.current_user.chapter_id))
 
         return jsonify({'attendance': [{
             'id': r.id,
             'attended_at': r.attendance_time.isoformat(),
             'meal': {'id': r.meal.id, 'dish_name': r.meal.dish_name, 'meal_date': r.meal.meal_date.isoformat()},
             'user': {'id': r.user.id, 'name': r.user.name},
-        } for r in records]}), 200
+        } for r in records], 'next_cursor': next_cursor}), 200
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
     except Exception as e:
         print(f"Error fetching all attendance: {e}")
         return jsonify({'error': 'Failed to fetch attendance.'}), 500
@@ -5,10 +5,10 @@ from datetime import datetime, timedelta, timezone
 from flask import Blueprint, request, jsonify, g
 
 from database import db
-from extensions import bcrypt
 from models import User, Chapter, PendingRegistration
-from helpers import jwt_required
-from email_utils import send_verification_email, send_reset_email
+from helpers import jwt_required, invalidate_principal
+from email_utils import queue_verification_email, queue_reset_email
+from passwords import hash_password, check_password, needs_rehash, PasswordHasherBusy, busy_response
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -42,7 +42,7 @@ def register_user():
         if User.query.filter_by(email=email).first():
             return jsonify({'error': 'Email already exists.'}), 400
 
-        hashed_password = bcrypt.generate_password_hash(password).decode('utf-8')
+        hashed_password = hash_password(password)
         token = secrets.token_urlsafe(32)
 
         existing = PendingRegistration.query.filter_by(email=email).first()
@@ -60,14 +60,13 @@ def register_user():
             token_expires=datetime.now(timezone.utc) + timedelta(hours=24),
         )
         db.session.add(pending)
+        queue_verification_email(email, token)
         db.session.commit()
 
-        try:
-            send_verification_email(email, token)
-        except Exception as mail_err:
-            print(f"Warning: could not send verification email: {mail_err}")
-
         return jsonify({'message': 'Check your email to verify your account before logging in.'}), 201
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"Error registering user: {e}")
@@ -84,8 +83,22 @@ def login_user():
         return jsonify({'error': 'Email and password are required.'}), 400
 
     user = User.query.filter_by(email=email).first()
-    if not user or not bcrypt.check_password_hash(user.password_hash, password):
-        return jsonify({'error': 'Invalid email or password.'}), 401
+    try:
+        if not user or not check_password(user.password_hash, password):
+            return jsonify({'error': 'Invalid email or password.'}), 401
+    except PasswordHasherBusy:
+        return busy_response()
+
+    # Upgrade hashes made at a different BCRYPT_LOG_ROUNDS while we have the
+    # plaintext. Best effort: a busy pool or failed write just waits for the
+    # next login.
+    if needs_rehash(user.password_hash):
+        try:
+            user.password_hash = hash_password(password)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"Could not rehash password for user {user.id}: {e}")
 
     payload = {'user_id': user.id, 'exp': datetime.now() + timedelta(hours=24)}
     token = jwt.encode(payload, os.getenv('JWT_SECRET'), algorithm='HS256')
@@ -100,7 +113,9 @@ def login_user():
 @auth_bp.route('/api/me', methods=['GET'])
 @jwt_required
 def get_me():
-    user = g.current_user
+    user = User.query.get(g.current_user.id)
+    if not user:   # deleted since its principal was cached
+        return jsonify({'message': 'User not found!'}), 401
     return jsonify({
         'id': user.id, 'email': user.email, 'name': user.name,
         'first_name': user.first_name, 'last_name': user.last_name,
@@ -113,7 +128,9 @@ def get_me():
 def update_me():
     try:
         data = request.get_json(silent=True)
-        user = g.current_user
+        user = User.query.get(g.current_user.id)
+        if not user:
+            return jsonify({'message': 'User not found!'}), 401
 
         new_first_name = (data.get('first_name') or '').strip()
         new_last_name = (data.get('last_name') or '').strip()
@@ -128,13 +145,14 @@ def update_me():
         if new_password:
             if not current_password:
                 return jsonify({'error': 'Current password is required to change password.'}), 400
-            if not bcrypt.check_password_hash(user.password_hash, current_password):
+            if not check_password(user.password_hash, current_password):
                 return jsonify({'error': 'Current password is incorrect.'}), 401
             if len(new_password) < 6:
                 return jsonify({'error': 'New password must be at least 6 characters.'}), 400
-            user.password_hash = bcrypt.generate_password_hash(new_password).decode('utf-8')
+            user.password_hash = hash_password(new_password)
 
         db.session.commit()
+        invalidate_principal(user.id)
         return jsonify({
             'message': 'Profile updated successfully.',
             'user': {
@@ -143,6 +161,9 @@ def update_me():
                 'is_admin': user.is_admin, 'is_owner': user.is_owner,
             },
         }), 200
+    except PasswordHasherBusy:
+        db.session.rollback()
+        return busy_response()
     except Exception as e:
         db.session.rollback()
         print(f"Error updating user profile: {e}")
@@ -195,8 +216,8 @@ def resend_verification():
         token = secrets.token_urlsafe(32)
         pending.token = token
         pending.token_expires = datetime.now(timezone.utc) + timedelta(hours=24)
+        queue_verification_email(email, token)
         db.session.commit()
-        send_verification_email(email, token)
     except Exception as e:
         db.session.rollback()
         print(f"Error resending verification: {e}")
@@ -215,8 +236,8 @@ def forgot_password():
             token = secrets.token_urlsafe(32)
             user.reset_token = token
             user.reset_token_expires = datetime.now(timezone.utc) + timedelta(hours=1)
+            queue_reset_email(email, token)
             db.session.commit()
-            send_reset_email(email, token)
         except Exception as e:
             db.session.rollback()
             print(f"Error sending reset email: {e}")
@@ -240,7 +261,10 @@ def reset_password():
     if user.reset_token_expires and datetime.now(timezone.utc) > user.reset_token_expires:
         return jsonify({'error': 'Invalid or expired link.'}), 400
 
-    user.password_hash = bcrypt.generate_password_hash(password).decode('utf-8')
+    try:
+        user.password_hash = hash_password(password)
+    except PasswordHasherBusy:
+        return busy_response()
     user.reset_token = None
     user.reset_token_expires = None
     db.session.commit()
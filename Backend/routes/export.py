@@ -0,0 +1,201 @@
+import csv
+import io
+import json
+import os
+from datetime import date
+from flask import Blueprint, Response, request, jsonify, g, stream_with_context
+from sqlalchemy import Text, cast, false, null, true, union_all
+
+from database import db
+from models import Meal, User, MealAttendance, Review, LatePlate, LatePlateHistory
+from helpers import admin_required, owner_required, day_range
+
+export_bp = Blueprint('export', __name__)
+
+# Rows fetched per round trip on the server-side cursor, and per chunk
+# written to the response.
+EXPORT_BATCH = int(os.getenv('EXPORT_BATCH', 1000))
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+# ---------------------------------------------------------------------------
+# Exported columns
+# ---------------------------------------------------------------------------
+# Plain column selects rather than ORM entities: rows go straight from the
+# cursor to the response without building (or holding) model objects.
+
+def _attendance_rows():
+    return db.select(
+        MealAttendance.id,
+        MealAttendance.attendance_time,
+        MealAttendance.confirmed,
+        Meal.id.label('meal_id'),
+        Meal.dish_name,
+        Meal.meal_type,
+        Meal.meal_date,
+        User.id.label('user_id'),
+        User.name.label('user_name'),
+    ).join(Meal, MealAttendance.meal_id == Meal.id).join(
+        User, MealAttendance.user_id == User.id
+    ).order_by(MealAttendance.id)
+
+
+def _review_rows():
+    return db.select(
+        Review.id,
+        Review.created_at,
+        Review.rating,
+        Review.comment,
+        Review.hidden,
+        Meal.id.label('meal_id'),
+        Meal.dish_name,
+        Meal.meal_type,
+        Meal.meal_date,
+        User.id.label('user_id'),
+        User.name.label('user_name'),
+    ).join(Meal, Review.meal_id == Meal.id).join(
+        User, Review.user_id == User.id
+    ).order_by(Review.id)
+
+
+def _late_plate_rows():
+    """
+    Live late plates and the ones the retention job archived into
+    late_plate_history (notes are not archived), as two selects of the
+    same shape for _export to union. Archived rows keep their original id.
+    """
+    live = db.select(
+        LatePlate.id,
+        LatePlate.request_time,
+        LatePlate.request_date,
+        LatePlate.status,
+        LatePlate.notes,
+        LatePlate.pickup_time,
+        false().label('archived'),
+        Meal.id.label('meal_id'),
+        Meal.dish_name,
+        Meal.meal_type,
+        Meal.meal_date,
+        User.id.label('user_id'),
+        User.name.label('user_name'),
+    ).join(Meal, LatePlate.meal_id == Meal.id).join(
+        User, LatePlate.user_id == User.id
+    )
+    archived = db.select(
+        LatePlateHistory.id,
+        LatePlateHistory.request_time,
+        LatePlateHistory.request_date,
+        LatePlateHistory.status,
+        cast(null(), Text).label('notes'),
+        LatePlateHistory.pickup_time,
+        true().label('archived'),
+        Meal.id.label('meal_id'),
+        Meal.dish_name,
+        Meal.meal_type,
+        Meal.meal_date,
+        User.id.label('user_id'),
+        User.name.label('user_name'),
+    ).join(Meal, LatePlateHistory.meal_id == Meal.id).join(
+        User, LatePlateHistory.user_id == User.id
+    )
+    return live, archived
+
+
+# ---------------------------------------------------------------------------
+# Streaming
+# ---------------------------------------------------------------------------
+
+def _to_text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def _ndjson_chunk(columns, rows):
+    return ''.join(
+        json.dumps(dict(zip(columns, map(_to_text, row)))) + '\n' for row in rows
+    )
+
+
+def _csv_chunk(rows):
+    buf = io.StringIO()
+    csv.writer(buf).writerows([_to_text(v) for v in row] for row in rows)
+    return buf.getvalue()
+
+
+def _parse_day(name):
+    value = request.args.get(name)
+    return date.fromisoformat(value) if value else None
+
+
+def _export(name, *stmts):
+    """
+    Stream `stmts` (each restricted to the admin's chapter and the optional
+    ?from=/?to= meal dates; several are unioned in id order) as NDJSON or
+    CSV. Rows are read off a server-side cursor EXPORT_BATCH at a time and
+    written out as they arrive, so memory stays flat and the first rows go
+    out as soon as Postgres produces them.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}."}), 400
+    try:
+        since, until = _parse_day('from'), _parse_day('to')
+    except ValueError:
+        return jsonify({'error': 'from and to must be dates (YYYY-MM-DD).'}), 400
+
+    scope = [Meal.chapter_id == g.current_user.chapter_id]
+    if since:
+        scope.append(Meal.meal_date >= day_range(since)[0])
+    if until:
+        scope.append(Meal.meal_date < day_range(until)[1])
+    if len(stmts) == 1:
+        stmt = stmts[0].where(*scope)
+    else:
+        rows = union_all(*(s.where(*scope) for s in stmts)).subquery()
+        stmt = db.select(rows).order_by(rows.c.id)
+
+    columns = [c.name for c in stmt.selected_columns]
+
+    def generate():
+        try:
+            if fmt == 'csv':
+                yield _csv_chunk([columns])
+            result = db.session.execute(stmt.execution_options(yield_per=EXPORT_BATCH))
+            for rows in result.partitions():
+                yield _ndjson_chunk(columns, rows) if fmt == 'ndjson' else _csv_chunk(rows)
+        except Exception as e:
+            # Headers are already sent; all we can do is cut the stream short.
+            print(f"Error streaming {name} export: {e}")
+        finally:
+            db.session.rollback()
+
+    filename = f"{name}-{date.today().isoformat()}.{fmt}"
+    return Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{filename}"',
+        'X-Accel-Buffering': 'no',   # let nginx pass chunks through as they are written
+    })
+
+
+# ---------------------------------------------------------------------------
+# Endpoints
+# ---------------------------------------------------------------------------
+
+@export_bp.route('/api/admin/export/attendance', methods=['GET'])
+@admin_required
+def export_attendance():
+    return _export('attendance', _attendance_rows())
+
+
+@export_bp.route('/api/admin/export/reviews', methods=['GET'])
+@owner_required
+def export_reviews():
+    return _export('reviews', _review_rows())
+
+
+@export_bp.route('/api/admin/export/late-plates', methods=['GET'])
+@admin_required
+def export_late_plates():
+    return _export('late-plates', *_late_plate_rows())
@@ -1,11 +1,11 @@
 from datetime import datetime, time as dt_time
 from flask import Blueprint, request, jsonify, g
-from sqlalchemy import func
-from sqlalchemy.orm import joinedload
 
 from database import db
 from models import Meal, LatePlate
-from helpers import jwt_required, admin_required
+from helpers import jwt_required, admin_required, conditional_get
+from analytics_snapshot import mark_days_dirty
+from queries import late_plate_request, meal_late_plates, late_plates_from, pending_late_plate_count
 
 late_plates_bp = Blueprint('late_plates', __name__)
 
@@ -38,7 +38,7 @@ def request_late_plate(meal_id):
                 return jsonify({'error': 'Invalid pickup_time format. Use HH:MM.'}), 400
 
         today_date = datetime.now().date()
-        if LatePlate.query.filter_by(user_id=user_id, meal_id=meal_id, request_date=today_date).first():
+        if late_plate_request(user_id, meal_id, today_date).first():
             return jsonify({'error': 'You have already requested a late plate for this meal today.'}), 400
 
         db.session.add(LatePlate(
@@ -48,6 +48,7 @@ def request_late_plate(meal_id):
             request_date=today_date,
             pickup_time=pickup_time,
         ))
+        mark_days_dirty([(meal.chapter_id, meal.meal_date)])
         db.session.commit()
         return jsonify({'message': 'Late plate request submitted successfully.'}), 201
     except Exception as e:
@@ -64,6 +65,7 @@ def cancel_late_plate(meal_id):
         lp = LatePlate.query.filter_by(user_id=user_id, meal_id=meal_id).first()
         if not lp:
             return jsonify({'error': 'No late plate request found.'}), 404
+        mark_days_dirty([(lp.meal.chapter_id, lp.meal.meal_date)])
         db.session.delete(lp)
         db.session.commit()
         return jsonify({'message': 'Late plate request cancelled.'}), 200
@@ -80,9 +82,7 @@ def get_late_plates(meal_id):
         if not meal:
             return jsonify({'error': 'Meal not found.'}), 404
 
-        late_plates = db.session.query(LatePlate).options(
-            joinedload(LatePlate.user), joinedload(LatePlate.meal)
-        ).filter_by(meal_id=meal_id).order_by(LatePlate.request_time.desc()).all()
+        late_plates = meal_late_plates(meal_id).all()
 
         return jsonify({'late_plates': [{
             'id': lp.id, 'user_id': lp.user_id, 'meal_id': lp.meal_id,
@@ -97,15 +97,11 @@ def get_late_plates(meal_id):
 
 @late_plates_bp.route('/api/admin/late-plates/today', methods=['GET'])
 @admin_required
+@conditional_get(lambda: datetime.now().date())
 def get_today_late_plates():
     try:
         today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        late_plates = db.session.query(LatePlate).options(
-            joinedload(LatePlate.user), joinedload(LatePlate.meal)
-        ).join(Meal, LatePlate.meal_id == Meal.id).filter(
-            Meal.meal_date >= today,
-            Meal.chapter_id == g.current_user.chapter_id,
-        ).order_by(Meal.meal_date.asc(), LatePlate.request_time.asc()).all()
+        late_plates = late_plates_from(g.current_user.chapter_id, today).all()
 
         return jsonify({'late_plates': [{
             'id': lp.id,
@@ -130,16 +126,10 @@ def get_today_late_plates():
 
 @late_plates_bp.route('/api/admin/late-plates/pending-count', methods=['GET'])
 @admin_required
+@conditional_get(lambda: datetime.now().strftime('%Y-%m-%dT%H:%M'))   # meals drop out as they start
 def get_pending_late_plate_count():
     try:
-        now = datetime.now()
-        count = db.session.query(func.count(LatePlate.id)).join(
-            Meal, LatePlate.meal_id == Meal.id
-        ).filter(
-            LatePlate.status == 'pending',
-            Meal.meal_date >= now,
-            Meal.chapter_id == g.current_user.chapter_id,
-        ).scalar() or 0
+        count = pending_late_plate_count(g.current_user.chapter_id, datetime.now()).scalar() or 0
         return jsonify({'count': count}), 200
     except Exception as e:
         print(f"Error fetching pending late plate count: {e}")
@@ -1,39 +1,22 @@
-import io
 import json
 import os
-import uuid
 import requests as req_lib
-from collections import defaultdict
 from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, g
-from sqlalchemy import func, and_
-from werkzeug.utils import secure_filename
 
 from database import db
-from models import Meal, MealAttendance, Review, LatePlate, User
-from helpers import jwt_required, admin_required, allowed_file, upload_file_to_s3, apply_preset_to_meal, _enrich_meals, _s3, AWS_BUCKET_NAME, S3_BASE_URL
-from analytics import welford_from_list, apply_zscores
+from models import Meal, MealAttendance, Review, LatePlate, Dish, ImageJob
+from helpers import jwt_required, admin_required, conditional_get, allowed_file, day_range, week_range, keyset_page, keyset_page_list, InvalidCursor, _meal_base, _overlay_user_state
+from presets import seed_meal_attendance
+from images import enqueue_image, image_variant_urls
+from analytics import WelfordAccumulator, welford_summary, apply_zscores
+from rollups import record_meal, retract_meal, move_meal
+from response_cache import cached_chapter_payload
+from queries import (meals_between, served_dishes, meals_since, last_served_before, dish_occurrences,
+                     dish_search)
 
 meals_bp = Blueprint('meals', __name__)
 
-_CONTENT_TYPE_TO_EXT = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/webp': 'webp', 'image/gif': 'gif'}
-
-def _download_and_upload_web_image(url):
-    """Download an image from a URL and upload it to S3. Returns the S3 URL or None."""
-    try:
-        r = req_lib.get(url, timeout=10)
-        if not r.ok:
-            return None
-        content_type = r.headers.get('Content-Type', 'image/jpeg').split(';')[0].strip()
-        ext = _CONTENT_TYPE_TO_EXT.get(content_type, 'jpg')
-        s3_key = f"uploads/{uuid.uuid4()}.{ext}"
-        _s3.upload_fileobj(io.BytesIO(r.content), AWS_BUCKET_NAME, s3_key, ExtraArgs={"ContentType": content_type})
-        return f"{S3_BASE_URL}{s3_key}"
-    except Exception as e:
-        print(f"Web image download/upload error: {e}")
-        return None
-
-
 @meals_bp.route('/api/meals/image-search', methods=['GET'])
 @admin_required
 def search_meal_images():
@@ -65,13 +48,11 @@ def search_meal_images():
 
 @meals_bp.route('/api/today-meals', methods=['GET'])
 @jwt_required
+@conditional_get(lambda: datetime.now().date())
 def get_today_meals():
     try:
         user_id = g.current_user.id
-        attendance_sq = db.session.query(
-            MealAttendance.meal_id,
-            func.count(MealAttendance.id).label('attendance_count'),
-        ).group_by(MealAttendance.meal_id).subquery()
+        chapter_id = g.current_user.chapter_id
 
         date_str = request.args.get('date')
         try:
@@ -80,14 +61,14 @@ def get_today_meals():
         except Exception:
             today = datetime.now().date()
 
-        meals = db.session.query(Meal, attendance_sq.c.attendance_count).outerjoin(
-            attendance_sq, Meal.id == attendance_sq.c.meal_id
-        ).filter(
-            db.func.date(Meal.meal_date) == today,
-            Meal.chapter_id == g.current_user.chapter_id,
-        ).order_by(Meal.meal_date).all()
+        day_start, day_end = day_range(today)
 
-        return jsonify({'meals': _enrich_meals(meals, user_id)}), 200
+        def build():
+            meals = meals_between(chapter_id, day_start, day_end).all()
+            return _meal_base(meals)
+
+        base = cached_chapter_payload(chapter_id, ('day', today), build)
+        return jsonify({'meals': _overlay_user_state(base, user_id)}), 200
     except Exception as e:
         print(f"Error fetching today's meals: {e}")
         return jsonify({'error': "Failed to fetch today's meals."}), 500
@@ -95,125 +76,160 @@ def get_today_meals():
 
 @meals_bp.route('/api/menu', methods=['GET'])
 @jwt_required
+@conditional_get(lambda: datetime.now().date())
 def get_weekly_menu():
     try:
         user_id = g.current_user.id
-        attendance_sq = db.session.query(
-            MealAttendance.meal_id,
-            func.count(MealAttendance.id).label('attendance_count'),
-        ).group_by(MealAttendance.meal_id).subquery()
-
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_week = today - timedelta(days=today.weekday() + 1)
-        if today.weekday() == 6:
-            start_of_week = today
-        end_of_week = (start_of_week + timedelta(days=6)).replace(
-            hour=23, minute=59, second=59, microsecond=999999
-        )
+        chapter_id = g.current_user.chapter_id
 
-        meals = db.session.query(Meal, attendance_sq.c.attendance_count).outerjoin(
-            attendance_sq, Meal.id == attendance_sq.c.meal_id
-        ).filter(
-            Meal.meal_date >= start_of_week,
-            Meal.meal_date <= end_of_week,
-            Meal.chapter_id == g.current_user.chapter_id,
-        ).order_by(Meal.meal_date).all()
+        start_of_week, end_of_week = week_range(datetime.now())
+
+        def build():
+            meals = meals_between(chapter_id, start_of_week, end_of_week).all()
+            return _meal_base(meals)
 
-        return jsonify({'meals': _enrich_meals(meals, user_id)}), 200
+        base = cached_chapter_payload(chapter_id, ('week', start_of_week.date()), build)
+        return jsonify({'meals': _overlay_user_state(base, user_id)}), 200
     except Exception as e:
         print(f"Error fetching weekly menu: {e}")
         return jsonify({'error': 'Failed to fetch meals.'}), 500
 
 
+def _past_dishes(chapter_id, start_of_week):
+    """
+    Every dish the chapter served before `start_of_week`, with its rating
+    stats and cross-sectional z-score, in no particular order.
+    """
+    # One row per dish from the dish rollups. They cover every meal of the
+    # dish, so the few meals from this week onward are taken back out
+    # (ratings unmerged, Chan et al. in reverse) to leave only past
+    # occurrences.
+    dishes = served_dishes(chapter_id).all()
+    recent = meals_since(chapter_id, start_of_week).all()
+
+    rollups = {
+        dish.id: {
+            'times_served': dish.times_served,
+            'served_by_type': dict(dish.served_by_type),
+            'attendance_total': dish.attendance_total,
+            'ratings': WelfordAccumulator.from_moments(dish.n, dish.mean, dish.m2),
+        } for dish in dishes
+    }
+    for dish_id, meal_type, attendance, n, mean, m2 in recent:
+        rollup = rollups.get(dish_id)
+        if rollup is None:
+            continue
+        rollup['times_served'] -= 1
+        rollup['served_by_type'][meal_type] = rollup['served_by_type'].get(meal_type, 0) - 1
+        rollup['attendance_total'] -= attendance
+        if n:
+            rollup['ratings'].unmerge(WelfordAccumulator.from_moments(n, mean, m2))
+
+    # A dish served again this week needs its last past date, one
+    # index probe on (dish_id, meal_date) each.
+    recent_dish_ids = {dish_id for dish_id, *_ in recent}
+    last_past = dict(last_served_before(recent_dish_ids, start_of_week).all()) if recent_dish_ids else {}
+
+    meals_data = []
+    for dish in dishes:
+        rollup = rollups[dish.id]
+        if rollup['times_served'] <= 0:
+            continue
+        last_served = last_past[dish.id] if dish.id in last_past else dish.last_served_at
+        stats = welford_summary(rollup['ratings'])
+        meals_data.append({
+            'dish_id': dish.id,
+            'dish_name': dish.name,
+            'description': dish.description,
+            'image_url': dish.image_url,
+            'times_served': rollup['times_served'],
+            'served_by_type': {t: c for t, c in rollup['served_by_type'].items() if c > 0},
+            'average_attendance': round(rollup['attendance_total'] / rollup['times_served'], 2),
+            'last_served': last_served.isoformat() if last_served else None,
+            'avg_rating': stats['mean'],
+            'review_count': stats['n'],
+            'rating_std': stats['std'],
+            'sharpe_analog': stats['sharpe_analog'],
+        })
+
+    # Cross-sectional z-scores across all of the chapter's dishes, whatever
+    # page or filter a request asks for.
+    apply_zscores(meals_data, key='avg_rating')
+    return meals_data
+
+
+def _best_first(value):
+    # Descending order as an ascending key, with missing values last.
+    return (value is None, -value if value is not None else 0)
+
+
+# Sort orders of /api/past-meals: ascending keys that end in the dish id.
+_PAST_MEAL_SORTS = {
+    'name':          lambda d: (d['dish_name'].lower(), d['dish_id']),
+    'zscore':        lambda d: (*_best_first(d['rating_zscore']), d['dish_id']),
+    'avg_rating':    lambda d: (*_best_first(d['avg_rating']), d['dish_id']),
+    'sharpe_analog': lambda d: (*_best_first(d['sharpe_analog']), d['dish_id']),
+    'times_served':  lambda d: (-d['times_served'], d['dish_id']),
+    'last_served':   lambda d: (*_best_first(
+        datetime.fromisoformat(d['last_served']).timestamp() if d['last_served'] else None), d['dish_id']),
+}
+
+
 @meals_bp.route('/api/past-meals', methods=['GET'])
 @jwt_required
 def get_past_meals():
+    """
+    One page of the dishes served before this week. ?sort= is one of
+    _PAST_MEAL_SORTS (default name); ?meal_type= keeps dishes served as that
+    type and counts times_served for it alone.
+    """
+    sort = request.args.get('sort', 'name')
+    if sort not in _PAST_MEAL_SORTS:
+        return jsonify({'error': f"sort must be one of: {', '.join(_PAST_MEAL_SORTS)}."}), 400
     try:
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        start_of_week = today - timedelta(days=today.weekday() + 1)
-        if today.weekday() == 6:
-            start_of_week = today
-
-        att_sq = db.session.query(
-            MealAttendance.meal_id,
-            func.count(MealAttendance.id).label('instance_attendance_count'),
-        ).group_by(MealAttendance.meal_id).subquery()
-
-        instances_sq = db.session.query(
-            Meal.id,
-            Meal.dish_name,
-            Meal.meal_date,
-            Meal.meal_type,
-            Meal.description,
-            Meal.image_url,
-            func.coalesce(att_sq.c.instance_attendance_count, 0).label('attendance_for_date'),
-        ).outerjoin(att_sq, Meal.id == att_sq.c.meal_id).filter(
-            Meal.meal_date < start_of_week,
-            Meal.chapter_id == g.current_user.chapter_id,
-        ).subquery()
-
-        grouped = db.session.query(
-            instances_sq.c.dish_name,
-            func.max(instances_sq.c.description).label('description'),
-            func.max(instances_sq.c.image_url).label('image_url'),
-            func.avg(instances_sq.c.attendance_for_date).label('average_attendance'),
-            func.array_agg(
-                func.jsonb_build_object(
-                    'id', instances_sq.c.id,
-                    'date', instances_sq.c.meal_date,
-                    'meal_type', instances_sq.c.meal_type,
-                    'attendance', instances_sq.c.attendance_for_date,
-                )
-            ).label('all_occurrences'),
-        ).group_by(instances_sq.c.dish_name).order_by(instances_sq.c.dish_name).all()
-
-        # Build meal_id → dish_name map and collect all meal IDs
-        meal_id_to_dish = {}
-        meals_data = []
-        for dish_name, description, image_url, average_attendance, all_occurrences in grouped:
-            occurrences = sorted([
-                {'id': occ['id'], 'date': datetime.fromisoformat(occ['date']), 'meal_type': occ['meal_type'], 'attendance': occ['attendance']}
-                for occ in all_occurrences
-            ], key=lambda x: x['date'], reverse=True)
-            for occ in occurrences:
-                meal_id_to_dish[occ['id']] = dish_name
-            meals_data.append({
-                'dish_name': dish_name,
-                'description': description,
-                'image_url': image_url,
-                'average_attendance': round(average_attendance, 2) if average_attendance else 0,
-                'past_occurrences': occurrences,
-            })
-
-        # Fetch all reviews for past meal instances and group by dish_name
-        all_meal_ids = list(meal_id_to_dish.keys())
-        ratings_by_dish = defaultdict(list)
-        if all_meal_ids:
-            for meal_id, rating in db.session.query(Review.meal_id, Review.rating).filter(
-                Review.meal_id.in_(all_meal_ids)
-            ).all():
-                dish = meal_id_to_dish.get(meal_id)
-                if dish:
-                    ratings_by_dish[dish].append(rating)
-
-        # Apply Welford's algorithm per dish
-        for dish in meals_data:
-            stats = welford_from_list(ratings_by_dish.get(dish['dish_name'], []))
-            dish['avg_rating'] = stats['mean']
-            dish['review_count'] = stats['n']
-            dish['rating_std'] = stats['std']
-            dish['sharpe_analog'] = stats['sharpe_analog']
-
-        # Apply cross-sectional z-scores across all dishes
-        apply_zscores(meals_data, key='avg_rating')
-
-        return jsonify({'meals': meals_data}), 200
+        chapter_id = g.current_user.chapter_id
+        start_of_week, _ = week_range(datetime.now())
+        dishes = cached_chapter_payload(chapter_id, ('past-meals', start_of_week.date()),
+                                        lambda: _past_dishes(chapter_id, start_of_week))
+
+        meal_type = request.args.get('meal_type')
+        if meal_type:
+            dishes = [{**d, 'times_served': d['served_by_type'][meal_type]}
+                      for d in dishes if meal_type in d['served_by_type']]
+
+        page, next_cursor = keyset_page_list(dishes, _PAST_MEAL_SORTS[sort])
+        return jsonify({'meals': page, 'next_cursor': next_cursor}), 200
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
     except Exception as e:
         db.session.rollback()
         print(f"Error fetching past meals: {e}")
         return jsonify({'error': 'Failed to fetch past meals.'}), 500
 
 
+@meals_bp.route('/api/past-meals/<int:dish_id>/occurrences', methods=['GET'])
+@jwt_required
+def get_past_meal_occurrences(dish_id):
+    """One page of a dish's meals from before this week, newest first; ?meal_type= narrows them."""
+    try:
+        dish = Dish.query.get(dish_id)
+        if not dish or dish.chapter_id != g.current_user.chapter_id:
+            return jsonify({'error': 'Dish not found.'}), 404
+        start_of_week, _ = week_range(datetime.now())
+
+        occurrences, next_cursor = keyset_page(
+            dish_occurrences(dish_id, start_of_week, request.args.get('meal_type')))
+        return jsonify({'occurrences': [
+            {'id': o.id, 'date': o.meal_date.isoformat(), 'meal_type': o.meal_type, 'attendance': o.attendance}
+            for o in occurrences
+        ], 'next_cursor': next_cursor}), 200
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
+    except Exception as e:
+        print(f"Error fetching occurrences of dish {dish_id}: {e}")
+        return jsonify({'error': 'Failed to fetch past occurrences.'}), 500
+
+
 @meals_bp.route('/api/pending-reviews', methods=['GET'])
 @jwt_required
 def get_pending_reviews():
@@ -275,6 +291,8 @@ def get_meal(meal_id):
             'dish_name': meal.dish_name,
             'description': meal.description,
             'image_url': meal.image_url,
+            'image_variants': image_variant_urls(meal.image_url),
+            'image_status': meal.image_status,
         }), 200
     except Exception as e:
         print(f"Error fetching meal {meal_id}: {e}")
@@ -285,15 +303,6 @@ def get_meal(meal_id):
 @admin_required
 def add_meal():
     try:
-        image_url = None
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and allowed_file(file.filename):
-                unique_filename = f"uploads/{uuid.uuid4()}-{secure_filename(file.filename)}"
-                image_url = upload_file_to_s3(file, unique_filename)
-                if not image_url:
-                    return jsonify({'error': 'Failed to upload image to S3.'}), 500
-
         meal_date = request.form.get('meal_date')
         meal_type = request.form.get('meal_type')
         dish_name = request.form.get('dish_name')
@@ -308,20 +317,21 @@ def add_meal():
             meal_type=meal_type,
             dish_name=dish_name,
             description=description,
-            image_url=image_url,
             chapter_id=chapter_id,
         )
+        record_meal(new_meal)
         db.session.add(new_meal)
         db.session.flush()
 
-        all_users = User.query.filter_by(chapter_id=chapter_id).all()
-        for user in all_users:
-            new_attendance = MealAttendance(meal_id=new_meal.id, user_id=user.id)
-            db.session.add(new_attendance)
-            apply_preset_to_meal(new_meal, user, new_attendance)
+        file = request.files.get('image')
+        if file and allowed_file(file.filename):
+            enqueue_image(new_meal, file=file)
+
+        seed_meal_attendance([new_meal.id], chapter_id)
 
         db.session.commit()
-        return jsonify({'message': 'Meal added successfully.'}), 201
+        return jsonify({'message': 'Meal added successfully.', 'id': new_meal.id,
+                        'image_status': new_meal.image_status}), 201
     except Exception as e:
         db.session.rollback()
         print(f"Error adding meal: {e}")
@@ -336,23 +346,22 @@ def update_meal(meal_id):
         if not meal:
             return jsonify({'error': 'Meal not found.'}), 404
 
-        image_url = meal.image_url
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename != '' and allowed_file(file.filename):
-                unique_filename = f"uploads/{uuid.uuid4()}-{secure_filename(file.filename)}"
-                image_url = upload_file_to_s3(file, unique_filename)
-                if not image_url:
-                    return jsonify({'error': 'Failed to upload image to S3.'}), 500
-
+        old_dish_name, old_meal_type, old_meal_date = meal.dish_name, meal.meal_type, meal.meal_date
         meal.meal_date = datetime.fromisoformat(request.form.get('meal_date', meal.meal_date.isoformat()))
         meal.meal_type = request.form.get('meal_type', meal.meal_type)
         meal.dish_name = request.form.get('dish_name', meal.dish_name)
         meal.description = request.form.get('description', meal.description)
-        meal.image_url = image_url
+        move_meal(meal, old_dish_name, old_meal_type, old_meal_date)
+        if meal.description:
+            meal.dish.description = meal.description
+
+        # The current image stays up until the replacement has been stored.
+        file = request.files.get('image')
+        if file and file.filename != '' and allowed_file(file.filename):
+            enqueue_image(meal, file=file)
 
         db.session.commit()
-        return jsonify({'message': 'Meal updated successfully.'}), 200
+        return jsonify({'message': 'Meal updated successfully.', 'image_status': meal.image_status}), 200
     except Exception as e:
         db.session.rollback()
         print(f"Error updating meal {meal_id}: {e}")
@@ -366,6 +375,7 @@ def delete_meal(meal_id):
         meal = Meal.query.get(meal_id)
         if not meal:
             return jsonify({'error': 'Meal not found.'}), 404
+        retract_meal(meal)
         db.session.delete(meal)
         db.session.commit()
         return jsonify({'message': 'Meal deleted successfully.'}), 200
@@ -375,6 +385,30 @@ def delete_meal(meal_id):
         return jsonify({'error': 'Failed to delete meal.'}), 500
 
 
+@meals_bp.route('/api/meals/<int:meal_id>/image-status', methods=['GET'])
+@admin_required
+def get_meal_image_status(meal_id):
+    try:
+        meal = Meal.query.get(meal_id)
+        if not meal:
+            return jsonify({'error': 'Meal not found.'}), 404
+        job = ImageJob.query.filter_by(meal_id=meal_id).order_by(ImageJob.id.desc()).first()
+        return jsonify({
+            'meal_id': meal.id,
+            'image_status': meal.image_status,
+            'image_url': meal.image_url,
+            'job': {
+                'status': job.status,
+                'attempts': job.attempts,
+                'next_attempt_at': job.next_attempt_at.isoformat() if job.status == 'pending' else None,
+                'last_error': job.last_error,
+            } if job else None,
+        }), 200
+    except Exception as e:
+        print(f"Error fetching image status for meal {meal_id}: {e}")
+        return jsonify({'error': 'Failed to fetch image status.'}), 500
+
+
 @meals_bp.route('/api/meals/week', methods=['DELETE'])
 @admin_required
 def clear_week_meals():
@@ -385,17 +419,16 @@ def clear_week_meals():
     try:
         from datetime import date as date_type
         d = date_type.fromisoformat(date_str)
-        days_since_sunday = (d.weekday() + 1) % 7
-        sunday = d - timedelta(days=days_since_sunday)
-        saturday = sunday + timedelta(days=6)
+        week_start, week_end = week_range(d)
         chapter_id = g.current_user.chapter_id
         meals = Meal.query.filter(
             Meal.chapter_id == chapter_id,
-            Meal.meal_date >= datetime.combine(sunday, datetime.min.time()),
-            Meal.meal_date <= datetime.combine(saturday, datetime.max.time()),
+            Meal.meal_date >= week_start,
+            Meal.meal_date < week_end,
         ).all()
         count = len(meals)
         for meal in meals:
+            retract_meal(meal)
             db.session.delete(meal)
         db.session.commit()
         return jsonify({'message': f'{count} meal(s) cleared for that week.', 'count': count})
@@ -420,40 +453,36 @@ def add_bulk_meals():
         chapter_id = g.current_user.chapter_id
         new_meals = []
         for meal_data in meals_data:
-            image_url = meal_data.get('image_url')
-            file_key = f"image-{meal_data['id']}"
-            if file_key in request.files:
-                file = request.files[file_key]
-                if file and file.filename != '' and allowed_file(file.filename):
-                    unique_filename = f"uploads/{uuid.uuid4()}-{secure_filename(file.filename)}"
-                    image_url = upload_file_to_s3(file, unique_filename)
-                    if not image_url:
-                        return jsonify({'error': f"Failed to upload image for meal {meal_data['id']}."}), 500
-            elif meal_data.get('web_image_url') and not image_url:
-                image_url = _download_and_upload_web_image(meal_data['web_image_url'])
-
             new_meal = Meal(
                 meal_date=datetime.fromisoformat(meal_data['meal_date']),
                 meal_type=meal_data['meal_type'],
                 dish_name=meal_data['dish_name'],
                 description=meal_data.get('description'),
-                image_url=image_url,
+                image_url=meal_data.get('image_url'),
                 chapter_id=chapter_id,
             )
+            record_meal(new_meal)
             db.session.add(new_meal)
-            new_meals.append(new_meal)
+            new_meals.append((meal_data, new_meal))
 
         db.session.flush()
 
-        all_users = User.query.filter_by(chapter_id=chapter_id).all()
-        for meal in new_meals:
-            for user in all_users:
-                new_attendance = MealAttendance(meal_id=meal.id, user_id=user.id)
-                db.session.add(new_attendance)
-                apply_preset_to_meal(meal, user, new_attendance)
+        # Images are stored by the image worker; the meals go live right away.
+        images = []
+        for meal_data, new_meal in new_meals:
+            file = request.files.get(f"image-{meal_data['id']}")
+            if file and file.filename != '' and allowed_file(file.filename):
+                enqueue_image(new_meal, file=file)
+            elif meal_data.get('web_image_url') and not meal_data.get('image_url'):
+                enqueue_image(new_meal, url=meal_data['web_image_url'])
+            else:
+                continue
+            images.append({'id': meal_data['id'], 'meal_id': new_meal.id, 'image_status': new_meal.image_status})
+
+        seed_meal_attendance([meal.id for _, meal in new_meals], chapter_id)
 
         db.session.commit()
-        return jsonify({'message': f'{len(new_meals)} meals added successfully.'}), 201
+        return jsonify({'message': f'{len(new_meals)} meals added successfully.', 'images': images}), 201
     except Exception as e:
         db.session.rollback()
         print(f"Error adding bulk meals: {e}")
@@ -463,41 +492,25 @@ def add_bulk_meals():
 @meals_bp.route('/api/meals/search', methods=['GET'])
 @admin_required
 def search_meals():
+    """
+    Autocomplete over the chapter's dish catalog, in one pass over `dishes`
+    (queries.dish_search): names that contain `q` or are a close trigram
+    match, ranked by similarity and how recently the dish was served.
+    """
     try:
-        query = request.args.get('q', '')
+        query = request.args.get('q', '').strip()
         if not query or len(query) < 2:
             return jsonify({'meals': []}), 200
 
-        chapter_id = g.current_user.chapter_id
-
-        dates_sq = db.session.query(
-            Meal.dish_name,
-            db.func.array_agg(Meal.meal_date).label('all_dates'),
-        ).filter(
-            Meal.dish_name.ilike(f'%{query}%'),
-            Meal.chapter_id == chapter_id,
-        ).group_by(Meal.dish_name).subquery()
-
-        sub = db.session.query(
-            Meal.dish_name,
-            db.func.max(Meal.meal_date).label('max_meal_date'),
-        ).filter(
-            Meal.dish_name.ilike(f'%{query}%'),
-            Meal.chapter_id == chapter_id,
-        ).group_by(Meal.dish_name).subquery()
-
-        past_meals = db.session.query(Meal, dates_sq.c.all_dates).join(
-            sub, and_(Meal.dish_name == sub.c.dish_name, Meal.meal_date == sub.c.max_meal_date)
-        ).join(
-            dates_sq, Meal.dish_name == dates_sq.c.dish_name
-        ).order_by(Meal.dish_name).limit(10).all()
+        dishes = dish_search(g.current_user.chapter_id, query, datetime.now()).all()
 
         meals_data = [{
-            'dish_name': meal.dish_name,
-            'description': meal.description,
-            'image_url': meal.image_url,
-            'past_dates': sorted([d.isoformat() for d in all_dates], reverse=True),
-        } for meal, all_dates in past_meals]
+            'dish_name': dish.name,
+            'description': dish.description,
+            'image_url': dish.image_url,
+            'times_served': dish.times_served,
+            'past_dates': [d.isoformat() for d in dates],
+        } for dish, dates in dishes]
 
         return jsonify({'meals': meals_data}), 200
     except Exception as e:
@@ -1,9 +1,10 @@
 from flask import Blueprint, request, jsonify, g
-from sqlalchemy.orm import joinedload
 
 from database import db
 from models import Meal, Review, MealAttendance
-from helpers import jwt_required, admin_required, owner_required
+from helpers import jwt_required, admin_required, owner_required, keyset_page, InvalidCursor
+from rollups import record_rating, retract_rating, replace_rating, shift_attendance
+from queries import meal_reviews, review_log
 
 reviews_bp = Blueprint('reviews', __name__)
 
@@ -31,9 +32,11 @@ def submit_review(meal_id):
 
         new_review = Review(meal_id=meal_id, user_id=user_id, rating=rating, comment=data.get('comment'))
         db.session.add(new_review)
+        record_rating(meal, rating)
 
         if not MealAttendance.query.filter_by(user_id=user_id, meal_id=meal_id).first():
             db.session.add(MealAttendance(meal_id=meal_id, user_id=user_id))
+            shift_attendance({meal_id: 1})
 
         db.session.commit()
         return jsonify({'message': 'Meal review created successfully', 'review_id': new_review.id}), 200
@@ -60,6 +63,7 @@ def edit_review(meal_id, review_id):
             rating = float(data['rating'])
             if not (1.0 <= rating <= 5.0 and (rating * 2) % 1 == 0):
                 return jsonify({'error': 'Rating must be between 1.0 and 5.0 in half star increments.'}), 400
+            replace_rating(review.meal, review.rating, rating)
             review.rating = rating
         if 'comment' in data:
             review.comment = data['comment']
@@ -83,6 +87,7 @@ def delete_review(meal_id, review_id):
             return jsonify({'error': 'Review not found.'}), 404
         if review.user_id != user_id and not (g.current_user.is_admin or g.current_user.is_owner):
             return jsonify({'error': 'You can only delete your own reviews.'}), 403
+        retract_rating(review.meal, review.rating)
         db.session.delete(review)
         db.session.commit()
         return jsonify({'message': 'Review deleted successfully.'}), 200
@@ -100,7 +105,7 @@ def get_meal_reviews(meal_id):
         if not meal:
             return jsonify({'error': 'Meal not found.'}), 404
 
-        reviews = Review.query.filter_by(meal_id=meal_id).order_by(Review.created_at.desc()).all()
+        reviews = meal_reviews(meal_id).all()
         return jsonify({'reviews': [{
             'id': r.id, 'rating': r.rating, 'comment': r.comment,
             'created_at': r.created_at.isoformat(),
@@ -114,18 +119,16 @@ def get_meal_reviews(meal_id):
 @owner_required
 def get_all_reviews():
     try:
-        reviews = db.session.query(Review).options(
-            joinedload(Review.meal), joinedload(Review.user)
-        ).join(Meal, Review.meal_id == Meal.id).filter(
-            Meal.chapter_id == g.current_user.chapter_id
-        ).order_by(Review.created_at.desc()).all()
+        reviews, next_cursor = keyset_page(review_log(g.current_user.chapter_id))
 
         return jsonify({'reviews': [{
             'id': r.id, 'rating': r.rating, 'comment': r.comment, 'hidden': r.hidden,
             'created_at': r.created_at.isoformat(),
             'meal': {'id': r.meal.id, 'dish_name': r.meal.dish_name, 'meal_date': r.meal.meal_date.isoformat()},
             'user': {'id': r.user.id, 'name': r.user.name},
-        } for r in reviews]}), 200
+        } for r in reviews], 'next_cursor': next_cursor}), 200
+    except InvalidCursor:
+        return jsonify({'error': 'Invalid cursor.'}), 400
     except Exception as e:
         print(f"Error fetching all reviews: {e}")
         return jsonify({'error': 'Failed to fetch reviews.'}), 500
@@ -154,6 +157,7 @@ def admin_delete_review(review_id):
         review = Review.query.get(review_id)
         if not review:
             return jsonify({'error': 'Review not found.'}), 404
+        retract_rating(review.meal, review.rating)
         db.session.delete(review)
         db.session.commit()
         return jsonify({'message': 'Review deleted successfully.'}), 200
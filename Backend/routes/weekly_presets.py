@@ -1,9 +1,10 @@
-from datetime import datetime, date, timedelta, time as time_type
+from datetime import date, time as time_type
 from flask import Blueprint, request, jsonify, g
 
 from database import db
-from models import Meal, MealAttendance, LatePlate, WeeklyPreset
-from helpers import jwt_required
+from models import WeeklyPreset
+from helpers import jwt_required, day_range
+from presets import apply_user_presets
 
 weekly_presets_bp = Blueprint('weekly_presets', __name__)
 
@@ -110,44 +111,17 @@ def delete_weekly_preset(preset_id):
 @jwt_required
 def apply_weekly_presets():
     user = g.current_user
-    today = date.today()
-    end_date = today + timedelta(days=7)
-
-    week_meals = Meal.query.filter(
-        Meal.chapter_id == user.chapter_id,
-        Meal.meal_date >= datetime.combine(today, datetime.min.time()),
-        Meal.meal_date <= datetime.combine(end_date, datetime.max.time()),
-    ).all()
-
-    count = 0
-    for meal in week_meals:
-        preset = WeeklyPreset.query.filter_by(
-            user_id=user.id,
-            day_of_week=meal.meal_date.weekday(),
-            meal_type=meal.meal_type,
-            enabled=True,
-        ).first()
-        if not preset:
-            continue
-
-        att = MealAttendance.query.filter_by(user_id=user.id, meal_id=meal.id).first()
-        if preset.attending:
-            if not att:
-                db.session.add(MealAttendance(meal_id=meal.id, user_id=user.id))
-        else:
-            if att:
-                db.session.delete(att)
-
-        if preset.late_plate:
-            if not LatePlate.query.filter_by(user_id=user.id, meal_id=meal.id).first():
-                db.session.add(LatePlate(
-                    meal_id=meal.id, user_id=user.id,
-                    notes=preset.late_plate_notes,
-                    pickup_time=preset.late_plate_pickup_time,
-                    status='pending',
-                    request_date=today,
-                ))
-        count += 1
-
-    db.session.commit()
-    return jsonify({'message': f'Presets applied to {count} meal(s) this week.'})
+    try:
+        # Today through the same weekday next week, inclusive.
+        start, end = day_range(date.today(), 8)
+        changes = apply_user_presets(user.id, user.chapter_id, start, end)
+        db.session.commit()
+        return jsonify({
+            'message': f'Presets applied to {len(changes)} meal(s) this week.',
+            'count': len(changes),
+            'meals': changes,
+        })
+    except Exception as e:
+        db.session.rollback()
+        print(f"Error applying weekly presets: {e}")
+        return jsonify({'error': 'Failed to apply presets.'}), 500
@@ -0,0 +1,240 @@
+"""
+Single-instance background scheduler.
+
+Periodic jobs are registered with @scheduled_job(trigger, **trigger_args)
+and started by start_scheduler(app). Every process that imports the app
+(each gunicorn worker, `python app.py`) starts an APScheduler paused and
+competes for a leader lock; only the process holding it resumes its
+scheduler and runs jobs. Followers retry every SCHEDULER_LEADER_RETRY
+seconds, so when the leader exits — releasing its lock — another worker
+takes over. The leader re-checks its lock on the same cadence and pauses
+if it has lost it.
+
+SCHEDULER_LOCK picks the lock:
+  'pg'   (default) a session-level pg advisory lock held on a dedicated
+         connection, so one leader per database, across hosts;
+  'file' an flock on SCHEDULER_LOCK_FILE (single host, tests);
+  'none' every process leads (single-process dev setups).
+
+The scheduler never starts under `flask <command>` (other than `flask
+run`), so migrations and one-off CLI tasks don't run jobs. Set
+SCHEDULER_ENABLED=0 on web workers to run jobs only in a dedicated
+`flask scheduler` process.
+
+Each run is recorded in job_runs with its duration, the row count the job
+returned and any error. Jobs registered with record_idle=False (frequent
+polls) are only recorded when they touched rows or failed.
+"""
+import fcntl
+import os
+import socket
+import sys
+import threading
+import time
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from apscheduler.schedulers.background import BackgroundScheduler
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+
+from database import db
+from models import JobRun
+
+SCHEDULER_ENABLED = os.getenv('SCHEDULER_ENABLED', '1') not in ('0', 'false', 'no')
+SCHEDULER_LOCK = os.getenv('SCHEDULER_LOCK', 'pg')
+SCHEDULER_LOCK_FILE = os.getenv('SCHEDULER_LOCK_FILE', '/tmp/ordo-scheduler.lock')
+SCHEDULER_LEADER_RETRY = float(os.getenv('SCHEDULER_LEADER_RETRY', 30))
+JOB_RUN_RETENTION_DAYS = int(os.getenv('JOB_RUN_RETENTION_DAYS', 30))
+
+_LEADER_LOCK_KEY = 0x6f72646f   # 'ordo'
+_HOST = f"{socket.gethostname()}:{os.getpid()}"
+
+Job = namedtuple('Job', 'func trigger trigger_args record_idle')
+_registry = {}
+
+scheduler = BackgroundScheduler()
+_state = {'app': None, 'leader': False}
+
+
+def scheduled_job(trigger, record_idle=True, **trigger_args):
+    """
+    Register the decorated function as a periodic job, keyed by its name.
+    It is called with an app context and should return the number of rows
+    it touched (or None). The function itself is returned unchanged, so it
+    can still be called directly, e.g. from a CLI command.
+    """
+    def decorator(func):
+        _registry[func.__name__] = Job(func, trigger, trigger_args, record_idle)
+        return func
+    return decorator
+
+
+def registered_jobs():
+    return dict(_registry)
+
+
+# ---------------------------------------------------------------------------
+# Running and recording jobs
+# ---------------------------------------------------------------------------
+
+def run_job(name):
+    """Run a registered job now in the current app context and record it. Returns its row count."""
+    job = _registry[name]
+    started_at = datetime.now(timezone.utc)
+    t0 = time.perf_counter()
+    rows, error = None, None
+    try:
+        rows = job.func()
+    except Exception as e:
+        db.session.rollback()
+        error = str(e)[:2000]
+        print(f"[Scheduler] {name} failed: {e}")
+    duration_ms = round((time.perf_counter() - t0) * 1000, 1)
+
+    if error or rows or job.record_idle:
+        try:
+            db.session.add(JobRun(
+                job_name=name, host=_HOST, started_at=started_at, duration_ms=duration_ms,
+                rows=rows, status='error' if error else 'ok', error=error,
+            ))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f"[Scheduler] Could not record {name} run: {e}")
+    return rows
+
+
+def _run_scheduled(name):
+    with _state['app'].app_context():
+        run_job(name)
+
+
+@scheduled_job('cron', hour=0, minute=30)
+def prune_job_runs():
+    """Delete job run history older than JOB_RUN_RETENTION_DAYS."""
+    cutoff = datetime.now(timezone.utc) - timedelta(days=JOB_RUN_RETENTION_DAYS)
+    deleted = JobRun.query.filter(JobRun.started_at < cutoff).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+# ---------------------------------------------------------------------------
+# Leader election
+# ---------------------------------------------------------------------------
+
+class PostgresLeaderLock:
+    """Session-level advisory lock on a connection of its own; released when the process exits."""
+
+    def __init__(self, url):
+        # NullPool: closing the connection really closes it (and drops the
+        # lock) instead of parking it, still locked, in a pool.
+        self._engine = create_engine(url, poolclass=NullPool)
+        self._conn = None
+
+    def acquire(self):
+        try:
+            conn = self._engine.connect()
+            got = conn.execute(text('SELECT pg_try_advisory_lock(:k)'), {'k': _LEADER_LOCK_KEY}).scalar()
+            conn.commit()   # don't sit idle in a transaction; the lock is session-scoped
+        except Exception as e:
+            print(f"[Scheduler] Leader lock unavailable: {e}")
+            return False
+        if not got:
+            conn.close()
+            return False
+        self._conn = conn
+        return True
+
+    def held(self):
+        try:
+            self._conn.execute(text('SELECT 1'))
+            self._conn.commit()
+            return True
+        except Exception:
+            self._conn.invalidate()
+            self._conn = None
+            return False
+
+
+class FileLeaderLock:
+    """flock on a file; one leader per host. Lost if the file is deleted or replaced."""
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = None
+
+    def acquire(self):
+        fd = open(self._path, 'a')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            fd.close()
+            return False
+        self._fd = fd
+        return True
+
+    def held(self):
+        # An flock is never taken away, but it stops excluding anyone once
+        # its file is deleted or replaced (a /tmp cleaner, a redeploy): the
+        # next process opens a new file at the path and locks that one.
+        try:
+            ours, current = os.fstat(self._fd.fileno()), os.stat(self._path)
+            if (ours.st_dev, ours.st_ino) == (current.st_dev, current.st_ino):
+                return True
+        except (OSError, ValueError):
+            pass
+        self._fd.close()
+        self._fd = None
+        return False
+
+
+class NoLeaderLock:
+    def acquire(self):
+        return True
+
+    def held(self):
+        return True
+
+
+def _leader_lock(app):
+    if SCHEDULER_LOCK == 'file':
+        return FileLeaderLock(SCHEDULER_LOCK_FILE)
+    if SCHEDULER_LOCK == 'none':
+        return NoLeaderLock()
+    return PostgresLeaderLock(app.config['SQLALCHEMY_DATABASE_URI'])
+
+
+def _elect(lock):
+    while True:
+        if not _state['leader'] and lock.acquire():
+            _state['leader'] = True
+            scheduler.resume()
+            print(f"[Scheduler] {_HOST} is the leader; running {', '.join(_registry)}.")
+        elif _state['leader'] and not lock.held():
+            _state['leader'] = False
+            scheduler.pause()
+            print(f"[Scheduler] {_HOST} lost the leader lock; pausing jobs.")
+        time.sleep(SCHEDULER_LEADER_RETRY)
+
+
+def _under_flask_command():
+    # Flask sets this for every `flask ...` invocation; `flask run` still serves the app.
+    return os.environ.get('FLASK_RUN_FROM_CLI') == 'true' and 'run' not in sys.argv[1:]
+
+
+def start_scheduler(app, force=False):
+    """
+    Add every registered job and join the leader election. Does nothing
+    when SCHEDULER_ENABLED is off or under a flask CLI command, unless
+    `force` (the `flask scheduler` command). Returns whether it started.
+    """
+    if scheduler.running or not (force or (SCHEDULER_ENABLED and not _under_flask_command())):
+        return False
+    _state['app'] = app
+    for name, job in _registry.items():
+        scheduler.add_job(_run_scheduled, job.trigger, args=[name], id=name, name=name,
+                          max_instances=1, coalesce=True, **job.trigger_args)
+    scheduler.start(paused=True)
+    threading.Thread(target=_elect, args=(_leader_lock(app),), daemon=True, name='scheduler-leader').start()
+    return True
+
@@ -0,0 +1,78 @@
+"""
+Tests that need Postgres run against TEST_DATABASE_URL, a scratch database
+whose tables are recreated once per session and emptied after every test.
+Without it those tests are skipped; the pure ones still run.
+
+    TEST_DATABASE_URL=postgresql:///ordo_test pytest
+"""
+import os
+from datetime import datetime, timedelta
+
+import jwt
+import pytest
+
+TEST_DATABASE_URL = os.getenv('TEST_DATABASE_URL')
+if TEST_DATABASE_URL:
+    # app.py reads these at import time.
+    os.environ['DATABASE_URL'] = TEST_DATABASE_URL
+    os.environ['SCHEDULER_ENABLED'] = '0'
+    os.environ.setdefault('JWT_SECRET', 'test')
+    os.environ.setdefault('PASSWORD_HASH_WORKERS', '0')
+    os.environ.setdefault('BCRYPT_LOG_ROUNDS', '4')
+
+
+@pytest.fixture(scope='session')
+def app():
+    if not TEST_DATABASE_URL:
+        pytest.skip('TEST_DATABASE_URL is not set')
+    from sqlalchemy import text
+    from app import app
+    from database import db
+    with app.app_context():
+        db.session.execute(text('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+        db.session.commit()
+        db.drop_all()
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def db(app):
+    """The database inside an app context; every table is truncated afterwards."""
+    from database import db
+    from helpers import _token_cache, _principal_cache
+    from response_cache import _payload_cache
+    with app.app_context():
+        yield db
+        db.session.rollback()
+        tables = ', '.join(t.name for t in db.metadata.sorted_tables)
+        db.session.execute(db.text(f'TRUNCATE {tables} RESTART IDENTITY CASCADE'))
+        db.session.commit()
+    # Ids restart, so nothing cached under them may outlive the test.
+    for cache in (_token_cache, _principal_cache, _payload_cache):
+        cache.clear()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(db):
+    """make_user(chapter_id=1, admin=False) -> (user_id, auth headers), creating the chapter if needed."""
+    from models import Chapter, User
+
+    def make(chapter_id=1, admin=False, name=None):
+        if db.session.get(Chapter, chapter_id) is None:
+            db.session.add(Chapter(id=chapter_id, name=f'Chapter {chapter_id}'))
+        count = User.query.count()
+        user = User(email=f'user{count}@test', password_hash='x', name=name or f'User {count}',
+                    first_name='User', last_name=str(count), chapter_id=chapter_id,
+                    is_admin=admin, is_owner=admin)
+        db.session.add(user)
+        db.session.commit()
+        token = jwt.encode({'user_id': user.id, 'exp': datetime.now() + timedelta(hours=1)},
+                           os.getenv('JWT_SECRET'), algorithm='HS256')
+        return user.id, {'Authorization': f'Bearer {token}'}
+    return make
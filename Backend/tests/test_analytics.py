@@ -0,0 +1,172 @@
+import json
+import math
+import random
+import statistics
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pytest
+
+from analytics import WelfordAccumulator, welford_from_list, welford_from_moments, welford_summary, moments_summary
+
+HALF_STARS = [r / 2 for r in range(2, 11)]
+
+
+@pytest.mark.parametrize('base', HALF_STARS)
+@pytest.mark.parametrize('x', HALF_STARS)
+@pytest.mark.parametrize('copies', [2, 3, 5, 10])
+def test_remove_back_to_equal_ratings(base, x, copies):
+    acc = WelfordAccumulator()
+    for _ in range(copies):
+        acc.update(base)
+    acc.update(x)
+    acc.remove(x)
+
+    assert (acc.n, acc.M2) == (copies, 0.0)
+    summary = welford_summary(acc)
+    assert summary['std'] == 0.0
+    assert summary['sharpe_analog'] is None
+
+
+@pytest.mark.parametrize('base', HALF_STARS)
+@pytest.mark.parametrize('x', HALF_STARS)
+def test_unmerge_back_to_equal_ratings(base, x):
+    acc, meal = WelfordAccumulator(), WelfordAccumulator()
+    for _ in range(3):
+        acc.update(base)
+    meal.update(x)
+    meal.update(x)
+    acc.merge(meal)
+    acc.unmerge(meal)
+
+    assert (acc.n, acc.M2) == (3, 0.0)
+
+
+def test_record_retract_matches_recompute():
+    rng = random.Random(3)
+    acc, ratings = WelfordAccumulator(), []
+    for _ in range(5000):
+        if ratings and rng.random() < 0.45:
+            acc.remove(ratings.pop(rng.randrange(len(ratings))))
+        else:
+            ratings.append(rng.choice(HALF_STARS))
+            acc.update(ratings[-1])
+        assert acc.M2 >= 0.0
+        if len(ratings) > 1:
+            assert math.isclose(acc.variance, statistics.variance(ratings), rel_tol=1e-9, abs_tol=1e-9)
+
+
+def test_negative_persisted_moments():
+    # Moments written before downdates were clamped.
+    assert welford_from_moments(3, 2.0, -1.8e-15) == welford_from_list([2.0, 2.0, 2.0])
+    stats = moments_summary(np.array([3]), np.array([2.0]), np.array([-1.8e-15]))
+    assert stats['std'][0] == 0.0
+    assert np.isnan(stats['sharpe_analog'][0])
+
+
+def _strict_json(response):
+    def reject(constant):
+        raise ValueError(f'{constant} is not JSON')
+    return json.loads(response.get_data(as_text=True), parse_constant=reject)
+
+
+def test_retracted_review_keeps_rating_endpoints_up(client, make_user):
+    _, admin = make_user(admin=True)
+    members = [make_user() for _ in range(6)]
+    from helpers import week_range
+    week_start, _ = week_range(datetime.now())
+    for when in (week_start - timedelta(days=7), week_start + timedelta(hours=12)):
+        response = client.post('/api/meals', headers=admin, data={
+            'meal_date': when.isoformat(), 'meal_type': 'Dinner', 'dish_name': 'Stew'})
+        assert response.status_code == 201, response.data
+
+    for meal_id in (1, 2):
+        for _, headers in members:
+            assert client.post(f'/api/meals/{meal_id}/reviews', headers=headers, json={'rating': 4.5}).status_code == 200
+        # Six 4.5s plus a 2, downdated back to six 4.5s, leaves M2 at -2.7e-15 unclamped.
+        response = client.post(f'/api/meals/{meal_id}/reviews', headers=admin, json={'rating': 2})
+        assert client.delete(f'/api/meals/{meal_id}/reviews/{response.json["review_id"]}', headers=admin).status_code == 200
+
+    menu = _strict_json(client.get('/api/menu', headers=admin))
+    assert [(m['review_count'], m['rating_std'], m['sharpe_analog']) for m in menu['meals']] == [(6, 0.0, None)]
+    past = client.get('/api/past-meals', headers=admin)
+    assert past.status_code == 200, past.data
+    _strict_json(past)
+    analytics = client.get('/api/admin/analytics?fresh=1', headers=admin)
+    assert analytics.status_code == 200, analytics.data
+    _strict_json(analytics)
+
+
+def _add_meal(client, admin, day, hour=18):
+    when = datetime.combine(date.today() + timedelta(days=day), time(hour))
+    response = client.post('/api/meals', headers=admin, data={
+        'meal_date': when.isoformat(), 'meal_type': 'Dinner', 'dish_name': f'Dish {day}'})
+    assert response.status_code == 201, response.data
+    return response.json['id']
+
+
+def _rollup_rows(db):
+    from models import AnalyticsDay, AnalyticsWeek
+    days = [(d.chapter_id, d.day, d.meal_count, d.attendance_total, d.late_plate_count, d.n,
+             pytest.approx(d.mean), pytest.approx(d.m2, abs=1e-9), d.meals)
+            for d in AnalyticsDay.query.order_by(AnalyticsDay.chapter_id, AnalyticsDay.day)]
+    weeks = [(w.chapter_id, w.week_start, w.meal_count, w.attendance_total, w.late_plate_count, w.n,
+              pytest.approx(w.mean), pytest.approx(w.m2, abs=1e-9))
+             for w in AnalyticsWeek.query.order_by(AnalyticsWeek.chapter_id, AnalyticsWeek.week_start)]
+    return days, weeks
+
+
+def test_incremental_refresh_matches_a_full_rebuild(client, db, make_user):
+    from analytics_snapshot import refresh_chapter
+    _, admin = make_user(admin=True)
+    members = [make_user()[1] for _ in range(4)]
+    meals = {day: _add_meal(client, admin, day) for day in (-70, -60, -30, -8, -1, 0, 2)}
+    for headers, rating in zip(members, (5, 4.5, 3)):
+        assert client.post(f'/api/meals/{meals[-60]}/reviews', headers=headers, json={'rating': rating}).status_code == 200
+    refresh_chapter(1)
+
+    def after(response, status=200):
+        # Each write must mark what it changed: refreshing just the marked
+        # days gives what rebuilding everything does.
+        assert response.status_code == status, response.data
+        incremental, rows = refresh_chapter(1).payload, _rollup_rows(db)
+        assert refresh_chapter(1, full=True).payload == incremental
+        assert _rollup_rows(db) == rows
+        return response
+
+    # Reviews, one retracted.
+    for headers, rating in zip(members, (2, 4, 4.5, 1)):
+        review = after(client.post(f'/api/meals/{meals[-1]}/reviews', headers=headers, json={'rating': rating}))
+    after(client.delete(f'/api/meals/{meals[-1]}/reviews/{review.json["review_id"]}', headers=members[3]))
+    # Attendance toggled off and back on.
+    after(client.post(f'/api/meals/{meals[-8]}/attendance', headers=members[0]))
+    after(client.post(f'/api/meals/{meals[-8]}/attendance', headers=members[0]), 201)
+    # Late plates requested, one cancelled.
+    for headers in members[:3]:
+        after(client.post(f'/api/meals/{meals[2]}/late-plates', headers=headers, json={}), 201)
+    after(client.delete(f'/api/meals/{meals[2]}/late-plates', headers=members[2]))
+    # A meal moved to another week, one deleted and one added.
+    moved = datetime.combine(date.today() - timedelta(days=3), time(12)).isoformat()
+    after(client.put(f'/api/meals/{meals[-30]}', headers=admin, data={'meal_date': moved}))
+    after(client.delete(f'/api/meals/{meals[-70]}', headers=admin))
+    after(client.post('/api/meals', headers=admin, data={
+        'meal_date': (datetime.now() - timedelta(days=15)).isoformat(), 'meal_type': 'Lunch', 'dish_name': 'Soup'}), 201)
+
+    summary = refresh_chapter(1).payload['summary']
+    assert (summary['total_meals'], summary['total_reviews'], summary['total_late_plates']) == (7, 6, 2)
+
+
+def test_trend_starts_eight_weeks_back(client, db, make_user):
+    from analytics_snapshot import refresh_chapter, TREND_WEEKS, _week_start
+    _, admin = make_user(admin=True)
+    make_user()
+    since = date.today() - timedelta(weeks=TREND_WEEKS)
+    for day in (-7 * TREND_WEEKS - 1, -7 * TREND_WEEKS, -1):
+        _add_meal(client, admin, day)
+
+    trend = refresh_chapter(1).payload['attendance_trend']
+    # The day before the window is left out, even when it shares a week with the window's first day.
+    assert [(w['week_start'], w['meal_count'], w['total_attendance']) for w in trend] == [
+        (_week_start(since).isoformat(), 1, 2),
+        (_week_start(date.today() - timedelta(days=1)).isoformat(), 1, 2),
+    ]
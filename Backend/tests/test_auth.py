@@ -0,0 +1,52 @@
+import pytest
+
+
+@pytest.fixture
+def later(monkeypatch):
+    """later(seconds) moves the caches' clock forward."""
+    import time
+    import cache
+    clock, offset = time.monotonic, [0.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: clock() + offset[0])
+
+    def advance(seconds):
+        offset[0] += seconds
+    return advance
+
+
+def test_principal_is_cached_until_its_ttl(client, db, make_user, later):
+    from models import User
+    from helpers import _principal_cache, invalidate_principal
+    user_id, headers = make_user()
+    assert client.get('/api/admin/settings', headers=headers).status_code == 403
+    db.session.get(User, user_id).is_owner = True   # as `flask make-owner` would, from another process
+    db.session.commit()
+
+    hits = _principal_cache.hits
+    assert client.get('/api/admin/settings', headers=headers).status_code == 403
+    assert _principal_cache.hits == hits + 1
+    later(_principal_cache.ttl - 1)
+    assert client.get('/api/admin/settings', headers=headers).status_code == 403
+    later(2)
+    assert client.get('/api/admin/settings', headers=headers).status_code == 200
+
+    db.session.get(User, user_id).is_owner = False
+    db.session.commit()
+    invalidate_principal(user_id)   # same process: seen at once
+    assert client.get('/api/admin/settings', headers=headers).status_code == 403
+
+
+def test_deleted_user_gets_401(client, db, make_user, later):
+    from models import User
+    from helpers import _principal_cache
+    user_id, headers = make_user()
+    assert client.get('/api/me', headers=headers).json['id'] == user_id
+    db.session.delete(db.session.get(User, user_id))
+    db.session.commit()
+
+    # Still cached: the routes that load the full row must not fall over.
+    assert client.get('/api/me', headers=headers).status_code == 401
+    assert client.put('/api/me', headers=headers, json={'first_name': 'Ada'}).status_code == 401
+    later(_principal_cache.ttl + 1)
+    response = client.get('/api/me', headers=headers)
+    assert response.status_code == 401 and response.json['message'] == 'User not found!'
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+
+def _meal(db, chapter_id, name, day):
+    from models import Meal
+    from rollups import record_meal
+    meal = Meal(meal_date=datetime(2026, 1, day, 18), meal_type='Dinner', dish_name=name, chapter_id=chapter_id)
+    record_meal(meal)
+    db.session.add(meal)
+    db.session.flush()
+    return meal
+
+
+def test_migrate_to_chapters_rehomes_chapterless_dishes(app, db):
+    from models import Chapter, Dish, User, AnalyticsDay, AnalyticsWeek, AnalyticsSnapshot
+    from analytics_snapshot import refresh_chapter
+
+    default = Chapter(name='Default', access_code='DEFAULT1')
+    db.session.add(default)
+    legacy = User(email='legacy@example.com', password_hash='x', name='Leg Acy', first_name='Leg', last_name='Acy')
+    db.session.add(legacy)
+    db.session.flush()
+    user_id = legacy.id
+    _meal(db, default.id, 'Stew', 5)
+    stew = _meal(db, None, 'Stew', 6)
+    _meal(db, None, 'Stew', 7)
+    _meal(db, None, 'Soup', 8)
+    assert Dish.query.filter_by(chapter_id=None, name='Stew').count() == 1
+    db.session.execute(text('INSERT INTO meal_attendance (meal_id, user_id) VALUES (:m, :u)'),
+                       {'m': stew.id, 'u': user_id})
+    db.session.execute(text('INSERT INTO reviews (meal_id, user_id, rating, hidden) VALUES (:m, :u, 5, false)'),
+                       {'m': stew.id, 'u': user_id})
+    db.session.commit()
+    refresh_chapter(None, full=True)   # the legacy analytics, under key 0
+
+    result = app.test_cli_runner().invoke(args=['migrate-to-chapters'])
+    assert result.exit_code == 0, result.output
+    assert 'merged 1' in result.output
+
+    dishes = {d.name: d for d in Dish.query.all()}
+    assert {d.chapter_id for d in dishes.values()} == {default.id}
+    assert len(dishes) == 2
+    assert dishes['Stew'].times_served == 3
+    assert dishes['Stew'].attendance_total == 1
+    assert (dishes['Stew'].n, dishes['Stew'].mean) == (1, 5.0)
+    assert dishes['Soup'].times_served == 1
+
+    for model in (AnalyticsDay, AnalyticsWeek, AnalyticsSnapshot):
+        assert model.query.filter_by(chapter_id=0).count() == 0
+    summary = db.session.get(AnalyticsSnapshot, default.id).payload['summary']
+    assert (summary['total_users'], summary['total_meals'], summary['total_reviews']) == (1, 4, 1)
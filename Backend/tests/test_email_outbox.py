@@ -0,0 +1,125 @@
+import email
+import email.policy
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+
+class FlakyTransport:
+    """Raises `error` for every send while set; records what it was asked to send."""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.sent = []
+
+    def send(self, to_email, subject, html):
+        if self.error:
+            raise self.error
+        self.sent.append(to_email)
+
+
+@pytest.fixture
+def transport(monkeypatch, tmp_path):
+    import email_utils
+    from email_utils import FileTransport
+    monkeypatch.setattr(email_utils, 'email_transport', FileTransport(str(tmp_path)))
+    return email_utils
+
+
+def _register(client, email):
+    return client.post('/api/register', json={
+        'email': email, 'password': 'correct horse', 'firstName': 'Ada', 'lastName': 'Lovelace'})
+
+
+def test_register_queues_with_its_transaction(client, db, transport, tmp_path, monkeypatch):
+    import routes.auth
+    from models import EmailOutbox, PendingRegistration
+
+    def queue_then_fail(email, token):
+        transport.queue_verification_email(email, token)
+        db.session.flush()   # the outbox row is written, not yet committed
+        raise RuntimeError('registration failed after queueing')
+
+    with monkeypatch.context() as m:
+        m.setattr(routes.auth, 'queue_verification_email', queue_then_fail)
+        assert _register(client, 'ada@example.com').status_code == 500
+    assert EmailOutbox.query.count() == PendingRegistration.query.count() == 0
+
+    assert _register(client, 'ada@example.com').status_code == 201
+    assert _register(client, 'ada@example.com').status_code == 201   # a second try replaces the token
+    assert sorted(m.status for m in EmailOutbox.query.all()) == ['pending', 'superseded']
+    assert transport.dispatch_emails() == {'claimed': 1, 'sent': 1, 'retrying': 0, 'dead': 0}
+
+    message = EmailOutbox.query.filter_by(status='sent').one()
+    assert message.attempts == 1 and message.html is None and message.sent_at is not None
+    [eml] = os.listdir(tmp_path)
+    with open(tmp_path / eml, 'rb') as f:
+        sent = email.message_from_binary_file(f, policy=email.policy.default)
+    assert sent['To'] == 'ada@example.com'
+    assert f'token={PendingRegistration.query.one().token}"' in sent.get_content()
+    assert transport.dispatch_emails()['claimed'] == 0
+
+
+def _due(db, message_id):
+    from models import EmailOutbox
+    db.session.get(EmailOutbox, message_id).next_attempt_at = datetime.now(timezone.utc) - timedelta(seconds=1)
+    db.session.commit()
+
+
+def test_transient_failures_back_off_then_dead_letter(db, monkeypatch):
+    import email_utils
+    from models import EmailOutbox
+    flaky = FlakyTransport(ConnectionError('connection refused'))
+    monkeypatch.setattr(email_utils, 'email_transport', flaky)
+    message = email_utils.queue_reset_email('ada@example.com', 'token')
+    db.session.commit()
+    message_id = message.id
+
+    for attempt in range(1, email_utils.EMAIL_MAX_ATTEMPTS):
+        before = datetime.now(timezone.utc)
+        assert email_utils.dispatch_emails()['retrying'] == 1
+        row = db.session.get(EmailOutbox, message_id)
+        assert (row.status, row.attempts, row.last_error) == ('pending', attempt, 'connection refused')
+        backoff = timedelta(seconds=min(email_utils.EMAIL_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                                        email_utils.EMAIL_BACKOFF_CAP_SECONDS))
+        assert before + backoff <= row.next_attempt_at <= datetime.now(timezone.utc) + backoff
+        assert email_utils.dispatch_emails()['claimed'] == 0   # not due yet
+        _due(db, message_id)
+
+    assert email_utils.dispatch_emails()['dead'] == 1
+    row = db.session.get(EmailOutbox, message_id)
+    assert (row.status, row.attempts) == ('dead', email_utils.EMAIL_MAX_ATTEMPTS)
+    assert email_utils.dispatch_emails()['claimed'] == 0
+
+    flaky.error = None
+    assert email_utils.requeue_dead_emails() == 1
+    assert email_utils.dispatch_emails()['sent'] == 1
+    assert flaky.sent == ['ada@example.com']
+    assert db.session.get(EmailOutbox, message_id).attempts == 1
+
+
+def test_permanent_error_dead_letters_at_once(db, monkeypatch):
+    import email_utils
+    from models import EmailOutbox
+    monkeypatch.setattr(email_utils, 'email_transport',
+                        FlakyTransport(email_utils.PermanentEmailError('invalid recipient')))
+    email_utils.queue_verification_email('nobody@invalid', 'token')
+    db.session.commit()
+    assert email_utils.dispatch_emails() == {'claimed': 1, 'sent': 0, 'retrying': 0, 'dead': 1}
+    row = EmailOutbox.query.one()
+    assert (row.status, row.attempts, row.last_error) == ('dead', 1, 'invalid recipient')
+
+
+def test_prune_keeps_undelivered_and_recent_messages(db):
+    import email_utils
+    from models import EmailOutbox
+    old = datetime.now(timezone.utc) - timedelta(days=email_utils.EMAIL_OUTBOX_RETENTION_DAYS + 1)
+    for status, created_at in [('sent', old), ('superseded', old), ('pending', old), ('dead', old),
+                               ('sent', datetime.now(timezone.utc))]:
+        db.session.add(EmailOutbox(kind='reset', to_email=f'{status}@example.com', subject='Reset',
+                                   status=status, attempts=0, created_at=created_at))
+    db.session.commit()
+    assert email_utils.prune_email_outbox() == 2
+    kept = sorted((m.status, m.created_at > old) for m in EmailOutbox.query.all())
+    assert kept == [('dead', False), ('pending', False), ('sent', True)]
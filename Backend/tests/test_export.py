@@ -0,0 +1,53 @@
+import csv
+import io
+import json
+from datetime import date, datetime, time, timedelta
+
+
+def test_late_plate_export_includes_archived_plates(client, db, make_user):
+    from models import Meal, LatePlate
+    from rollups import record_meal
+    from retention import archive_late_plates
+
+    admin_id, admin = make_user(admin=True)
+    other_id, _ = make_user(chapter_id=2)
+    today = date.today()
+    plates = {}
+    for chapter_id, user_id in ((1, admin_id), (2, other_id)):
+        for day in (-20, -10, 2):
+            meal = Meal(meal_date=datetime.combine(today + timedelta(days=day), time(18)), meal_type='Dinner',
+                        dish_name=f'Dish {day}', chapter_id=chapter_id)
+            record_meal(meal)
+            db.session.add(meal)
+            db.session.flush()
+            plate = LatePlate(meal_id=meal.id, user_id=user_id, status='approved', notes='Extra sauce',
+                              request_date=today + timedelta(days=min(day, 0)))
+            db.session.add(plate)
+            db.session.flush()
+            plates[plate.id] = (chapter_id, day)
+    db.session.commit()
+    assert archive_late_plates()['archived'] == 4
+
+    def export(**params):
+        response = client.get('/api/admin/export/late-plates', headers=admin, query_string=params)
+        assert response.status_code == 200, response.data
+        return response.get_data(as_text=True)
+
+    rows = [json.loads(line) for line in export().splitlines()]
+    ours = sorted(i for i, (chapter_id, _) in plates.items() if chapter_id == 1)
+    assert [row['id'] for row in rows] == ours
+    for row in rows:
+        day = plates[row['id']][1]
+        assert row['archived'] == (day < 0)
+        assert row['notes'] == (None if day < 0 else 'Extra sauce')
+        assert row['dish_name'] == f'Dish {day}' and row['user_id'] == admin_id
+
+    since = (today - timedelta(days=10)).isoformat()
+    rows = [json.loads(line) for line in export(**{'from': since}).splitlines()]
+    assert [plates[row['id']][1] for row in rows] == [-10, 2]
+    rows = [json.loads(line) for line in export(**{'from': since, 'to': since}).splitlines()]
+    assert [(plates[row['id']][1], row['archived']) for row in rows] == [(-10, True)]
+
+    header, *rows = csv.reader(io.StringIO(export(format='csv')))
+    assert header[:7] == ['id', 'request_time', 'request_date', 'status', 'notes', 'pickup_time', 'archived']
+    assert [int(row[0]) for row in rows] == ours
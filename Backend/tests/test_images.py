@@ -0,0 +1,160 @@
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from PIL import ExifTags, Image
+
+
+def _jpeg(size=(1200, 900), color=(200, 80, 40)):
+    buf = io.BytesIO()
+    Image.new('RGB', size, color).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+def _camera_jpeg(size=(3000, 2000)):
+    """A phone photo: rotated by its EXIF orientation, with a GPS position and a comment."""
+    exif = Image.Exif()
+    exif[ExifTags.Base.Orientation] = 6   # display rotated 90 degrees clockwise
+    exif[ExifTags.Base.Make] = 'Phone'
+    gps = exif.get_ifd(ExifTags.IFD.GPSInfo)
+    gps[ExifTags.GPS.GPSLatitudeRef] = 'N'
+    gps[ExifTags.GPS.GPSLatitude] = (40.0, 26.0, 46.0)
+    buf = io.BytesIO()
+    Image.new('RGB', size, (10, 200, 30)).save(buf, 'JPEG', exif=exif.tobytes(), comment=b'shot at home')
+    return buf.getvalue()
+
+
+@pytest.mark.parametrize('fmt', ['WEBP', 'JPEG'])   # JPEG: Pillow built without WebP
+def test_variants_drop_metadata(monkeypatch, fmt):
+    import images
+    monkeypatch.setattr(images, '_VARIANT_FORMAT', fmt)
+    source = Image.open(io.BytesIO(_camera_jpeg()))
+    assert source.getexif().get_ifd(ExifTags.IFD.GPSInfo) and 'comment' in source.info
+
+    for name, body in images.render_variants(_camera_jpeg()).items():
+        variant = Image.open(io.BytesIO(body))
+        assert variant.format == fmt
+        assert not {'exif', 'icc_profile', 'comment', 'xmp'} & set(variant.info), name
+        assert len(variant.getexif()) == 0, name
+        assert not variant.getexif().get_ifd(ExifTags.IFD.GPSInfo), name
+
+
+@pytest.mark.parametrize('source, full', [
+    (_camera_jpeg((3000, 2000)), (1067, 1600)),   # upright after applying the orientation
+    (_jpeg((2400, 1200)), (1600, 800)),
+    (_jpeg((400, 300)), (400, 300)),               # never enlarged
+])
+def test_variant_sizes_and_format(source, full):
+    from images import render_variants, IMAGE_VARIANTS, _VARIANT_FORMAT
+    variants = render_variants(source)
+    assert set(variants) == set(IMAGE_VARIANTS)
+    sizes = {name: Image.open(io.BytesIO(body)).size for name, body in variants.items()}
+    assert sizes == {'thumb': IMAGE_VARIANTS['thumb'][0], 'card': IMAGE_VARIANTS['card'][0], 'full': full}
+    assert {Image.open(io.BytesIO(body)).format for body in variants.values()} == {_VARIANT_FORMAT}
+
+
+class FailingStore:
+    def put(self, key, data, content_type):
+        raise ConnectionError('bucket unreachable')
+
+
+@pytest.fixture
+def store(monkeypatch, tmp_path):
+    import images
+    from images import LocalImageStore
+    monkeypatch.setattr(images, 'image_store', LocalImageStore(str(tmp_path)))
+    return images
+
+
+def _upload(client, admin, color=(200, 80, 40), meal_id=None):
+    data = {'meal_date': '2026-03-02T18:00:00', 'meal_type': 'Dinner', 'dish_name': 'Stew',
+            'image': (io.BytesIO(_jpeg(color=color)), 'stew.jpg', 'image/jpeg')}
+    if meal_id:
+        response = client.put(f'/api/meals/{meal_id}', headers=admin, data=data, content_type='multipart/form-data')
+        assert response.status_code == 200, response.data
+        return meal_id
+    response = client.post('/api/meals', headers=admin, data=data, content_type='multipart/form-data')
+    assert response.status_code == 201, response.data
+    assert response.json['image_status'] == 'pending'
+    return response.json['id']
+
+
+def _due(db):
+    from models import ImageJob
+    ImageJob.query.update({'next_attempt_at': datetime.now(timezone.utc) - timedelta(seconds=1)})
+    db.session.commit()
+
+
+def test_queued_upload_is_stored(client, db, make_user, store, tmp_path):
+    from models import Meal, ImageJob
+    _, admin = make_user(admin=True)
+    meal_id = _upload(client, admin)
+    assert db.session.get(Meal, meal_id).image_url is None
+
+    assert store.process_image_jobs() == {'claimed': 1, 'stored': 1, 'retrying': 0, 'failed': 0}
+    meal = db.session.get(Meal, meal_id)
+    assert meal.image_status == 'ready' and meal.dish.image_url == meal.image_url
+    urls = store.image_variant_urls(meal.image_url)
+    for url in urls.values():
+        assert os.path.exists(tmp_path / url.lstrip('/'))
+    job = ImageJob.query.one()
+    assert (job.status, job.attempts, job.data) == ('done', 1, None)
+
+    status = client.get(f'/api/meals/{meal_id}/image-status', headers=admin).json
+    assert (status['image_status'], status['image_url'], status['job']['status']) == ('ready', meal.image_url, 'done')
+
+
+def test_failing_store_retries_with_backoff_then_fails(client, db, make_user, store, monkeypatch):
+    from models import Meal, ImageJob
+    _, admin = make_user(admin=True)
+    meal_id = _upload(client, admin)
+    monkeypatch.setattr(store, 'image_store', FailingStore())
+
+    for attempt in range(1, store.IMAGE_JOB_MAX_ATTEMPTS):
+        before = datetime.now(timezone.utc)
+        assert store.process_image_jobs()['retrying'] == 1
+        job = ImageJob.query.one()
+        assert (job.status, job.attempts, job.last_error) == ('pending', attempt, 'bucket unreachable')
+        backoff = timedelta(seconds=min(store.IMAGE_JOB_BACKOFF_SECONDS * 2 ** (attempt - 1),
+                                        store.IMAGE_JOB_BACKOFF_CAP_SECONDS))
+        assert before + backoff <= job.next_attempt_at <= datetime.now(timezone.utc) + backoff
+        assert db.session.get(Meal, meal_id).image_status == 'pending'
+        assert store.process_image_jobs()['claimed'] == 0   # not due yet
+        _due(db)
+
+    assert store.process_image_jobs()['failed'] == 1
+    assert ImageJob.query.one().status == 'failed'
+    meal = db.session.get(Meal, meal_id)
+    assert (meal.image_status, meal.image_url) == ('failed', None)
+
+
+def test_unusable_image_fails_at_once(client, db, make_user, store):
+    from models import ImageJob
+    _, admin = make_user(admin=True)
+    response = client.post('/api/meals', headers=admin, content_type='multipart/form-data', data={
+        'meal_date': '2026-03-02T18:00:00', 'meal_type': 'Dinner', 'dish_name': 'Stew',
+        'image': (io.BytesIO(b'not an image'), 'stew.jpg', 'image/jpeg')})
+    assert response.status_code == 201, response.data
+    assert store.process_image_jobs()['failed'] == 1
+    assert ImageJob.query.one().last_error.startswith('Unusable image')
+
+
+def test_older_job_does_not_overwrite_newer_image(client, db, make_user, store):
+    from models import Meal, ImageJob
+    _, admin = make_user(admin=True)
+    meal_id = _upload(client, admin, color=(255, 0, 0))
+    # The first upload is claimed, and its worker stalls.
+    assert len(store._claim_jobs(1)) == 1
+    _upload(client, admin, color=(0, 0, 255), meal_id=meal_id)
+    assert store.process_image_jobs() == {'claimed': 1, 'stored': 1, 'retrying': 0, 'failed': 0}
+    newer = db.session.get(Meal, meal_id).image_url
+
+    # The stalled job's lease runs out; it is reclaimed and stored, but must not replace the newer image.
+    first = ImageJob.query.order_by(ImageJob.id).first()
+    first.updated_at = datetime.now(timezone.utc) - store.IMAGE_JOB_LEASE - timedelta(seconds=1)
+    db.session.commit()
+    assert store.process_image_jobs()['stored'] == 1
+    assert [job.status for job in ImageJob.query.order_by(ImageJob.id)] == ['done', 'done']
+    meal = db.session.get(Meal, meal_id)
+    assert (meal.image_url, meal.image_status, meal.dish.image_url) == (newer, 'ready', newer)
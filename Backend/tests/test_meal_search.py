@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+
+def _serve(client, admin, dish_name, when, meal_type='Dinner'):
+    response = client.post('/api/meals', headers=admin, data={
+        'meal_date': when.isoformat(), 'meal_type': meal_type, 'dish_name': dish_name})
+    assert response.status_code == 201, response.data
+    return response.json['id']
+
+
+def test_search_caps_past_dates_and_counts_servings(client, db, make_user):
+    from queries import SEARCH_PAST_DATES
+    _, admin = make_user(admin=True)
+    _, other_admin = make_user(chapter_id=2, admin=True)
+    start = datetime(2026, 1, 5, 18)
+    served = [start + timedelta(days=3 * i) for i in range(SEARCH_PAST_DATES + 3)]
+    meal_ids = [_serve(client, admin, 'Lasagna', when, 'Lunch' if i % 2 else 'Dinner')
+                for i, when in enumerate(served)]
+    _serve(client, other_admin, 'Lasagna', start)
+    dropped = _serve(client, admin, 'Lasagna Verde', start)
+    assert client.delete(f'/api/meals/{dropped}', headers=admin).status_code == 200
+
+    def search(q, headers=admin):
+        response = client.get('/api/meals/search', headers=headers, query_string={'q': q})
+        assert response.status_code == 200, response.data
+        return response.json['meals']
+
+    # "lasagne" is a trigram match; the dish no longer served is left out.
+    [lasagna] = search('lasagne')
+    assert lasagna['dish_name'] == 'Lasagna'
+    assert lasagna['times_served'] == len(served)
+    assert lasagna['past_dates'] == [when.isoformat() for when in sorted(served, reverse=True)[:SEARCH_PAST_DATES]]
+
+    assert client.delete(f'/api/meals/{meal_ids[-1]}', headers=admin).status_code == 200
+    [lasagna] = search('Lasag')
+    assert lasagna['times_served'] == len(served) - 1
+    assert lasagna['past_dates'][0] == served[-2].isoformat()
+    assert len(lasagna['past_dates']) == SEARCH_PAST_DATES
+
+    [theirs] = search('lasagna', other_admin)
+    assert (theirs['times_served'], theirs['past_dates']) == (1, [start.isoformat()])
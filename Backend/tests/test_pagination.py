@@ -0,0 +1,34 @@
+from sqlalchemy import text
+
+
+def _walk(client, path, key, headers):
+    ids, cursor = [], None
+    while True:
+        response = client.get(path, headers=headers, query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200, response.data
+        ids += [row['id'] for row in response.json[key]]
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            return ids
+
+
+def test_admin_logs_page_through_rows_written_without_timestamps(client, make_user, db):
+    owner_id, owner = make_user(admin=True)
+    member_id, _ = make_user()
+    client.post('/api/meals', headers=owner, data={
+        'meal_date': '2026-01-05T12:00:00', 'meal_type': 'Lunch', 'dish_name': 'Stew'})
+    # Set-based writers (presets, imports) leave the sort keys to the database.
+    db.session.execute(text('DELETE FROM meal_attendance'))
+    for user_id in (owner_id, member_id):
+        db.session.execute(text('INSERT INTO meal_attendance (meal_id, user_id) VALUES (1, :u)'), {'u': user_id})
+        db.session.execute(text('INSERT INTO reviews (meal_id, user_id, rating, hidden) VALUES (1, :u, 4, false)'),
+                           {'u': user_id})
+        for name in ('Soup', 'Pie'):
+            db.session.execute(text('INSERT INTO recommendations (user_id, meal_name) VALUES (:u, :n)'),
+                               {'u': user_id, 'n': name})
+    db.session.commit()
+
+    attendance_ids = db.session.execute(text('SELECT id FROM meal_attendance ORDER BY id')).scalars().all()
+    assert sorted(_walk(client, '/api/admin/attendance', 'attendance', owner)) == attendance_ids
+    assert sorted(_walk(client, '/api/admin/reviews', 'reviews', owner)) == [1, 2]
+    assert sorted(_walk(client, '/api/admin/recommendations', 'recommendations', owner)) == [1, 2, 3, 4]
@@ -0,0 +1,46 @@
+import threading
+import time
+
+import pytest
+
+import passwords
+from passwords import PasswordHasherBusy
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    """A one-process hashing pool with a one-slot queue."""
+    monkeypatch.setattr(passwords, 'PASSWORD_HASH_WORKERS', 1)
+    monkeypatch.setattr(passwords, '_slots', threading.BoundedSemaphore(1))
+    monkeypatch.setattr(passwords, '_pool', {'pid': None, 'executor': None})
+    yield passwords
+    passwords._pool['executor'].shutdown(wait=True, cancel_futures=True)
+
+
+def test_hashes_in_the_pool(pool):
+    pw_hash = pool.hash_password('correct horse', rounds=4)
+    assert pool.check_password(pw_hash, 'correct horse')
+    assert not pool.check_password(pw_hash, 'battery staple')
+    assert not pool.check_password('not a bcrypt hash', 'correct horse')
+
+
+def test_timed_out_hash_keeps_its_slot(pool, monkeypatch):
+    pool._run(time.sleep, 0)   # start the pool process
+    monkeypatch.setattr(pool, 'PASSWORD_HASH_TIMEOUT', 0.1)
+    with pytest.raises(PasswordHasherBusy):
+        pool._run(time.sleep, 1)
+
+    # The timed-out call is still running in the pool, so the next one is
+    # turned away instead of queueing behind it.
+    monkeypatch.setattr(pool, 'PASSWORD_HASH_TIMEOUT', 10)
+    with pytest.raises(PasswordHasherBusy):
+        pool._run(time.sleep, 0)
+
+    deadline = time.monotonic() + 5
+    while True:
+        try:
+            pool._run(time.sleep, 0)
+            break
+        except PasswordHasherBusy:
+            assert time.monotonic() < deadline, 'slot never released'
+            time.sleep(0.05)
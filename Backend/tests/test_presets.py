@@ -0,0 +1,191 @@
+from datetime import date, datetime, time, timedelta, timezone
+
+
+def _upcoming(days, hour=18):
+    return datetime.combine(date.today() + timedelta(days=days), time(hour))
+
+
+def test_preset_late_plates_stay_live_until_their_meal(client, db, make_user):
+    from models import Meal, LatePlate, WeeklyPreset
+    from rollups import record_meal
+    from presets import apply_presets_to_upcoming_meals
+    from retention import archive_late_plates
+
+    _, admin = make_user(admin=True)
+    member_id, _ = make_user()
+    applied, seeded = _upcoming(3), _upcoming(5)
+    for when in (applied, seeded):
+        db.session.add(WeeklyPreset(user_id=member_id, day_of_week=when.weekday(), meal_type='Dinner',
+                                    late_plate=True, late_plate_notes='Keep it warm'))
+    meal = Meal(meal_date=applied, meal_type='Dinner', dish_name='Stew', chapter_id=1)
+    record_meal(meal)
+    db.session.add(meal)
+    db.session.commit()
+    # One plate from the scheduled pass, one seeded when the meal is created.
+    assert apply_presets_to_upcoming_meals()['late_plates_added'] == 1
+    response = client.post('/api/meals', headers=admin, data={
+        'meal_date': seeded.isoformat(), 'meal_type': 'Dinner', 'dish_name': 'Pie'})
+    assert response.status_code == 201, response.data
+
+    def live():
+        return {meal_date.date() for meal_date, in db.session.query(Meal.meal_date).join(
+            LatePlate, LatePlate.meal_id == Meal.id).filter(LatePlate.user_id == member_id)}
+
+    assert live() == {applied.date(), seeded.date()}
+    for today in (date.today(), applied.date()):
+        assert archive_late_plates(today=today)['archived'] == 0
+    assert archive_late_plates(today=applied.date() + timedelta(days=1))['archived'] == 1
+    assert live() == {seeded.date()}
+    assert archive_late_plates(today=seeded.date())['archived'] == 0
+    assert archive_late_plates(today=seeded.date() + timedelta(days=1))['archived'] == 1
+    assert live() == set()
+
+
+def _seed_one_by_one(meal_ids, chapter_id):
+    """Seeding as add_meal did before seed_meal_attendance: a preset lookup per member per meal."""
+    from database import db
+    from models import Meal, User, MealAttendance, LatePlate, WeeklyPreset
+    for meal in Meal.query.filter(Meal.id.in_(meal_ids)):
+        for user in User.query.filter_by(chapter_id=chapter_id):
+            attendance = MealAttendance(meal_id=meal.id, user_id=user.id)
+            db.session.add(attendance)
+            preset = WeeklyPreset.query.filter_by(user_id=user.id, day_of_week=meal.meal_date.weekday(),
+                                                  meal_type=meal.meal_type, enabled=True).first()
+            if not preset:
+                continue
+            if not preset.attending:
+                db.session.delete(attendance)
+            if preset.late_plate and not LatePlate.query.filter_by(user_id=user.id, meal_id=meal.id).first():
+                db.session.add(LatePlate(meal_id=meal.id, user_id=user.id, notes=preset.late_plate_notes,
+                                         pickup_time=preset.late_plate_pickup_time, status='pending',
+                                         request_date=datetime.now(timezone.utc).date()))
+    db.session.flush()
+
+
+def test_seeding_matches_the_per_member_loop(db, make_user):
+    from models import Meal, MealAttendance, LatePlate, WeeklyPreset
+    from rollups import record_meal
+    from presets import seed_meal_attendance
+
+    dinner, lunch = _upcoming(2), _upcoming(2, hour=12)
+    members = [make_user()[0] for _ in range(6)]
+    outsider, _ = make_user(chapter_id=2)
+    presets = [
+        # (user, meal type, attending, late plate, notes, pickup, enabled)
+        (members[1], 'Dinner', True, True, 'No onions', time(20, 30), True),
+        (members[2], 'Dinner', False, False, None, None, True),
+        (members[3], 'Dinner', False, True, 'Saving one', None, True),   # away, but wants a plate
+        (members[4], 'Dinner', False, True, 'Ignored', None, False),     # disabled: attends, no plate
+        (members[5], 'Lunch', True, True, None, time(13), True),         # already has a plate
+        (outsider, 'Dinner', True, True, 'Other chapter', None, True),
+    ]
+    for user_id, meal_type, attending, late_plate, notes, pickup, enabled in presets:
+        db.session.add(WeeklyPreset(user_id=user_id, day_of_week=dinner.weekday(), meal_type=meal_type,
+                                    attending=attending, late_plate=late_plate, late_plate_notes=notes,
+                                    late_plate_pickup_time=pickup, enabled=enabled))
+    meals = [Meal(meal_date=when, meal_type=meal_type, dish_name='Stew', chapter_id=1)
+             for when, meal_type in ((dinner, 'Dinner'), (lunch, 'Lunch'))]
+    for meal in meals:
+        record_meal(meal)
+    db.session.add_all(meals)
+    db.session.flush()
+    meal_ids = [meal.id for meal in meals]
+
+    def rows(seed):
+        MealAttendance.query.delete()
+        LatePlate.query.delete()
+        db.session.add(LatePlate(meal_id=meal_ids[1], user_id=members[5], status='approved',
+                                 request_date=date.today() - timedelta(days=1)))
+        db.session.flush()
+        seed(meal_ids, 1)
+        return (sorted((a.meal_id, a.user_id) for a in MealAttendance.query),
+                [(p.meal_id, p.user_id, p.notes, p.pickup_time, p.status, p.request_date)
+                       for p in LatePlate.query.order_by(LatePlate.meal_id, LatePlate.user_id, LatePlate.request_date)])
+
+    attendance, late_plates = rows(_seed_one_by_one)
+    assert (attendance, late_plates) == rows(seed_meal_attendance)
+    assert attendance == sorted([(meal_ids[0], u) for u in members if u not in (members[2], members[3])]
+                                + [(meal_ids[1], u) for u in members])
+    assert [(meal_id, user_id, notes) for meal_id, user_id, notes, *_ in late_plates] == [
+        (meal_ids[0], members[1], 'No onions'), (meal_ids[0], members[3], 'Saving one'),
+        (meal_ids[1], members[5], None)]
+
+
+def _member_with_presets(db, make_user):
+    """A member who attends Monday dinners with a late plate and skips Tuesday dinners."""
+    from models import WeeklyPreset
+    member_id, headers = make_user()
+    db.session.add_all([
+        WeeklyPreset(user_id=member_id, day_of_week=0, meal_type='Dinner', late_plate=True,
+                     late_plate_notes='Keep it warm', late_plate_pickup_time=time(21)),
+        WeeklyPreset(user_id=member_id, day_of_week=1, meal_type='Dinner', attending=False),
+    ])
+    return member_id, headers
+
+
+def _weeks_of_meals(db, member_id, first_monday, weeks):
+    """A Monday and a Tuesday dinner each week; the member is down as attending the Tuesdays."""
+    from models import Meal, MealAttendance
+    from rollups import record_meal
+    for week in range(weeks):
+        for day in (0, 1):
+            meal = Meal(meal_date=datetime.combine(first_monday + timedelta(weeks=week, days=day), time(18)),
+                        meal_type='Dinner', dish_name=f'Dish {week}{day}', chapter_id=1)
+            record_meal(meal)
+            db.session.add(meal)
+            db.session.flush()
+            if day == 1:
+                db.session.add(MealAttendance(meal_id=meal.id, user_id=member_id))
+    db.session.commit()
+
+
+def test_applying_presets_takes_the_same_statements_for_any_number_of_meals(db, make_user):
+    from sqlalchemy import event
+    from presets import apply_user_presets
+
+    member_id, _ = _member_with_presets(db, make_user)
+    monday = date.today() - timedelta(days=date.today().weekday()) + timedelta(weeks=1)
+    _weeks_of_meals(db, member_id, monday, 1)
+    _weeks_of_meals(db, member_id, monday + timedelta(weeks=2), 10)
+
+    def apply(start, weeks):
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            start = datetime.combine(start, time())
+            report = apply_user_presets(member_id, 1, start, start + timedelta(weeks=weeks))
+            db.session.commit()
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+        return report, len(statements)
+
+    one, one_count = apply(monday, 1)
+    many, many_count = apply(monday + timedelta(weeks=2), 10)
+    assert [(c['attendance'], c['late_plate']) for c in one] == [('added', 'added'), ('removed', None)]
+    assert [(c['attendance'], c['late_plate']) for c in many] == [('added', 'added'), ('removed', None)] * 10
+    assert one_count == many_count
+
+
+def test_applying_presets_twice_changes_nothing(client, db, make_user):
+    from models import MealAttendance, LatePlate
+
+    member_id, headers = _member_with_presets(db, make_user)
+    monday = date.today() + timedelta(days=-date.today().weekday() % 7)   # within the 8-day window
+    _weeks_of_meals(db, member_id, monday, 1)
+
+    def rows():
+        return (sorted((a.meal_id, a.user_id) for a in MealAttendance.query),
+                sorted((p.meal_id, p.user_id, p.notes, p.pickup_time, p.status) for p in LatePlate.query))
+
+    first = client.post('/api/weekly-presets/apply', headers=headers)
+    assert first.status_code == 200, first.data
+    assert [(c['attendance'], c['late_plate']) for c in first.json['meals']] == [('added', 'added'), ('removed', None)]
+    after_first = rows()
+    assert len(after_first[0]) == len(after_first[1]) == 1
+
+    second = client.post('/api/weekly-presets/apply', headers=headers)
+    assert [(c['attendance'], c['late_plate']) for c in second.json['meals']] == [(None, None), (None, None)]
+    assert rows() == after_first
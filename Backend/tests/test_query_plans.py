@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from sqlalchemy import text
+
+import queries
+from helpers import week_range
+from query_plans import check_hot_query_plans, _example, _statement
+
+CHAPTERS = 3
+MEMBERS = 30
+MEALS = 300
+DISHES = 40
+
+
+def _seed(db):
+    """A few chapters with some months of meals, attendance, reviews, late plates and analytics days."""
+    from analytics_snapshot import refresh_chapter, mark_days_dirty
+
+    week_start, _ = week_range(datetime.now())
+    params = {'chapters': CHAPTERS, 'members': MEMBERS, 'meals': MEALS, 'dishes': DISHES, 'week_start': week_start}
+    for statement in (
+        "INSERT INTO chapters (id, name) SELECT c, 'Chapter ' || c FROM generate_series(1, :chapters) c",
+        """INSERT INTO users (email, password_hash, name, first_name, last_name, chapter_id, is_admin, is_owner)
+           SELECT 'user' || g || '@test', 'x', 'User ' || g, 'User', g::text, 1 + (g - 1) / :members, false, false
+           FROM generate_series(1, :chapters * :members) g""",
+        """INSERT INTO dishes (chapter_id, name, times_served, served_by_type, attendance_total, n, mean, m2)
+           SELECT c, 'Dish ' || k, 0, CAST('{}' AS json), 0, 0, 0, 0
+           FROM generate_series(1, :chapters) c, generate_series(1, :dishes) k""",
+        # Two meals a day back from the middle of this week.
+        """INSERT INTO meals (meal_date, meal_type, dish_name, chapter_id, dish_id)
+           SELECT CAST(:week_start AS timestamp) + interval '3 days 12 hours' - g * interval '12 hours',
+                  CASE WHEN g % 2 = 0 THEN 'Lunch' ELSE 'Dinner' END, d.name, d.chapter_id, d.id
+           FROM generate_series(0, :meals - 1) g, dishes d
+           WHERE d.name = 'Dish ' || (1 + g % :dishes)""",
+        """UPDATE dishes d SET times_served = s.count, last_served_at = s.last
+           FROM (SELECT dish_id, count(*) AS count, max(meal_date) AS last FROM meals GROUP BY dish_id) s
+           WHERE s.dish_id = d.id""",
+        """INSERT INTO meal_attendance (meal_id, user_id, attendance_time)
+           SELECT m.id, u.id, m.meal_date - interval '1 day' FROM meals m JOIN users u ON u.chapter_id = m.chapter_id
+           WHERE (m.id + u.id) % 3 = 0""",
+        """INSERT INTO reviews (meal_id, user_id, rating, hidden, created_at)
+           SELECT m.id, u.id, 1 + (m.id * u.id) % 9 / 2.0, false, m.meal_date + interval '1 hour'
+           FROM meals m JOIN users u ON u.chapter_id = m.chapter_id
+           WHERE (m.id + u.id) % 5 = 0 AND m.meal_date < now()""",
+        """INSERT INTO meal_rating_stats (meal_id, n, mean, m2)
+           SELECT meal_id, count(*), avg(rating), coalesce(var_pop(rating) * count(*), 0) FROM reviews GROUP BY meal_id""",
+        """INSERT INTO late_plates (meal_id, user_id, request_time, request_date, status)
+           SELECT m.id, u.id, m.meal_date - interval '2 hours', CAST(m.meal_date AS date),
+                  CASE WHEN m.meal_date > now() THEN 'pending' ELSE 'approved' END
+           FROM meals m JOIN users u ON u.chapter_id = m.chapter_id
+           WHERE (m.id + u.id) % 11 = 0""",
+        """INSERT INTO recommendations (user_id, meal_name, created_at)
+           SELECT 1 + g % (:chapters * :members), 'Idea ' || g, now() - g * interval '1 hour'
+           FROM generate_series(1, 500) g""",
+    ):
+        db.session.execute(text(statement), params)
+    db.session.commit()
+    for chapter_id in range(1, CHAPTERS + 1):
+        refresh_chapter(chapter_id)
+    mark_days_dirty([(1, week_start), (2, week_start)])
+    db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def test_hot_queries_use_indexes(db):
+    _seed(db)
+    results = check_hot_query_plans()
+    assert len(results) == len(queries.HOT_QUERIES)
+    assert [(r['name'], r['full_scans']) for r in results if not r['ok']] == []
+
+
+def test_hot_queries_run(db):
+    _seed(db)
+    e = _example(1, 1, 1)
+    for name, builder, example in queries.HOT_QUERIES:
+        db.session.execute(_statement(builder(*example(e)), e)).all()
+
+
+def test_dropped_index_fails_check(db):
+    _seed(db)
+    db.session.execute(text('DROP INDEX ix_meals_chapter_id_meal_date'))
+    failing = {r['name']: r['full_scans'] for r in check_hot_query_plans() if not r['ok']}
+    assert 'menu: week meals + attendance counts' in failing
+    assert 'today meals + attendance counts' in failing
+
+    # The check rolls back, so the index is back.
+    assert db.session.execute(text("SELECT to_regclass('ix_meals_chapter_id_meal_date')")).scalar()
+    assert all(r['ok'] for r in check_hot_query_plans())
@@ -0,0 +1,94 @@
+from datetime import date, datetime, time
+
+from sqlalchemy import event
+
+
+def _meal_today(db, chapter_id=1):
+    from models import Meal
+    from rollups import record_meal
+    meal = Meal(meal_date=datetime.combine(date.today(), time(18)), meal_type='Dinner',
+                dish_name='Stew', chapter_id=chapter_id)
+    record_meal(meal)
+    db.session.add(meal)
+    db.session.commit()
+    return meal.id
+
+
+def test_writes_bump_the_chapter_version(client, db, make_user):
+    from models import MealAttendance
+    from rollups import shift_attendance
+    from response_cache import chapter_version
+    _, member = make_user()
+    other_id, other = make_user()
+    _, elsewhere = make_user(chapter_id=2)
+    meal_id = _meal_today(db)
+
+    def attendance_count(headers):
+        response = client.get('/api/today-meals', headers=headers)
+        assert response.status_code == 200
+        return [meal['attendance_count'] for meal in response.json['meals']]
+
+    assert attendance_count(other) == [0]
+    # A change that bypasses the blueprints isn't seen: the payload is cached.
+    db.session.add(MealAttendance(meal_id=meal_id, user_id=other_id))
+    shift_attendance({meal_id: 1})
+    db.session.commit()
+    assert attendance_count(other) == [0]
+
+    before = (chapter_version(1), chapter_version(2))
+    assert client.post(f'/api/meals/{meal_id}/attendance', headers=member).status_code == 201
+    assert (chapter_version(1), chapter_version(2)) == (before[0] + 1, before[1])
+    # The next read, by anyone in the chapter, is rebuilt rather than served from the payload cache.
+    assert attendance_count(other) == [2]
+    assert attendance_count(elsewhere) == []
+
+    # Failed writes change nothing, so they don't throw away the chapter's cache.
+    assert client.post('/api/meals/999999/attendance', headers=member).status_code == 404
+    assert client.post(f'/api/meals/{meal_id}/reviews', headers=member, json={'rating': 7}).status_code == 400
+    assert chapter_version(1) == before[0] + 1
+
+
+def test_conditional_get_etags(client, db, make_user):
+    from models import User
+    from helpers import invalidate_principal
+    member_id, member = make_user()
+    _, other = make_user()
+    _, elsewhere = make_user(chapter_id=2)
+    meal_id = _meal_today(db)
+
+    first = client.get('/api/menu', headers=member)
+    assert first.status_code == 200 and first.headers['Cache-Control'] == 'private, no-cache'
+    assert 'Authorization' in first.headers['Vary']
+    etag = first.headers['ETag']
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        again = client.get('/api/menu', headers={**member, 'If-None-Match': etag})
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert again.status_code == 304 and again.get_data() == b''
+    assert len(statements) == 1 and 'chapter_versions' in statements[0]   # the view never ran
+    assert again.headers['ETag'] == etag
+
+    # The body carries per-user state and the chapter's meals, so neither can share a tag.
+    assert client.get('/api/menu', headers=other).headers['ETag'] != etag
+    assert client.get('/api/menu', headers={**other, 'If-None-Match': etag}).status_code == 200
+    assert client.get('/api/menu', headers=elsewhere).headers['ETag'] != etag
+    assert client.get('/api/today-meals', headers=member).headers['ETag'] != etag
+    db.session.get(User, member_id).chapter_id = 2
+    db.session.commit()
+    invalidate_principal(member_id)
+    assert client.get('/api/menu', headers={**member, 'If-None-Match': etag}).status_code == 200
+    db.session.get(User, member_id).chapter_id = 1
+    db.session.commit()
+    invalidate_principal(member_id)
+    assert client.get('/api/menu', headers={**member, 'If-None-Match': etag}).status_code == 304
+
+    # Any write in the chapter retires the tag.
+    assert client.post(f'/api/meals/{meal_id}/attendance', headers=other).status_code == 201
+    fresh = client.get('/api/menu', headers={**member, 'If-None-Match': etag})
+    assert fresh.status_code == 200 and fresh.headers['ETag'] != etag
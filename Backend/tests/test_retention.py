@@ -0,0 +1,46 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import text
+
+
+def _meal(db, chapter_id, when):
+    from models import Meal
+    from rollups import record_meal
+    meal = Meal(meal_date=when, meal_type='Dinner', dish_name='Stew', chapter_id=chapter_id)
+    record_meal(meal)
+    db.session.add(meal)
+    db.session.flush()
+    return meal
+
+
+def test_archive_goes_by_meal_date(db, make_user):
+    from models import LatePlate, LatePlateHistory
+    from retention import archive_late_plates
+
+    users = [make_user(chapter_id=1)[0], make_user(chapter_id=2)[0]]
+    today = date.today()
+    days = (-9, -2, -1, 0, 1, 6)
+    meals = {(chapter_id, day): _meal(db, chapter_id, datetime.combine(today + timedelta(days=day), time(18)))
+             for chapter_id in (1, 2) for day in days}
+    for (chapter_id, day), meal in meals.items():
+        # Requested today for every meal, and a week earlier for the upcoming ones.
+        for requested in (today, today - timedelta(days=7)) if day >= 0 else (today,):
+            db.session.add(LatePlate(meal_id=meal.id, user_id=users[chapter_id - 1], status='approved',
+                                     request_date=requested, pickup_time=time(20, 30)))
+    db.session.commit()
+    plates = {p.id: (p.meal_id, p.user_id, p.request_date) for p in LatePlate.query.all()}
+
+    report = archive_late_plates(batch=2)
+
+    expired = {meal.id: (chapter_id, meal.meal_date) for (chapter_id, day), meal in meals.items() if day < 0}
+    live = {p.id for p in LatePlate.query.all()}
+    assert {plates[i][0] for i in live} == {m.id for m in meals.values()} - set(expired)
+    history = LatePlateHistory.query.all()
+    assert report['archived'] == len(history) == len(plates) - len(live) == 6
+    for row in history:
+        assert (row.meal_id, row.user_id, row.request_date) == plates[row.id]
+        assert (row.chapter_id, row.meal_date) == expired[row.meal_id]
+        assert row.status == 'approved' and row.pickup_time == time(20, 30)
+    assert db.session.execute(text('SELECT count(*) FROM late_plates l JOIN late_plate_history h USING (id)')).scalar() == 0
+
+    assert archive_late_plates(batch=2)['archived'] == 0
@@ -0,0 +1,91 @@
+import os
+
+import pytest
+
+
+def test_one_file_lock_wins(tmp_path):
+    from scheduler import FileLeaderLock
+    path = str(tmp_path / 'scheduler.lock')
+    locks = [FileLeaderLock(path), FileLeaderLock(path)]
+    assert [lock.acquire() for lock in locks] == [True, False]
+    assert locks[0].held()
+
+    # A cleaner deletes the file: the old flock no longer excludes anyone.
+    os.remove(path)
+    assert not locks[0].held()
+    assert locks[1].acquire()
+    assert locks[1].held()
+    assert not FileLeaderLock(path).acquire()
+
+
+def test_one_postgres_lock_wins(app, db):
+    from sqlalchemy import text
+    from scheduler import PostgresLeaderLock
+    locks = [PostgresLeaderLock(app.config['SQLALCHEMY_DATABASE_URI']) for _ in range(2)]
+    assert [lock.acquire() for lock in locks] == [True, False]
+    assert locks[0].held()
+
+    # The leader's session dies, and its advisory lock with it.
+    pid = locks[0]._conn.execute(text('SELECT pg_backend_pid()')).scalar()
+    locks[0]._conn.commit()
+    assert db.session.execute(text('SELECT pg_terminate_backend(:pid, 5000)'), {'pid': pid}).scalar()
+    assert not locks[0].held()
+    assert locks[1].acquire()
+    assert locks[1].held()
+    locks[1]._conn.close()
+
+
+@pytest.fixture
+def jobs():
+    """Register throwaway jobs for one test."""
+    from scheduler import _registry, scheduled_job
+    before = dict(_registry)
+    yield scheduled_job
+    _registry.clear()
+    _registry.update(before)
+
+
+def test_run_job_records_runs(db, jobs):
+    from models import JobRun
+    from scheduler import run_job
+
+    @jobs('interval', minutes=1)
+    def touches_rows():
+        return 3
+
+    @jobs('interval', minutes=1)
+    def fails():
+        raise RuntimeError('disk full')
+
+    @jobs('interval', record_idle=False, minutes=1)
+    def idle_poll():
+        return 0
+
+    assert run_job('touches_rows') == 3
+    assert run_job('fails') is None
+    assert run_job('idle_poll') == 0
+    runs = {run.job_name: run for run in JobRun.query.all()}
+    assert set(runs) == {'touches_rows', 'fails'}
+    assert (runs['touches_rows'].status, runs['touches_rows'].rows, runs['touches_rows'].error) == ('ok', 3, None)
+    assert (runs['fails'].status, runs['fails'].rows, runs['fails'].error) == ('error', None, 'disk full')
+    assert all(run.duration_ms >= 0 and run.started_at for run in runs.values())
+
+
+@pytest.mark.parametrize('argv', [['flask', 'db', 'upgrade'], ['flask', 'job-runs', '--limit', '5']])
+def test_scheduler_stays_off_under_flask_commands(app, monkeypatch, argv):
+    import scheduler
+    monkeypatch.setattr(scheduler, 'SCHEDULER_ENABLED', True)
+    monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+    monkeypatch.setattr('sys.argv', argv)
+    assert not scheduler.start_scheduler(app)
+    assert not scheduler.scheduler.running
+
+
+def test_flask_run_is_not_a_cli_command(monkeypatch):
+    from scheduler import _under_flask_command
+    monkeypatch.setenv('FLASK_RUN_FROM_CLI', 'true')
+    monkeypatch.setattr('sys.argv', ['flask', 'run', '--port', '5000'])
+    assert not _under_flask_command()
+    monkeypatch.delenv('FLASK_RUN_FROM_CLI')
+    monkeypatch.setattr('sys.argv', ['gunicorn', 'app:app'])
+    assert not _under_flask_command()
@@ -19,8 +19,9 @@ export default function MealCard({ meal, onAttend, onReview, onLatePlate, onCanc
   const mealDate = new Date(meal.meal_date);
   const isPast = mealDate < now;
 
-  const imageUrl = meal.image_url
-    ? meal.image_url.startsWith('http') ? meal.image_url : `${BASE_URL}${meal.image_url}`
+  const cardImage = meal.image_variants?.card ?? meal.image_url;
+  const imageUrl = cardImage
+    ? cardImage.startsWith('http') ? cardImage : `${BASE_URL}${cardImage}`
     : null;
 
   const mealTypeBadge = meal.meal_type === 'Lunch'
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { api } from '../lib/api';
+import { api, pagePath } from '../lib/api';
 import StarRating from './StarRating';
 import { MessageSquare, EyeOff, Trash2 } from 'lucide-react';
 import { useUser } from '../contexts/UserContext';
@@ -8,6 +8,7 @@ import Button from './ui/Button';
 
 export default function Reviews() {
   const [reviews, setReviews] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [err, setErr] = useState('');
   const { user, loading: userLoading } = useUser();
@@ -23,8 +24,9 @@ export default function Reviews() {
       try {
         setLoading(true);
         setErr('');
-        const { reviews } = await api('/api/admin/reviews');
+        const { reviews, next_cursor } = await api('/api/admin/reviews');
         setReviews(reviews);
+        setNextCursor(next_cursor);
       } catch (e) {
         setErr(e.message || 'Failed to load reviews');
       } finally {
@@ -33,6 +35,16 @@ export default function Reviews() {
     })();
   }, [user, userLoading]);
 
+  const loadMore = async () => {
+    try {
+      const { reviews, next_cursor } = await api(pagePath('/api/admin/reviews', nextCursor));
+      setReviews(cur => [...cur, ...reviews]);
+      setNextCursor(next_cursor);
+    } catch (e) {
+      setErr(e.message || 'Failed to load reviews');
+    }
+  };
+
   const handleHide = async (reviewId) => {
     try {
       const data = await api(`/api/admin/reviews/${reviewId}/hide`, { method: 'PUT' });
@@ -147,6 +159,12 @@ export default function Reviews() {
           ))}
         </div>
       )}
+
+      {nextCursor && (
+        <div className="text-center">
+          <Button variant="secondary" onClick={loadMore}>Load more</Button>
+        </div>
+      )}
     </div>
   );
 }
@@ -29,3 +29,9 @@ export async function api(path, options = {}) {
   return data;
 }
 
+
+// Paginated admin lists return { <items>, next_cursor }; pass the cursor back for the next page.
+export function pagePath(path, cursor) {
+  if (!cursor) return path;
+  return `${path}${path.includes('?') ? '&' : '?'}cursor=${encodeURIComponent(cursor)}`;
+}
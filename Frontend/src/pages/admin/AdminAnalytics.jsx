@@ -1,24 +1,34 @@
 import React, { useState, useEffect } from 'react';
 import { api } from '../../lib/api';
-import { Users, Utensils, Star, MessageSquare } from 'lucide-react';
+import { Users, Utensils, Star, MessageSquare, RefreshCw } from 'lucide-react';
 
 export default function AdminAnalytics() {
   const [data, setData] = useState(null);
   const [loading, setLoading] = useState(true);
   const [err, setErr] = useState('');
+  const [refreshing, setRefreshing] = useState(false);
 
-  useEffect(() => {
-    (async () => {
-      try {
-        const result = await api('/api/admin/analytics');
-        setData(result);
-      } catch (e) {
-        setErr(e.message || 'Failed to load analytics.');
-      } finally {
-        setLoading(false);
-      }
-    })();
-  }, []);
+  // The dashboard is a snapshot the server refreshes every minute or so;
+  // fresh=true asks it to catch up with the latest writes first.
+  const load = async (fresh = false) => {
+    try {
+      const result = await api(`/api/admin/analytics${fresh ? '?fresh=1' : ''}`);
+      setData(result);
+      setErr('');
+    } catch (e) {
+      setErr(e.message || 'Failed to load analytics.');
+    } finally {
+      setLoading(false);
+      setRefreshing(false);
+    }
+  };
+
+  useEffect(() => { load(); }, []);
+
+  const handleRefresh = () => {
+    setRefreshing(true);
+    load(true);
+  };
 
   if (loading) return <div className="text-center text-text-secondary dark:text-gray-400 py-8">Loading analytics...</div>;
   if (err) return <div className="text-center text-red-500 py-8">{err}</div>;
@@ -30,6 +40,18 @@ export default function AdminAnalytics() {
 
   return (
     <div className="space-y-8">
+      <div className="flex items-center justify-end gap-3 text-xs text-text-secondary dark:text-gray-400">
+        {data.as_of && <span>Updated {new Date(data.as_of).toLocaleString(undefined, { month: 'short', day: 'numeric', hour: 'numeric', minute: '2-digit' })}</span>}
+        <button
+          onClick={handleRefresh}
+          disabled={refreshing}
+          className="flex items-center gap-1 text-primary hover:underline disabled:opacity-50"
+        >
+          <RefreshCw size={13} className={refreshing ? 'animate-spin' : ''} />
+          {refreshing ? 'Refreshing...' : 'Refresh'}
+        </button>
+      </div>
+
       {/* Summary cards */}
       <div className="grid grid-cols-2 sm:grid-cols-4 gap-4">
         {[
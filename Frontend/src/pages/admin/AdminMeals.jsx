@@ -26,7 +26,7 @@ const MealSlotForm = ({ meal, onUpdate, onFileChange, onAutofill, onWebImage })
       if (query.length < 2) { setSearchResults([]); setIsSearching(false); return; }
       setIsSearching(true);
       try {
-        const { meals } = await api(`/api/meals/search?q=${query}`);
+        const { meals } = await api(`/api/meals/search?q=${encodeURIComponent(query)}`);
         setSearchResults(meals);
       } catch {
         // ignore
@@ -95,7 +95,8 @@ const MealSlotForm = ({ meal, onUpdate, onFileChange, onAutofill, onWebImage })
                     {result.dish_name}
                     {result.past_dates?.length > 0 && (
                       <span className="ml-2 text-xs text-text-secondary dark:text-gray-400">
-                        (Also on: {result.past_dates.map(d => new Date(d).toLocaleDateString()).join(', ')})
+                        (Also on: {result.past_dates.map(d => new Date(d).toLocaleDateString()).join(', ')}
+                        {result.times_served > result.past_dates.length && ` and ${result.times_served - result.past_dates.length} more`})
                       </span>
                     )}
                   </li>
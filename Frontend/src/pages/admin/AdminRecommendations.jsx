@@ -1,11 +1,12 @@
 import React, { useState, useEffect } from 'react';
-import { api } from '../../lib/api';
+import { api, pagePath } from '../../lib/api';
 import { useUser } from '../../contexts/UserContext';
 import { format } from 'date-fns';
 import { Trash2 } from 'lucide-react'; // Import Trash2 icon
 
 export default function AdminRecommendations() {
   const [recommendations, setRecommendations] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const { user, loading: userLoading } = useUser();
@@ -26,6 +27,7 @@ export default function AdminRecommendations() {
       setError(null);
       const response = await api('/api/admin/recommendations');
       setRecommendations(response.recommendations);
+      setNextCursor(response.next_cursor);
     } catch (err) {
       setError(err.message || 'Failed to fetch recommendations.');
     } finally {
@@ -33,6 +35,16 @@ export default function AdminRecommendations() {
     }
   };
 
+  const loadMore = async () => {
+    try {
+      const response = await api(pagePath('/api/admin/recommendations', nextCursor));
+      setRecommendations(cur => [...cur, ...response.recommendations]);
+      setNextCursor(response.next_cursor);
+    } catch (err) {
+      setError(err.message || 'Failed to fetch recommendations.');
+    }
+  };
+
   const handleDelete = async (id) => {
     if (window.confirm('Are you sure you want to delete this recommendation?')) {
       try {
@@ -117,6 +129,13 @@ export default function AdminRecommendations() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="px-6 py-4 text-center">
+              <button onClick={loadMore} className="text-primary hover:underline text-sm font-medium">
+                Load more
+              </button>
+            </div>
+          )}
         </div>
       )}
     </div>
@@ -1,10 +1,11 @@
 import { useState, useEffect } from 'react';
-import { api } from '../../lib/api';
+import { api, pagePath } from '../../lib/api';
 import { Star, EyeOff, Trash2 } from 'lucide-react';
 import Button from '../../components/ui/Button';
 
 export default function AdminReviews() {
   const [reviews, setReviews] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
 
@@ -12,8 +13,9 @@ export default function AdminReviews() {
     (async () => {
       try {
         setLoading(true);
-        const { reviews: fetchedReviews } = await api('/api/admin/reviews');
+        const { reviews: fetchedReviews, next_cursor } = await api('/api/admin/reviews');
         setReviews(fetchedReviews);
+        setNextCursor(next_cursor);
       } catch (err) {
         setError(err.message || 'Failed to fetch reviews.');
       } finally {
@@ -22,6 +24,16 @@ export default function AdminReviews() {
     })();
   }, []);
 
+  const loadMore = async () => {
+    try {
+      const { reviews: fetchedReviews, next_cursor } = await api(pagePath('/api/admin/reviews', nextCursor));
+      setReviews(cur => [...cur, ...fetchedReviews]);
+      setNextCursor(next_cursor);
+    } catch (err) {
+      setError(err.message || 'Failed to fetch reviews.');
+    }
+  };
+
   const handleHide = async (reviewId) => {
     try {
       const data = await api(`/api/admin/reviews/${reviewId}/hide`, { method: 'PUT' });
@@ -103,6 +115,11 @@ export default function AdminReviews() {
               </div>
             </div>
           ))}
+          {nextCursor && (
+            <div className="text-center">
+              <Button variant="secondary" onClick={loadMore}>Load more</Button>
+            </div>
+          )}
         </>
       )}
     </div>
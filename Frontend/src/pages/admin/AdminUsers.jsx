@@ -1,11 +1,12 @@
 import { useState, useEffect } from 'react';
-import { api } from '../../lib/api';
+import { api, pagePath } from '../../lib/api';
 import Button from '../../components/ui/Button';
 import { useUser } from '../../contexts/UserContext';
 import { Settings } from 'lucide-react'; // Import Settings icon from lucide-react
 
 export default function AdminUsers() {
   const [users, setUsers] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loadingUsers, setLoadingUsers] = useState(true);
   const [error, setError] = useState('');
   const { user: currentUser, loading: loadingUserContext } = useUser();
@@ -17,8 +18,9 @@ export default function AdminUsers() {
   const fetchUsers = async () => {
     try {
       setLoadingUsers(true);
-      const { users: fetchedUsers } = await api('/api/admin/users');
+      const { users: fetchedUsers, next_cursor } = await api('/api/admin/users');
       setUsers(fetchedUsers);
+      setNextCursor(next_cursor);
     } catch (err) {
       setError(err.message || 'Failed to fetch users.');
     } finally {
@@ -26,6 +28,16 @@ export default function AdminUsers() {
     }
   };
 
+  const loadMoreUsers = async () => {
+    try {
+      const { users: fetchedUsers, next_cursor } = await api(pagePath('/api/admin/users', nextCursor));
+      setUsers(cur => [...cur, ...fetchedUsers]);
+      setNextCursor(next_cursor);
+    } catch (err) {
+      setError(err.message || 'Failed to fetch users.');
+    }
+  };
+
   useEffect(() => {
     fetchUsers();
   }, []);
@@ -128,6 +140,11 @@ export default function AdminUsers() {
           </tbody>
         </table>
       </div>
+      {nextCursor && (
+        <div className="mt-4 text-center">
+          <Button variant="secondary" onClick={loadMoreUsers}>Load more</Button>
+        </div>
+      )}
     </div>
   );
 }
\ No newline at end of file
@@ -1,35 +1,48 @@
-import { useState, useEffect, useMemo } from 'react';
-import { api, BASE_URL } from '../../lib/api';
+import { useState, useEffect } from 'react';
+import { api, pagePath, BASE_URL } from '../../lib/api';
 import { useUser } from '../../contexts/UserContext';
 import { Star, Users, ChevronDown, ChevronUp, Trash2, TrendingUp } from 'lucide-react';
 import Button from '../../components/ui/Button';
 
+// Sorting happens on the server (sort= on /api/past-meals).
 const MEMBER_SORT_OPTIONS = [
   { value: 'avg_rating', label: 'Avg Rating' },
+  { value: 'last_served', label: 'Last Served' },
   { value: 'name', label: 'Name' },
 ];
 
 const ADMIN_SORT_OPTIONS = [
   { value: 'zscore', label: 'Top Rated' },
   { value: 'avg_rating', label: 'Avg Rating' },
+  { value: 'sharpe_analog', label: 'Quality' },
   { value: 'times_served', label: 'Times Served' },
+  { value: 'last_served', label: 'Last Served' },
   { value: 'name', label: 'Name' },
 ];
 
 export default function PastMeals() {
   const [meals, setMeals] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [filter, setFilter] = useState('All');
   const [sortBy, setSortBy] = useState('avg_rating');
   const { user } = useUser();
   const [expandedMealId, setExpandedMealId] = useState(null);
+  const [occurrences, setOccurrences] = useState({});
+
+  const listPath = () => {
+    const typeParam = filter === 'All' ? '' : `&meal_type=${encodeURIComponent(filter)}`;
+    return `/api/past-meals?sort=${sortBy}${typeParam}`;
+  };
 
   const fetchPastMeals = async () => {
     try {
       setLoading(true);
-      const { meals: fetchedMeals } = await api('/api/past-meals');
+      const { meals: fetchedMeals, next_cursor } = await api(listPath());
       setMeals(fetchedMeals);
+      setNextCursor(next_cursor);
+      setOccurrences({});
     } catch (err) {
       setError(err.message || 'Failed to fetch past meals.');
     } finally {
@@ -39,10 +52,40 @@ export default function PastMeals() {
 
   useEffect(() => {
     fetchPastMeals();
-  }, []);
+  }, [sortBy, filter]);
+
+  const loadMore = async () => {
+    try {
+      const { meals: fetchedMeals, next_cursor } = await api(pagePath(listPath(), nextCursor));
+      setMeals(cur => [...cur, ...fetchedMeals]);
+      setNextCursor(next_cursor);
+    } catch (err) {
+      setError(err.message || 'Failed to fetch past meals.');
+    }
+  };
 
-  const toggleExpand = (mealId) => {
-    setExpandedMealId(expandedMealId === mealId ? null : mealId);
+  // A dish's occurrences are fetched a page at a time, the first time it is expanded.
+  const fetchOccurrences = async (dishId, cursor = null) => {
+    try {
+      const typeParam = filter === 'All' ? '' : `?meal_type=${encodeURIComponent(filter)}`;
+      const { occurrences: fetched, next_cursor } = await api(
+        pagePath(`/api/past-meals/${dishId}/occurrences${typeParam}`, cursor));
+      setOccurrences(prev => ({
+        ...prev,
+        [dishId]: { items: [...(cursor ? prev[dishId].items : []), ...fetched], nextCursor: next_cursor },
+      }));
+    } catch (err) {
+      setError(err.message || 'Failed to fetch past occurrences.');
+    }
+  };
+
+  const toggleExpand = async (dishId) => {
+    if (expandedMealId === dishId) {
+      setExpandedMealId(null);
+      return;
+    }
+    setExpandedMealId(dishId);
+    if (!occurrences[dishId]) fetchOccurrences(dishId);
   };
 
   const handleDeleteMeal = async (mealId) => {
@@ -56,27 +99,6 @@ export default function PastMeals() {
     }
   };
 
-  const sortedMeals = useMemo(() => {
-    const copy = [...meals];
-    copy.sort((a, b) => {
-      if (sortBy === 'zscore') {
-        const az = a.rating_zscore ?? -Infinity;
-        const bz = b.rating_zscore ?? -Infinity;
-        return bz - az;
-      }
-      if (sortBy === 'avg_rating') {
-        const ar = a.avg_rating ?? -Infinity;
-        const br = b.avg_rating ?? -Infinity;
-        return br - ar;
-      }
-      if (sortBy === 'times_served') {
-        return (b.past_occurrences?.length ?? 0) - (a.past_occurrences?.length ?? 0);
-      }
-      return a.dish_name.localeCompare(b.dish_name);
-    });
-    return copy;
-  }, [meals, sortBy]);
-
   if (loading) return <div className="text-center text-text-secondary dark:text-gray-400">Loading past meals...</div>;
   if (error) return <div className="text-center text-red-500">{error}</div>;
 
@@ -129,31 +151,22 @@ export default function PastMeals() {
       </div>
       {meals.length === 0 ? (
         <div className="bg-surface/80 backdrop-blur-lg rounded-xl border border-border-light/50 p-12 text-center dark:bg-slate-800/80 dark:border-slate-700">
-          <p className="text-text-secondary dark:text-gray-400">No past meals found.</p>
-        </div>
-      ) : sortedMeals.every(m => filter !== 'All' && !m.past_occurrences?.some(o => o.meal_type === filter)) ? (
-        <div className="bg-surface/80 backdrop-blur-lg rounded-xl border border-border-light/50 p-12 text-center dark:bg-slate-800/80 dark:border-slate-700">
-          <p className="text-text-secondary dark:text-gray-400">No {filter} meals found.</p>
+          <p className="text-text-secondary dark:text-gray-400">{filter === 'All' ? 'No past meals found.' : `No ${filter} meals found.`}</p>
         </div>
       ) : (
         <div className="space-y-4">
-          {sortedMeals.flatMap((meal) => {
-            const filteredOccurrences = filter === 'All'
-              ? meal.past_occurrences
-              : meal.past_occurrences?.filter(o => o.meal_type === filter);
-            if (!filteredOccurrences?.length) return [];
-            const isExpanded = expandedMealId === meal.dish_name;
-            const avgAttendance = filteredOccurrences.length
-              ? (filteredOccurrences.reduce((sum, o) => sum + o.attendance, 0) / filteredOccurrences.length).toFixed(2)
-              : 0;
-            return [(
-              <div key={meal.dish_name} className="bg-surface/80 backdrop-blur-lg rounded-xl border border-border-light/50 shadow-lg dark:bg-slate-800/80 dark:border-slate-700">
-                <div className="p-5 cursor-pointer" onClick={() => toggleExpand(meal.dish_name)}>
+          {meals.map((meal) => {
+            const isExpanded = expandedMealId === meal.dish_id;
+            const dishOccurrences = occurrences[meal.dish_id];
+            const avgAttendance = (meal.average_attendance ?? 0).toFixed(2);
+            return (
+              <div key={meal.dish_id} className="bg-surface/80 backdrop-blur-lg rounded-xl border border-border-light/50 shadow-lg dark:bg-slate-800/80 dark:border-slate-700">
+                <div className="p-5 cursor-pointer" onClick={() => toggleExpand(meal.dish_id)}>
                   <div className="flex items-start justify-between gap-3">
                     <div className="flex-1 min-w-0">
                       <h3 className="text-lg font-bold text-text-primary dark:text-white">{meal.dish_name}</h3>
                       <p className="text-sm text-text-secondary dark:text-gray-400 mt-0.5">
-                        Served {filteredOccurrences.length}×
+                        Served {meal.times_served}×
                         {user?.is_admin && <span> · Avg attendance: {avgAttendance}</span>}
                       </p>
                     </div>
@@ -191,7 +204,10 @@ export default function PastMeals() {
                     <p className="text-text-secondary dark:text-gray-300 mb-4">{meal.description}</p>
                     <div className="space-y-2 mb-4">
                       <h4 className="font-semibold text-text-primary dark:text-white">Past Occurrences:</h4>
-                      {filteredOccurrences.map((occurrence) => (
+                      {!dishOccurrences && (
+                        <p className="text-sm text-text-secondary dark:text-gray-400">Loading...</p>
+                      )}
+                      {dishOccurrences?.items.map((occurrence) => (
                         <div key={occurrence.id} className="flex items-center justify-between text-sm text-text-secondary dark:text-gray-400">
                           <div className="flex items-center gap-2">
                             <span>{new Date(occurrence.date).toLocaleDateString()}</span>
@@ -209,6 +225,12 @@ export default function PastMeals() {
                           </div>
                         </div>
                       ))}
+                      {dishOccurrences?.nextCursor && (
+                        <button type="button" onClick={(e) => { e.stopPropagation(); fetchOccurrences(meal.dish_id, dishOccurrences.nextCursor); }}
+                          className="text-sm font-medium text-primary hover:underline dark:text-indigo-300">
+                          Show more
+                        </button>
+                      )}
                     </div>
                     {user?.is_admin && (
                       <div className="flex items-center gap-2 text-sm text-text-secondary dark:text-gray-400 mt-2">
@@ -225,8 +247,13 @@ export default function PastMeals() {
                   </div>
                 )}
               </div>
-            )];
+            );
           })}
+          {nextCursor && (
+            <div className="text-center">
+              <Button variant="secondary" onClick={loadMore}>Load more</Button>
+            </div>
+          )}
         </div>
       )}
     </div>